@@ -7,28 +7,44 @@
 
 # Basics
 import pandas as pd
-import geopandas as gpd
 import numpy as np
+import hmac
+import os
 import random
-import json
 import re
+from functools import wraps
 from textwrap import dedent
 
 # Plotly
 import plotly.graph_objects as go
-import plotly.express as px
 
 # Dash
 import dash
+from flask import abort, jsonify, request
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import (Input, Output, State,
+                               ClientsideFunction)
+
+# Storage
+import sys
+sys.path.append("src")
+sys.path.append("src/04_visualization")
+from app_data import AppData, lazy  # noqa: E402
+from business_index import BusinessIndexes  # noqa: E402
+from licence_cube import LicenceCube  # noqa: E402
+from licence_partitions import YearPartitions  # noqa: E402
+from figure_cache import FigureCache, data_version  # noqa: E402
+from density_bins import MAX_POINTS, bin_points, marker_sizes  # noqa: E402
+from compact_payload import compact_figure, payload_stats  # noqa: E402
+from census_store import CensusStore  # noqa: E402
+from callback_timing import CallbackTimer  # noqa: E402
+from prediction import (CensusFeatures, CandidateScorer,  # noqa: E402
+                        MicroBatcher)
 
 # Model
 from joblib import load
-from shapely.ops import nearest_points
-from shapely.geometry import Point
 from sklearn import metrics
 
 ###############################################################################
@@ -40,60 +56,168 @@ app = dash.Dash(
 )
 server = app.server
 
+# prebuilt data, each section is loaded when a tab first needs it
+app_data = AppData()
+
+# cache of callback outputs, entries on disk are kept per data version
+figure_cache = FigureCache.from_env(version=data_version(app_data.paths()))
+
+
+# the admin reports below (cache, payload, callback and prediction
+#   stats) are only served to requests with the X-Admin-Token header set
+#   to EVAN_ADMIN_TOKEN, and not at all without one
+ADMIN_TOKEN = os.environ.get('EVAN_ADMIN_TOKEN')
+
+
+def admin_only(fun):
+    @wraps(fun)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get('X-Admin-Token', '')
+        if not ADMIN_TOKEN or not hmac.compare_digest(
+                token.encode(), ADMIN_TOKEN.encode()):
+            abort(404)
+        return fun(*args, **kwargs)
+    return wrapper
+
+
+@server.route("/_figure-cache")
+@admin_only
+def figure_cache_stats():
+    return jsonify(figure_cache.stats())
+
+
+@server.route("/_payload-stats")
+@admin_only
+def map_payload_stats():
+    return jsonify(payload_stats.stats())
+
+
+# wall time, bytes and inputs of the latest callback requests
+callback_timer = CallbackTimer()
+callback_timer.instrument(server)
+
+
+@server.route("/_callback-stats")
+@admin_only
+def callback_stats():
+    """Latency percentiles per callback and the `n` slowest requests."""
+    n = request.args.get('n', 20, type=int)
+    return jsonify({'callbacks': callback_timer.stats(),
+                    'slowest': callback_timer.slowest(n)})
+
 ###############################################################################
 # READ-IN DATASETS                                                            #
 ###############################################################################
 
-census = pd.read_csv("data/processed/census_viz.csv")
-parking_df = gpd.read_file("data/processed/vis_parking.csv")
-licence = pd.read_csv("data/processed/vis_licence.csv")
-boundary_df = gpd.read_file("data/raw/local_area_boundary.geojson"
-                            ).rename(columns={'name': 'LocalArea'})
-agg_licence = pd.read_csv("data/processed/vis_agg_licence.csv")
+common = app_data['common']
+boundary = common['boundary']
+boundary_df = common['boundary_df']
+
 
-with open("data/raw/local_area_boundary.geojson") as f:
-    boundary = json.load(f)
+@lazy
+def get_licence_by_year():
+    """Scatter map licences partitioned by year."""
+    return YearPartitions(app_data['licence']['licence'])
 
-for i in boundary['features']:
-    i['name'] = i['properties']['name']
-    i['id'] = i['properties']['mapid']
+
+@lazy
+def get_agg_cube():
+    """Business counts of every year/area/industry/type roll-up."""
+    return LicenceCube(app_data['licence']['agg_licence'])
 
 ###############################################################################
 # MODELLING                                                                   #
 ###############################################################################
 
-raw_vis_model = pd.read_csv("data/processed/vis_model.csv")
-y_valid = raw_vis_model[raw_vis_model.type == 'valid']['label']
-y_valid_pred = raw_vis_model[raw_vis_model.type == 'valid']['predict']
+y_valid = common['y_valid']
+y_valid_pred = common['y_valid_pred']
+
+
+@lazy
+def get_model():
+    return load('results/final_model.joblib')
+
+
+@lazy
+def get_raw_vis_model():
+    return app_data['model']['raw_vis_model']
+
+
+@lazy
+def get_census_cols():
+    return list(get_raw_vis_model().iloc[:, 14:109].columns)
+
 
-# load model
-model = load('results/final_model.joblib')
+@lazy
+def get_vis_model():
+    return get_raw_vis_model().drop(columns=get_census_cols())
 
-census_cols = list(raw_vis_model.iloc[:, 14:109].columns)
-vis_model = raw_vis_model.drop(columns=census_cols)
 
-vis_model['geometry'] = [
-    Point(vis_model['coord-y'].iloc[i],
-          vis_model[
-              'coord-x'].iloc[i]) for i in range(len(vis_model['coord-x']))]
-vis_model_gpd = gpd.GeoDataFrame(
-    vis_model, crs={'init': 'epsg:4326'}, geometry='geometry')
+@lazy
+def get_vis_model_index():
+    """Spatial index per (FOLDERYEAR, BusinessType), each built on
+    first use."""
+    return BusinessIndexes(get_vis_model())
+
+
+def preload():
+    """Load the data and indexes of every tab now instead of on first
+    use, e.g. in the gunicorn master so forked workers share them."""
+    get_licence_by_year()
+    get_agg_cube()
+    get_census_store()
+    get_parking()
+    get_vis_model_index().build_all()
+    get_scorer()
 
 # define functions
 
 
-def get_census_info(year, localarea):
-    """This function gets the census information for prediction."""
-    census_info = raw_vis_model[(raw_vis_model.FOLDERYEAR == year) & (
-        raw_vis_model.LocalArea == localarea)][census_cols].iloc[1]
-    return census_info.to_dict()
+@lazy
+def get_census_features():
+    """Census feature vectors for prediction by year and local area."""
+    return CensusFeatures(get_raw_vis_model(), get_census_cols())
+
+
+@lazy
+def get_scorer():
+    """Batch scorer of candidate businesses."""
+    return CandidateScorer(get_model(), get_vis_model(),
+                           get_census_features(), get_vis_model_index())
+
+
+@lazy
+def get_batcher():
+    """Groups concurrent single predictions into batches."""
+    return MicroBatcher(get_scorer())
 
 
-def get_similar_business(p, gpd):
+@server.route("/predict", methods=['POST'])
+def predict_candidates():
+    """Score a candidate business (a JSON object) or a batch of them
+    (a list), see src/04_visualization/prediction.py. An invalid
+    candidate is answered with 400, or an error item in a batch."""
+    candidates = request.get_json(force=True, silent=True)
+    if isinstance(candidates, list):
+        return jsonify(get_scorer().score_records(candidates))
+    if candidates is None:
+        return jsonify({'error': "the request body is not JSON"}), 400
+    error = get_scorer().validate(candidates)
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(get_batcher().submit(candidates))
+
+
+@server.route("/predict/stats")
+@admin_only
+def predict_stats():
+    return jsonify(get_scorer().stats())
+
+
+def get_similar_business(lat, lon, year, business_type):
     """This function gets the nearby similar businesses in a dataframe"""
-    other_points = gpd["geometry"].unary_union
-    nearest_geoms = nearest_points(p, other_points)
-    nearest_data = gpd.loc[gpd["geometry"] == nearest_geoms[1]]
+    nearest_data = get_vis_model_index().get(year, business_type).nearest(
+        lat, lon).copy()
 
     nearest_data['coord-x'] = [i + random.uniform(
         -0.0001, 0.0001) for i in nearest_data['coord-x']]
@@ -103,6 +227,24 @@ def get_similar_business(p, gpd):
     return nearest_data
 
 
+def empty_model_map(lat, lon, zoom):
+    """Payload of the prediction map without businesses."""
+    return compact_figure(go.Figure(
+        data=go.Scattermapbox(),
+        layout=go.Layout(
+            margin={'l': 0, 'r': 0, 't': 0, 'b': 0},
+            mapbox=dict(
+                center=dict(
+                    lat=lat,
+                    lon=lon),
+                style="carto-positron",
+                zoom=zoom
+            ),
+        ),
+
+    ), 'model-map')
+
+
 # static pie chart
 def confusion_matrix():
     matrix = metrics.confusion_matrix(y_true=y_valid, y_pred=y_valid_pred)
@@ -148,106 +290,111 @@ def confusion_matrix():
 ###############################################################################
 
 
-# Business licence wrangling
-licence = licence[licence.Status == 'Issued']
-
-industries = licence.BusinessIndustry.unique()
-localareas = boundary_df.LocalArea.unique()
-years = sorted(list(vis_model.FOLDERYEAR.unique()))
-businesstypes = agg_licence.BusinessType.unique()
-
-bt_lookup = {}
-for i in agg_licence.BusinessIndustry.unique():
-    bt_lookup[i] = list(agg_licence.loc[
-        agg_licence.BusinessIndustry == i].BusinessType.unique())
-bt_lookup['allindustry'] = businesstypes
+# Dropdown and slider values, prebuilt in the bundle
+industries = common['industries']
+localareas = common['localareas']
+years = common['years']
+licence_years = common['licence_years']
+businesstypes = common['businesstypes']
+bt_lookup = common['bt_lookup']
 
-# wrangle for choropleth (for future implementations)
-number_of_businesses = licence.groupby(
-    'LocalArea')['BusinessName'].apply(
-    lambda x: np.log(len(x.unique())))
-boundary_df = boundary_df.merge(pd.DataFrame(
-    number_of_businesses).reset_index(), how="left", on='LocalArea')
 
 # Census Dataset Wrangling
-edu_df = census[['LocalArea', 'Year',
-                 'University',
-                 'College',
-                 'Apprenticeship/Trades',
-                 'High school',
-                 'No certificate/diploma']]
-
-occ_df = census[['LocalArea', 'Year',
-                 'Management',
-                 'Business and finance',
-                 'Natural and applied sciences',
-                 'Health',
-                 'Social Science and education',
-                 'Art',
-                 'Sales and service',
-                 'Trades and transport',
-                 'Natural resources and agriculture',
-                 'Manufacturing and utilities',
-                 'Occupations n/a']]
-occ_df = occ_df.rename(columns={'Occupations n/a': 'Other'})
-
-age_df = census[['LocalArea', 'Year',
-                 'Under 20',
-                 '20 to 34',
-                 '35 to 44',
-                 '45 to 54',
-                 '55 to 64',
-                 '65 to 79',
-                 '80 and Older']]
-
-size_df = census[['LocalArea',
-                  'Year',
-                  '1 person',
-                  '2 persons',
-                  '3 persons',
-                  '4 to 5 persons',
-                  '6+ persons']]
-
-lang = census[['LocalArea', 'Year', 'English', 'French',
-               'Chinese languages', 'Tagalog (Filipino)',
-               'Panjabi (Punjabi)', 'Italian', 'German',
-               'Spanish', 'Vietnamese', 'Korean language',
-               'Hindi', 'Persian (Farsi)']]
-lang = lang.rename(columns={'Chinese languages': 'Chinese',
-                            'Korean language': 'Korean'})
-
-eth = census[['LocalArea', 'Year', 'Caucasian', 'Arab', 'Black',
-              'Chinese', 'Filipino', 'Japanese', 'Korean',
-              'Latin American', 'West Asian', 'South Asian',
-              'Southeast Asian']]
-
-tenure_df = census[['LocalArea', 'Year',
-                    'Owned',
-                    'Rented']]
-
-dwel_df = census[['LocalArea',
-                  'Year',
-                  'Apartment (<5 storeys)',
-                  'Apartment (5+ storeys)',
-                  'House']]
-
-trans_df = census[['LocalArea',
-                   'Year',
-                   'car as driver',
-                   'car as passenger',
-                   'public transportation',
-                   'walked',
-                   'bicycle',
-                   'other transportation']]
-trans_df = trans_df.rename(
-    columns={'car as driver': 'Car, as Driver',
-             'car as passenger': 'Car, as Passenger',
-             'public transportation': 'Public Transportation',
-             'walked': 'Walk',
-             'bicycle': 'Bicycle',
-             'other transportation': 'Other'})
-
-park = parking_df[['LocalArea', 'coord-x', 'coord-y']]
+@lazy
+def get_census_store():
+    """Labels and values of every census topic, census year and
+    local area, built when tab 2 is first used."""
+    census = app_data['census']['census']
+
+    edu_df = census[['LocalArea', 'Year',
+                     'University',
+                     'College',
+                     'Apprenticeship/Trades',
+                     'High school',
+                     'No certificate/diploma']]
+
+    occ_df = census[['LocalArea', 'Year',
+                     'Management',
+                     'Business and finance',
+                     'Natural and applied sciences',
+                     'Health',
+                     'Social Science and education',
+                     'Art',
+                     'Sales and service',
+                     'Trades and transport',
+                     'Natural resources and agriculture',
+                     'Manufacturing and utilities',
+                     'Occupations n/a']]
+    occ_df = occ_df.rename(columns={'Occupations n/a': 'Other'})
+
+    age_df = census[['LocalArea', 'Year',
+                     'Under 20',
+                     '20 to 34',
+                     '35 to 44',
+                     '45 to 54',
+                     '55 to 64',
+                     '65 to 79',
+                     '80 and Older']]
+
+    size_df = census[['LocalArea',
+                      'Year',
+                      '1 person',
+                      '2 persons',
+                      '3 persons',
+                      '4 to 5 persons',
+                      '6+ persons']]
+
+    lang = census[['LocalArea', 'Year', 'English', 'French',
+                   'Chinese languages', 'Tagalog (Filipino)',
+                   'Panjabi (Punjabi)', 'Italian', 'German',
+                   'Spanish', 'Vietnamese', 'Korean language',
+                   'Hindi', 'Persian (Farsi)']]
+    lang = lang.rename(columns={'Chinese languages': 'Chinese',
+                                'Korean language': 'Korean'})
+
+    eth = census[['LocalArea', 'Year', 'Caucasian', 'Arab', 'Black',
+                  'Chinese', 'Filipino', 'Japanese', 'Korean',
+                  'Latin American', 'West Asian', 'South Asian',
+                  'Southeast Asian']]
+
+    tenure_df = census[['LocalArea', 'Year',
+                        'Owned',
+                        'Rented']]
+
+    dwel_df = census[['LocalArea',
+                      'Year',
+                      'Apartment (<5 storeys)',
+                      'Apartment (5+ storeys)',
+                      'House']]
+
+    trans_df = census[['LocalArea',
+                       'Year',
+                       'car as driver',
+                       'car as passenger',
+                       'public transportation',
+                       'walked',
+                       'bicycle',
+                       'other transportation']]
+    trans_df = trans_df.rename(
+        columns={'car as driver': 'Car, as Driver',
+                 'car as passenger': 'Car, as Passenger',
+                 'public transportation': 'Public Transportation',
+                 'walked': 'Walk',
+                 'bicycle': 'Bicycle',
+                 'other transportation': 'Other'})
+
+    return CensusStore({
+        'edu': edu_df, 'occ': occ_df, 'age': age_df, 'size': size_df,
+        'lang': lang, 'eth': eth, 'tenure': tenure_df, 'dwelling': dwel_df,
+        'transport': trans_df,
+        'population': census[['LocalArea', 'Year', 'Age_total']]})
+
+
+@lazy
+def get_parking():
+    """Parking meters of tab 2."""
+    return app_data['census']['parking']
+
 
 list_of_neighbourhoods = {
     'Arbutus-Ridge': {'lat': 49.254093, 'lon': -123.160461},
@@ -325,6 +472,73 @@ def build_info_overlay(id, content):
     return div
 
 
+# Local area choropleths, highlighted in the browser by the clientside
+#   functions of assets/highlight.js: z of an area is 0 (not selected),
+#   1 (selected) or 2 (no selection)
+AREA_COLORSCALE = [[0, 'white'], [0.25, 'white'],
+                   [0.25, colors['ubc']], [0.75, colors['ubc']],
+                   [0.75, colors['deetken']], [1, colors['deetken']]]
+
+
+def area_trace(trace, locations, **kwargs):
+    return trace(locations=locations,
+                 z=[2] * len(boundary_df),
+                 zmin=0, zmax=2,
+                 colorscale=AREA_COLORSCALE,
+                 showscale=False,
+                 geojson=boundary,
+                 hovertext=boundary_df['LocalArea'],
+                 hovertemplate="<b>%{hovertext}</b><extra></extra>",
+                 **kwargs)
+
+
+@lazy
+def get_area_choropleth():
+    """Base figure of the local area choropleth of tab 1."""
+    return go.Figure(
+        area_trace(go.Choropleth, boundary_df['mapid'],
+                   featureidkey="properties.mapid")
+    ).update_geos(
+        fitbounds="locations",
+        visible=False,
+        projection_type="mercator"
+    ).update_layout(
+        margin={'l': 0, 'r': 0, 't': 0, 'b': 0},
+        showlegend=False)
+
+
+@lazy
+def get_van_map():
+    """Base figure of the local area map of tab 2."""
+    return go.Figure(
+        area_trace(go.Choroplethmapbox, boundary_df['LocalArea'],
+                   featureidkey='properties.name',
+                   marker_opacity=0.5)
+    ).update_layout(
+        mapbox_style="carto-positron",
+        mapbox_center={"lat": 49.252, "lon": -123.140},
+        mapbox_zoom=10.9,
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        showlegend=False,
+        hoverlabel=dict(
+            font_size=16,
+            font_family="sans-serif"),
+        annotations=[go.layout.Annotation(
+            x=0,
+            y=1,
+            text="Click the map to explore Vancouver Neighbourhoods",
+            showarrow=False,
+            font=dict(
+                family="sans-serif",
+                size=20,
+                color="White"),
+            bordercolor="Black",
+            borderwidth=0,
+            borderpad=6,
+            bgcolor="rgb(71, 71, 107)",
+            opacity=0.7)])
+
+
 # Get nearest census year and local area
 def get_year_area(year, clickData):
     # select nearest census year
@@ -346,27 +560,31 @@ def get_year_area(year, clickData):
     return census_year, area
 
 
-# Filter dataset by area and year, and melt
-def get_filter_melt(df, census_year, area):
-    df_filtered = df[(df.Year == census_year) & (df.LocalArea == area)]
-    df_filtered = df_filtered.melt(id_vars=['LocalArea', 'Year'])
-    return df_filtered
+# cache keys of the tab 2 callbacks: the clicked local area (and
+#   census year) is all their output depends on
+def area_key(clickData):
+    return None if clickData is None else \
+        clickData['points'][0]['location']
 
 
-# Create Tables for census data visualization
-def build_table(df, col_name, area, census_year, clickData):
+def census_key(clickData, year):
+    return (clickData is not None,) + get_year_area(year, clickData)
 
-    # filter by area and year
-    df_filtered = df[(df.Year == census_year) & (
-        df.LocalArea.isin([area, 'City of Vancouver']))]
-    df_filtered.drop(columns=['Year'], inplace=True)
-    df_filtered.set_index('LocalArea', inplace=True)
-    df_filtered = df_filtered.T
 
-    # select the top 5 values
-    df_filtered = df_filtered.sort_values(by=[area], ascending=False)
-    df_filtered.reset_index(inplace=True)
-    df_filtered = df_filtered[0:5].copy()
+def year_area_key(clickData, year):
+    return area_key(clickData), year
+
+
+# Create Tables for census data visualization
+def build_table(topic, col_name, area, census_year, clickData):
+
+    # select the top 5 values of the area, and the city values of the
+    #   same labels
+    store = get_census_store()
+    labels, values = store.top(topic, census_year, area, 5)
+    van_labels, van_values = store.get(
+        topic, census_year, 'City of Vancouver')
+    van_values = van_values[[list(van_labels).index(i) for i in labels]]
 
     # format long neighbourhood names
     name_area = re.sub(r"-", "-<br>", area)
@@ -385,10 +603,9 @@ def build_table(df, col_name, area, census_year, clickData):
                         font=dict(color='white', size=22),
                         height=40),
                     cells=dict(
-                        values=[df_filtered['index'],
-                                round(df_filtered[area]*100, 2),
-                                round(df_filtered[
-                                    'City of Vancouver']*100, 2)],
+                        values=[labels,
+                                np.round(values*100, 2),
+                                np.round(van_values*100, 2)],
                         fill=dict(color=['white']),
                         suffix=['', '%'],
                         align=['center'],
@@ -410,8 +627,8 @@ def build_table(df, col_name, area, census_year, clickData):
                         font=dict(color='white', size=22),
                         height=40),
                     cells=dict(
-                        values=[df_filtered['index'],
-                                round(df_filtered[area]*100, 2)],
+                        values=[labels,
+                                np.round(values*100, 2)],
                         fill=dict(color=['white']),
                         suffix=['', '%'],
                         align=['center'],
@@ -428,14 +645,14 @@ def build_table(df, col_name, area, census_year, clickData):
 
 
 # Create bar graph for census data visualization
-def build_bar(df, census_year, area, clickData, xaxis, yaxis, range=None):
+def build_bar(topic, census_year, area, clickData, xaxis, yaxis, range=None):
 
-    area_df = get_filter_melt(df, census_year, area)
+    labels, values = get_census_store().get(topic, census_year, area)
 
     fig = go.Figure(
         data=go.Bar(
-            x=area_df['variable'],
-            y=area_df['value']*100,
+            x=labels,
+            y=values*100,
             name=area,
             marker_color='#19B1BA',
             hovertemplate="%{x}: %{y:.1f}%<extra></extra>"),
@@ -445,12 +662,13 @@ def build_bar(df, census_year, area, clickData, xaxis, yaxis, range=None):
             plot_bgcolor=colors['purple2']))
 
     if clickData is not None:
-        van_df = get_filter_melt(df, census_year, "City of Vancouver")
+        van_labels, van_values = get_census_store().get(
+            topic, census_year, "City of Vancouver")
 
         fig.add_trace(
             go.Bar(
-                x=van_df['variable'],
-                y=van_df['value']*100,
+                x=van_labels,
+                y=van_values*100,
                 name='City of Vancouver',
                 marker_color='#afb0b3',
                 hovertemplate="%{x}: %{y:.1f}%<extra></extra>"
@@ -574,6 +792,7 @@ def build_tab1():
                                 children=[
                                     dcc.Graph(
                                         id='localarea-map',
+                                        figure=get_area_choropleth(),
                                         config={'displayModeBar': False,
                                                 'scrollZoom': False})
                                 ]
@@ -585,8 +804,9 @@ def build_tab1():
                     html.Div(
                         className="two-thirds column map__slider__container",
                         children=[
-                            # map
+                            # map, drawn from its compact payload
                             dcc.Graph(id='scatter-map'),
+                            dcc.Store(id='scatter-map-payload'),
 
 
                             # slider
@@ -595,8 +815,8 @@ def build_tab1():
                                 children=[
                                     dcc.Slider(
                                         id='year-slider',
-                                        min=licence['FOLDERYEAR'].min(),
-                                        max=licence['FOLDERYEAR'].max(),
+                                        min=min(licence_years),
+                                        max=max(licence_years),
                                         value=2010,
                                         marks={str(year): {
                                             'label': str(year),
@@ -716,6 +936,7 @@ def build_tab2():
                                     # map
                                     dcc.Graph(
                                         id='van_map',
+                                        figure=get_van_map(),
                                         style={
                                             "visibility": "visible"},
                                         config=config),
@@ -726,16 +947,14 @@ def build_tab2():
                                         children=[
                                             dcc.Slider(
                                                 id='year_slider_census',
-                                                min=licence['FOLDERYEAR'].min(
-                                                ),
-                                                max=licence['FOLDERYEAR'].max(
-                                                ),
+                                                min=min(licence_years),
+                                                max=max(licence_years),
                                                 value=2016,
                                                 marks={str(year): {
                                                     'label': str(year),
                                                     'style': {'color': 'white'}
                                                     }
-                                                    for year in licence['FOLDERYEAR'].unique()},
+                                                    for year in licence_years},
                                                 step=None
                                             )
                                         ]
@@ -1023,7 +1242,8 @@ def build_tab2():
                                             ],
                                         ),
                                         dcc.Graph(id='parking_graph',
-                                                  config=config)
+                                                  config=config),
+                                        dcc.Store(id='parking_graph-payload')
                                     ]
                                 )
                             ], style={'marginTop': 50}),
@@ -1243,6 +1463,7 @@ def build_tab3():
                 children=[
                     # model map
                     dcc.Graph(id='model-map'),
+                    dcc.Store(id='model-map-payload'),
 
                     # year slider
                     html.Div(
@@ -1250,8 +1471,8 @@ def build_tab3():
                         children=[
                             dcc.Slider(
                                 id='year-slider3',
-                                min=licence['FOLDERYEAR'].min(),
-                                max=licence['FOLDERYEAR'].max(),
+                                min=min(licence_years),
+                                max=max(licence_years),
                                 value=2019,
                                 marks={str(year): {
                                     'label': str(year),
@@ -1408,43 +1629,12 @@ def set_bt_options(SelectedIndustry):
         return [{'label': i, 'value': i} for i in bt_lookup['allindustry']]
 
 
-# update choropleth
-@app.callback(
+# highlight the selected local area on the choropleth, in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace='highlight', function_name='choropleth'),
     Output("localarea-map", "figure"),
     [Input("localarea-dropdown", "value")],
-)
-def update_choropleth(SelectedLocalArea):
-
-    if SelectedLocalArea:
-        boundary_df['color'] = ['not-selected']*22
-    else:
-        boundary_df['color'] = ['blank']*22
-
-    boundary_df.loc[
-        boundary_df.LocalArea == SelectedLocalArea,
-        'color'] = 'selected'
-
-    return go.Figure(px.choropleth(
-        boundary_df,
-        geojson=boundary,
-        color="color",
-        color_discrete_map={'not-selected': 'white',
-                            'selected': colors['ubc'],
-                            'blank': colors['deetken']},
-        featureidkey="properties.mapid",
-        locations="mapid",
-        projection="mercator",
-        hover_name="LocalArea",
-        hover_data={"color": False,
-                    "mapid": False}
-    )
-    ).update_geos(
-        fitbounds="locations",
-        visible=False
-    ).update_layout(
-        margin={'l': 0, 'r': 0, 't': 0, 'b': 0},
-        coloraxis_showscale=False,
-        showlegend=False)
+    [State("localarea-map", "figure")])
 
 
 # update histogram
@@ -1453,32 +1643,15 @@ def update_choropleth(SelectedLocalArea):
     [Input("industry-dropdown", "value"),
      Input("localarea-dropdown", "value")],
 )
+@figure_cache.memoize()
 def update_histogram(SelectedIndustry, SelectedLocalArea):
-    sum_col = 'BusinessType'
+    # business types of an industry, otherwise industries
+    sum_col = 'BusinessType' if SelectedIndustry else 'BusinessIndustry'
 
-    if SelectedIndustry and SelectedLocalArea:
-        histogram_df = agg_licence[
-            agg_licence.BusinessIndustry == SelectedIndustry
-        ]
-        histogram_df = histogram_df[
-            histogram_df.LocalArea == SelectedLocalArea
-        ]
-    elif SelectedIndustry:
-        histogram_df = agg_licence[
-            agg_licence.BusinessIndustry == SelectedIndustry
-        ]
-    elif SelectedLocalArea:
-        sum_col = 'BusinessIndustry'
-        histogram_df = agg_licence[
-            agg_licence.LocalArea == SelectedLocalArea
-        ]
-    else:
-        histogram_df = agg_licence.copy()
-        sum_col = 'BusinessIndustry'
-
-    histogram_df = pd.DataFrame(
-        histogram_df.groupby([sum_col])[
-            'business_id'].sum()).reset_index()
+    histogram_df = get_agg_cube().breakdown(
+        sum_col,
+        BusinessIndustry=SelectedIndustry,
+        LocalArea=SelectedLocalArea).reset_index()
     histogram_df = histogram_df.sort_values(
         'business_id')
 
@@ -1527,28 +1700,16 @@ def update_histogram(SelectedIndustry, SelectedLocalArea):
      Input("localarea-dropdown", "value"),
      Input('businesstype-dropdown-tab1', 'value')],
 )
+@figure_cache.memoize()
 def update_line(SelectedIndustry,
                 SelectedLocalArea,
                 SelectedBusinessType):
 
-    if SelectedIndustry or SelectedLocalArea or SelectedBusinessType:
-        line_df = agg_licence.copy()
-
-        if SelectedIndustry:
-            line_df = line_df[
-                line_df.BusinessIndustry == SelectedIndustry]
-        if SelectedLocalArea:
-            line_df = line_df[line_df.LocalArea == SelectedLocalArea]
-        if SelectedBusinessType:
-            line_df = line_df[
-                line_df.BusinessType == SelectedBusinessType]
-
-        line_df = pd.DataFrame(line_df.groupby([
-            'FOLDERYEAR'])['business_id'].sum()).reset_index()
-
-    else:
-        line_df = pd.DataFrame(agg_licence.groupby([
-            'FOLDERYEAR'])['business_id'].sum()).reset_index()\
+    line_df = get_agg_cube().breakdown(
+        'FOLDERYEAR',
+        BusinessIndustry=SelectedIndustry,
+        LocalArea=SelectedLocalArea,
+        BusinessType=SelectedBusinessType).reset_index()
 
     y_title = "Count of Unique Businesses"
 
@@ -1575,11 +1736,12 @@ def update_line(SelectedIndustry,
 
 # update map
 @app.callback(
-    Output('scatter-map', 'figure'),
+    Output('scatter-map-payload', 'data'),
     [Input('industry-dropdown', 'value'),
      Input('year-slider', 'value'),
      Input('localarea-dropdown', 'value'),
      Input('businesstype-dropdown-tab1', 'value')])
+@figure_cache.memoize()
 def update_figure(SelectedIndustry,
                   SelectedYear,
                   SelectedLocalArea,
@@ -1589,26 +1751,23 @@ def update_figure(SelectedIndustry,
     zoom = 11
     opacity = 0.5
 
-    filtered_df = licence[
-        licence.FOLDERYEAR == SelectedYear]
+    # filter licence data for a year, industry, business type
+    #   and neighbourhood
+    filtered_df = get_licence_by_year().select(
+        SelectedYear,
+        BusinessIndustry=SelectedIndustry or None,
+        BusinessType=SelectedBusinessType or None,
+        LocalArea=SelectedLocalArea or None)
 
-    # filter licence data for an industry
     if SelectedIndustry:
-        filtered_df = filtered_df[
-            filtered_df.BusinessIndustry == SelectedIndustry]
         opacity = 0.7
 
-    # filter licence data for business type
     if SelectedBusinessType:
-        filtered_df = filtered_df[
-            filtered_df.BusinessType == SelectedBusinessType]
         opacity = 0.8
 
     # zoom in for selected neighbourhood
     if SelectedLocalArea:
         zoom = 13
-        filtered_df = filtered_df[
-            filtered_df.LocalArea == SelectedLocalArea]
         latInitial = list_of_neighbourhoods[
             SelectedLocalArea]['lat']
         lonInitial = list_of_neighbourhoods[
@@ -1618,49 +1777,49 @@ def update_figure(SelectedIndustry,
     # add colour based on NextYearStatus
     list_of_status = ['Issued', 'Inactive', 'Pending',
                       'Cancelled', 'Gone Out of Business']
+    status_rows = filtered_df.groupby('NextYearStatus').indices
+    # above MAX_POINTS licences, show their number per grid cell
+    binned = len(filtered_df) > MAX_POINTS
     traces = []
     for i in list_of_status:
-        df_by_status = filtered_df[
-            filtered_df['NextYearStatus'] == i]
-
-        customdata = pd.DataFrame({
-            'Business Name': df_by_status.BusinessName,
-            'Business Type': df_by_status.BusinessType,
-        }
-        )
+        df_by_status = filtered_df.iloc[status_rows.get(i, [])]
+
+        if binned:
+            cells = bin_points(df_by_status, zoom)
+            points = dict(
+                lat=cells['coord-y'],
+                lon=cells['coord-x'],
+                text=cells['count'],
+                marker=dict(
+                    opacity=opacity,
+                    size=marker_sizes(cells['count'])),
+                hovertemplate="Businesses: %{text}<extra></extra>")
+        else:
+            customdata = pd.DataFrame({
+                'Business Name': df_by_status.BusinessName,
+                'Business Type': df_by_status.BusinessType,
+            }
+            )
+            points = dict(
+                lat=df_by_status['coord-y'],
+                lon=df_by_status['coord-x'],
+                customdata=customdata,
+                marker=dict(
+                    opacity=opacity,
+                    size=4),
+                hovertemplate="Business Name: %{customdata[0]}</b><br>Business Type: %{customdata[1]}")
 
         # choose a status to show on map
-        if i == 'Issued':
-            traces.append(
-                go.Scattermapbox(
-                    lat=df_by_status['coord-y'],
-                    lon=df_by_status['coord-x'],
-                    customdata=customdata,
-                    mode="markers",
-                    name=i,
-                    marker=dict(
-                        opacity=opacity,
-                        size=4),
-                    hovertemplate="Business Name: %{customdata[0]}</b><br>Business Type: %{customdata[1]}"
-                )
-            )
-        else:
-            traces.append(
-                go.Scattermapbox(
-                    lat=df_by_status['coord-y'],
-                    lon=df_by_status['coord-x'],
-                    customdata=customdata,
-                    mode="markers",
-                    name=i,
-                    marker=dict(
-                        opacity=opacity,
-                        size=4),
-                    visible='legendonly',
-                    hovertemplate="Business Name: %{customdata[0]}</b><br>Business Type: %{customdata[1]}"
-                )
+        traces.append(
+            go.Scattermapbox(
+                mode="markers",
+                name=i,
+                visible=True if i == 'Issued' else 'legendonly',
+                **points
             )
+        )
 
-    return go.Figure(
+    return compact_figure(go.Figure(
 
         data=traces,
 
@@ -1689,89 +1848,55 @@ def update_figure(SelectedIndustry,
                 bearing=0
             ),
         )
-    )
+    ), 'scatter-map')
 
 
 for id in ['histogram', 'line']:
-    @app.callback([Output(f"{id}-modal", 'style'),
-                   Output(f"{id}-div", 'style')],
-                  [Input(f'show-{id}-modal', 'n_clicks'),
-                   Input(f'close-{id}-modal', 'n_clicks')])
-    def toggle_modal_1(n_show, n_close):
-        ctx = dash.callback_context
-        if ctx.triggered and ctx.triggered[0]['prop_id'].startswith('show-'):
-            return {"display": "block"}, {'zIndex': 1003}
-        else:
-            return {"display": "none"}, {'zIndex': 0}
+    app.clientside_callback(
+        ClientsideFunction(namespace='modal', function_name='toggle'),
+        [Output(f"{id}-modal", 'style'),
+         Output(f"{id}-div", 'style')],
+        [Input(f'show-{id}-modal', 'n_clicks_timestamp'),
+         Input(f'close-{id}-modal', 'n_clicks_timestamp')])
 
 ########################################
 # TAB 2 - UPDATES                      #
 ########################################
 
 
-# Define callback to update vancouver map
-@app.callback(
+# highlight the clicked local area on the vancouver map, in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace='highlight', function_name='van_map'),
     Output('van_map', 'figure'),
-    [Input('van_map', 'clickData')])
-def update_van_map(clickData):
+    [Input('van_map', 'clickData')],
+    [State('van_map', 'figure')])
 
-    boundary_df['color'] = ['blank']*22
 
-    if clickData is not None:
-        boundary_df['color'] = ['not-selected']*22
-        neighbour = (clickData['points'][0]['location'])
-        boundary_df.loc[
-            boundary_df.LocalArea == neighbour,
-            'color'] = 'selected'
-
-    graph_map = px.choropleth_mapbox(boundary_df,
-                                     geojson=boundary,
-                                     locations='LocalArea',
-                                     featureidkey='properties.name',
-                                     opacity=0.5,
-                                     color="color",
-                                     color_discrete_map={
-                                         'not-selected': 'white',
-                                         'selected': colors['ubc'],
-                                         'blank': colors['deetken']},
-                                     hover_name='LocalArea',
-                                     hover_data={'LocalArea': False,
-                                                 'color': False},
-                                     mapbox_style="carto-positron",
-                                     center={"lat": 49.252, "lon": -123.140},
-                                     zoom=10.9)
-
-    graph_map.update_layout(
-        margin={"r": 0, "t": 0, "l": 0, "b": 0},
-        coloraxis_showscale=False,
-        showlegend=False,
-        hoverlabel=dict(
-            font_size=16,
-            font_family="sans-serif"),
-        annotations=[go.layout.Annotation(
-            x=0,
-            y=1,
-            text="Click the map to explore Vancouver Neighbourhoods",
-            showarrow=False,
-            font=dict(
-                family="sans-serif",
-                size=20,
-                color="White"),
-            bordercolor="Black",
-            borderwidth=0,
-            borderpad=6,
-            bgcolor="rgb(71, 71, 107)",
-            opacity=0.7)])
+# A click on the map (or a census year) refreshes every graph of the tab.
+#   With EVAN_TAB2_BATCH=1 they are all served by update_neighbourhood,
+#   one request per click, instead of one callback (and request) each
+TAB2_BATCH = os.environ.get('EVAN_TAB2_BATCH') == '1'
+tab2_callbacks = []
+
 
-    return graph_map
+def tab2_callback(output, inputs):
+    """app.callback of a tab 2 graph, or its part of update_neighbourhood
+    in batch mode."""
+    def decorator(fun):
+        if not TAB2_BATCH:
+            return app.callback(output, inputs)(fun)
+        tab2_callbacks.append((output, len(inputs), fun))
+        return fun
+    return decorator
 
 
 # update graph info overlay by local area + year
-@app.callback(
+@tab2_callback(
     [Output("people-info-overlay", 'children'),
      Output("inf-info-overlay", "children")],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_people_overlay(clickData, year):
 
     census_year, area = get_year_area(year, clickData)
@@ -1950,11 +2075,12 @@ def update_people_overlay(clickData, year):
 
 
 # update education graph by local area
-@app.callback(
+@tab2_callback(
     [Output("edu-title", 'children'),
      Output("edu_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_edu(clickData, year):
 
     # Get census year and local area
@@ -1964,7 +2090,7 @@ def update_edu(clickData, year):
     title = ("Highest Level of Education Achieved, in " + str(census_year))
 
     # create bar graph
-    fig = build_bar(edu_df,
+    fig = build_bar('edu',
                     census_year,
                     area,
                     clickData,
@@ -1975,11 +2101,12 @@ def update_edu(clickData, year):
 
 
 # update occupation graph by local area and year
-@app.callback(
+@tab2_callback(
     [Output("occ-title", 'children'),
      Output("occ_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_occ(clickData, year):
 
     # Get census year and local area
@@ -1989,13 +2116,12 @@ def update_occ(clickData, year):
     title = (
         str(area) + "'s Distribution of Occupation Industries, in " + str(census_year))
 
-    df = get_filter_melt(occ_df, census_year, area)
-    df = df.sort_values('value', ascending=False)
+    labels, values = get_census_store().top('occ', census_year, area)
 
     fig = go.Figure(
         data=go.Bar(
-            y=df["variable"],
-            x=df['value']*100,
+            y=labels,
+            x=values*100,
             orientation='h',
             name=area,
             marker_color='#19B1BA',
@@ -2023,19 +2149,19 @@ def update_occ(clickData, year):
                 showarrow=False,
                 font=dict(color=colors['ubc']),
             )
-            for xi, yi in zip(df['value'],
-                              df['variable'])
+            for xi, yi in zip(values, labels)
         ],)
 
     return title, fig
 
 
 # update age graph by local area
-@app.callback(
+@tab2_callback(
     [Output("age-title", 'children'),
      Output("age_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_age(clickData, year):
 
     # Get census year and local area
@@ -2044,12 +2170,12 @@ def update_age(clickData, year):
     # Set graph title
     title = ("Age Distribution of Population, in " + str(census_year))
 
-    df = get_filter_melt(age_df, census_year, area)
+    labels, values = get_census_store().get('age', census_year, area)
 
     fig = go.Figure(
         data=go.Scatter(
-            x=df['variable'],
-            y=df['value']*100,
+            x=labels,
+            y=values*100,
             mode='lines+markers',
             marker=dict(
                 color='#19B1BA',
@@ -2065,12 +2191,13 @@ def update_age(clickData, year):
             plot_bgcolor=colors['purple2']))
 
     if clickData is not None:
-        van_df = df = get_filter_melt(age_df, census_year, "City of Vancouver")
+        van_labels, van_values = get_census_store().get(
+            'age', census_year, "City of Vancouver")
 
         fig.add_trace(
             go.Scatter(
-                x=van_df['variable'],
-                y=van_df['value']*100,
+                x=van_labels,
+                y=van_values*100,
                 mode='lines+markers',
                 marker=dict(
                     color='#afb0b3',
@@ -2093,11 +2220,12 @@ def update_age(clickData, year):
 
 
 # update household size graph by local area
-@app.callback(
+@tab2_callback(
     [Output("size-title", 'children'),
      Output("size_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_size(clickData, year):
 
     # Get census year and local area
@@ -2107,7 +2235,7 @@ def update_size(clickData, year):
     title = ("Household Size, in " + str(census_year))
 
     # Create bar graph
-    fig = build_bar(size_df,
+    fig = build_bar('size',
                     census_year,
                     area,
                     clickData,
@@ -2118,11 +2246,12 @@ def update_size(clickData, year):
 
 
 # update languages table by local area and year
-@app.callback(
+@tab2_callback(
     [Output("lang-title", 'children'),
      Output("lang_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_lang(clickData, year):
 
     # Get census year and local area
@@ -2132,17 +2261,18 @@ def update_lang(clickData, year):
     title = ("Language Composition, in " + str(census_year))
 
     # Create table
-    fig = build_table(lang, "LANGUAGES", area, census_year, clickData)
+    fig = build_table('lang', "LANGUAGES", area, census_year, clickData)
 
     return title, fig
 
 
 # update ethnicity table by local area and year
-@app.callback(
+@tab2_callback(
     [Output("eth-title", 'children'),
      Output("eth_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_eth(clickData, year):
 
     # Get census year and local area
@@ -2152,17 +2282,18 @@ def update_eth(clickData, year):
     title = ("Ethnic Composition, in " + str(census_year))
 
     # Create table
-    fig = build_table(eth, "ETHNICITIES", area, census_year, clickData)
+    fig = build_table('eth', "ETHNICITIES", area, census_year, clickData)
 
     return title, fig
 
 
 # update housing tenure graph by local area and year
-@app.callback(
+@tab2_callback(
     [Output("tenure-title", 'children'),
      Output("tenure_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_tenure(clickData, year):
 
     # Get census year and local area
@@ -2171,15 +2302,15 @@ def update_tenure(clickData, year):
     # Set graph title
     title = (str(area) + "'s Housing Tenure Distribution, in " + str(census_year))
 
-    df = get_filter_melt(tenure_df, census_year, area)
+    labels, values = get_census_store().get('tenure', census_year, area)
 
     colours = ['forestgreen',
                '#19B1BA']
 
     fig = go.Figure(
         data=go.Pie(
-            labels=df["variable"],
-            values=df['value'],
+            labels=labels,
+            values=values,
             textinfo='label+percent',
             textfont=dict(
                 size=20,
@@ -2204,11 +2335,12 @@ def update_tenure(clickData, year):
 
 
 # update dwelling type graph by local area and year
-@app.callback(
+@tab2_callback(
     [Output("dwelling-title", 'children'),
      Output("dwelling_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_dwelling(clickData, year):
 
     # Get census year and local area
@@ -2218,7 +2350,7 @@ def update_dwelling(clickData, year):
     title = ("Distribution of Dwelling Types, in " + str(census_year))
 
     # Create bar graph
-    fig = build_bar(dwel_df,
+    fig = build_bar('dwelling',
                     census_year,
                     area,
                     clickData,
@@ -2230,11 +2362,12 @@ def update_dwelling(clickData, year):
 
 
 # update transportation graph by local area and year
-@app.callback(
+@tab2_callback(
     [Output("transport-title", 'children'),
      Output("transport_graph", 'figure')],
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=census_key)
 def update_transport(clickData, year):
 
     # Get census year and local area
@@ -2245,7 +2378,7 @@ def update_transport(clickData, year):
         "Dominant Form of Transportation used by Residents, in " + str(census_year))
 
     # Create bar graph
-    fig = build_bar(trans_df,
+    fig = build_bar('transport',
                     census_year,
                     area,
                     clickData,
@@ -2256,22 +2389,22 @@ def update_transport(clickData, year):
 
 
 # update parking graph by local area
-@app.callback(
+@tab2_callback(
     [Output("parking-title", 'children'),
-     Output("parking_graph", 'figure')],
+     Output("parking_graph-payload", 'data')],
     [Input('van_map', 'clickData')])
+@figure_cache.memoize(key=area_key)
 def update_parking(clickData):
     latInitial = 49.252
     lonInitial = -123.140
     zoom = 10.7
-    df = park.copy()
+    df = get_parking()
 
     # zoom in for selected neighbourhood
     if clickData is not None:
         area = (clickData['points'][0]['location'])
         zoom = 12
-        df = park[
-            park.LocalArea == area]
+        df = df[df.LocalArea == area]
         latInitial = list_of_neighbourhoods[
             area]['lat']
         lonInitial = list_of_neighbourhoods[
@@ -2283,6 +2416,12 @@ def update_parking(clickData):
     # get count of parking spots
     num = len(df['coord-x'])
 
+    # above MAX_POINTS spots, show their number per grid cell
+    size = 4
+    if num > MAX_POINTS:
+        df = bin_points(df, zoom)
+        size = marker_sizes(df['count'])
+
     fig = go.Figure(
         data=go.Scattermapbox(
             lat=df['coord-y'],
@@ -2291,7 +2430,7 @@ def update_parking(clickData):
             hoverinfo="none",
             marker=dict(
                 opacity=0.6,
-                size=4)
+                size=size)
         ),
         layout=go.Layout(
             margin={'l': 0, 'r': 0, 't': 0, 'b': 0},
@@ -2324,43 +2463,32 @@ def update_parking(clickData):
             bearing=0)
     )
 
-    return title, fig
+    return title, compact_figure(fig, 'parking_graph')
 
 
-@app.callback(
+@tab2_callback(
     Output('summary_info', 'children'),
     [Input('van_map', 'clickData'),
      Input('year_slider_census', 'value')])
+@figure_cache.memoize(key=year_area_key)
 def update_side_bar(clickData, year):
 
     # Get census year and local area
     census_year, area = get_year_area(year, clickData)
 
-    if clickData is not None:
-        biz_df = agg_licence[(agg_licence.FOLDERYEAR == year)
-                             & (agg_licence.LocalArea == area)]
-        biz_num = pd.DataFrame(
-            biz_df.groupby(['LocalArea', 'FOLDERYEAR'])[
-                'business_id'].sum()).reset_index()
-    else:
-        biz_df = agg_licence[(agg_licence.FOLDERYEAR == year)]
-        biz_num = pd.DataFrame(
-            biz_df.groupby(['FOLDERYEAR'])[
-                'business_id'].sum()).reset_index()
-
     # calculate number of businesses
-    biz_num = biz_num.business_id[0]
+    biz_num = get_agg_cube().total(
+        FOLDERYEAR=year,
+        LocalArea=area if clickData is not None else None)
 
     # Calculate total population
-    pop_df = census[['LocalArea', 'Year', 'Age_total']]
-    pop_df = pop_df[(pop_df.Year == census_year) & (pop_df.LocalArea == area)]
-    pop = int(pop_df.Age_total)
+    store = get_census_store()
+    _, pop = store.get('population', census_year, area)
+    pop = int(pop[0])
 
     # Calculate dominant age group
-    age = get_filter_melt(age_df, census_year, area)
-    age = age[age.value == age.value.max()].reset_index()
-    age_frac = age.value[0]
-    age_group = age.variable[0]
+    age_group, age_frac = store.top('age', census_year, area, 1)
+    age_group, age_frac = age_group[0], age_frac[0]
 
     # format html output for the summary stats
     sum_info = html.Div(
@@ -2395,6 +2523,30 @@ def update_side_bar(clickData, year):
     return sum_info
 
 
+if TAB2_BATCH:
+    @app.callback(
+        sum([o if isinstance(o, list) else [o]
+             for o, _, _ in tab2_callbacks], []),
+        [Input('van_map', 'clickData'),
+         Input('year_slider_census', 'value')])
+    def update_neighbourhood(clickData, year):
+        """Outputs of all the tab 2 callbacks for a click, in one
+        request."""
+        triggered = [t['prop_id'] for t in dash.callback_context.triggered]
+        year_only = triggered == ['year_slider_census.value']
+
+        outputs = []
+        for output, n_inputs, fun in tab2_callbacks:
+            n_outputs = len(output) if isinstance(output, list) else 1
+            if year_only and n_inputs == 1:
+                # a graph of the local area only (parking) is unchanged
+                outputs += [dash.no_update] * n_outputs
+                continue
+            result = fun(*[clickData, year][:n_inputs])
+            outputs += list(result) if n_outputs > 1 else [result]
+        return outputs
+
+
 # reset the selections
 @app.callback(Output('van_map', 'clickData'),
               [Input('clearButton', 'n_clicks')])
@@ -2406,16 +2558,12 @@ def reset_selection(n_clicks):
 for id in ['age', 'size', 'eth', 'lang', 'edu',
            'occ', 'tenure', 'dwelling', 'transport',
            'parking']:
-    @app.callback([Output(f"{id}-modal", 'style'),
-                   Output(f"{id}-div", 'style')],
-                  [Input(f'show-{id}-modal', 'n_clicks'),
-                   Input(f'close-{id}-modal', 'n_clicks')])
-    def toggle_modal_2(n_show, n_close):
-        ctx = dash.callback_context
-        if ctx.triggered and ctx.triggered[0]['prop_id'].startswith('show-'):
-            return {"display": "block"}, {'zIndex': 1003}
-        else:
-            return {"display": "none"}, {'zIndex': 0}
+    app.clientside_callback(
+        ClientsideFunction(namespace='modal', function_name='toggle'),
+        [Output(f"{id}-modal", 'style'),
+         Output(f"{id}-div", 'style')],
+        [Input(f'show-{id}-modal', 'n_clicks_timestamp'),
+         Input(f'close-{id}-modal', 'n_clicks_timestamp')])
 
 ########################################
 # TAB 3 - UPDATES                      #
@@ -2424,7 +2572,7 @@ for id in ['age', 'size', 'eth', 'lang', 'edu',
 
 # update map
 @app.callback(
-    [Output('model-map', 'figure'),
+    [Output('model-map-payload', 'data'),
      Output('predict_text1', 'children'),
      Output('predict_text2', 'children')],
     [Input('localarea-dropdown3', 'value'),
@@ -2457,20 +2605,8 @@ def update_figure3(SelectedLocalArea,
             InputFee is None) or (
             InputEmployee is None):
 
-        return go.Figure(
-            data=go.Scattermapbox(),
-            layout=go.Layout(
-                margin={'l': 0, 'r': 0, 't': 0, 'b': 0},
-                mapbox=dict(
-                    center=dict(
-                        lat=latInitial,
-                        lon=lonInitial),
-                    style="carto-positron",
-                    zoom=zoom
-                ),
-            ),
-
-        ), "Predicted results", ""
+        return empty_model_map(latInitial, lonInitial, zoom), \
+            "Predicted results", ""
 
     # zoom in for selected neighbourhood
     if SelectedLocalArea:
@@ -2480,44 +2616,34 @@ def update_figure3(SelectedLocalArea,
         lonInitial = list_of_neighbourhoods[
             SelectedLocalArea]['lon']
 
-    df_tab3 = vis_model[
-        (vis_model.FOLDERYEAR == SelectedYear) & (
-            vis_model.BusinessType == SelectedType)
-    ]
+    df_tab3 = get_vis_model_index().get(SelectedYear, SelectedType).df
 
-    gpd_tab3 = vis_model_gpd[
-        (vis_model_gpd.FOLDERYEAR == SelectedYear) & (
-            vis_model_gpd.BusinessType == SelectedType)
-    ]
+    candidate = {
+        'FOLDERYEAR': SelectedYear,
+        'BusinessType': SelectedType,
+        'LocalArea': SelectedLocalArea,
+        'history': SelectedHistory,
+        'NumberofEmployees': InputEmployee,
+        'FeePaid': InputFee,
+        'BusinessName': InputName,
+        'lat': InputLat,
+        'lon': InputLon}
 
-    row = get_census_info(SelectedYear, SelectedLocalArea)
-    row['FOLDERYEAR'] = SelectedYear
-    row['BusinessType'] = SelectedType
-    row['LocalArea'] = SelectedLocalArea
-    row['history'] = SelectedHistory
-    row['NumberofEmployees'] = InputEmployee
-    row['FeePaid'] = InputFee
-    row['Parking meters'] = np.mean(vis_model['Parking meters'])
-    row['Disability parking'] = np.mean(vis_model['Disability parking'])
-    row['nearest_business_count'] = np.nan
-    try:
-        row['chain'] = vis_model.loc[vis_model.BusinessName ==
-                                     InputName, 'chain'].values[0] + 1
-    except:
-        row['chain'] = 1
-    row = pd.DataFrame(row, index=[0])
-
-    # get nearby similar businesses
+    # get nearby similar businesses, their count is a model feature
     if InputLat and InputLon:
         latInitial = InputLat
         lonInitial = InputLon
         zoom = 17
         similar_business_df = get_similar_business(
-            Point(InputLat, InputLon), gpd_tab3)
-        row.loc[:, 'nearest_business_count'] = len(similar_business_df)
-
-    predict_proba = round(max(model.predict_proba(row)[0]), 4)
-    predict = model.predict(row)
+            InputLat, InputLon, SelectedYear, SelectedType)
+        candidate['nearest_business_count'] = len(similar_business_df)
+
+    result = get_batcher().submit(candidate)
+    if 'error' in result:
+        return empty_model_map(latInitial, lonInitial, zoom), \
+            "Cannot predict", result['error']
+    predict_proba = round(result['probability'], 4)
+    predict = result['predict']
     predict_text1 = "Predicted: " + (
         "will renew " if predict == 1 else "will not renew")
     predict_text2 = "Probability: " + str(predict_proba)
@@ -2542,7 +2668,7 @@ def update_figure3(SelectedLocalArea,
     }
     )
 
-    return go.Figure(
+    return compact_figure(go.Figure(
         data=go.Scattermapbox(
             lon=plot_df['coord-x'],
             lat=plot_df['coord-y'],
@@ -2568,21 +2694,31 @@ def update_figure3(SelectedLocalArea,
             ),
         ),
 
-    ), predict_text1, predict_text2
+    ), 'model-map'), predict_text1, predict_text2
 
 
 # Create show/hide callbacks for each info modal
 for id in ['model']:
-    @app.callback([Output(f"{id}-modal", 'style'),
-                   Output(f"{id}-div", 'style')],
-                  [Input(f'show-{id}-modal', 'n_clicks'),
-                   Input(f'close-{id}-modal', 'n_clicks')])
-    def toggle_modal_3(n_show, n_close):
-        ctx = dash.callback_context
-        if ctx.triggered and ctx.triggered[0]['prop_id'].startswith('show-'):
-            return {"display": "block"}, {'zIndex': 1003}
-        else:
-            return {"display": "none"}, {'zIndex': 0}
+    app.clientside_callback(
+        ClientsideFunction(namespace='modal', function_name='toggle'),
+        [Output(f"{id}-modal", 'style'),
+         Output(f"{id}-div", 'style')],
+        [Input(f'show-{id}-modal', 'n_clicks_timestamp'),
+         Input(f'close-{id}-modal', 'n_clicks_timestamp')])
+
+########################################
+# MAPS                                 #
+########################################
+
+
+# draw the maps from the compact payloads of their callbacks
+for id in ['scatter-map', 'parking_graph', 'model-map']:
+    app.clientside_callback(
+        ClientsideFunction(namespace='payload',
+                           function_name='expand_figure'),
+        Output(id, 'figure'),
+        [Input(f'{id}-payload', 'data')])
 
 
-app.run_server(debug=True)
+if __name__ == "__main__":
+    app.run_server(debug=True)
@@ -0,0 +1,37 @@
+/* Expands the compact map payloads of
+   src/04_visualization/compact_payload.py into plotly figures. */
+
+function expandColumns(customdata) {
+    var columns = customdata.columns.map(function(col) {
+        if (Array.isArray(col)) {
+            return col;
+        }
+        return col.codes.map(function(code) {
+            return code < 0 ? null : col.values[code];
+        });
+    });
+    var n = columns.length ? columns[0].length : 0;
+    var rows = new Array(n);
+    for (var i = 0; i < n; i++) {
+        rows[i] = columns.map(function(col) { return col[i]; });
+    }
+    return rows;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    payload: {
+        expand_figure: function(payload) {
+            if (!payload) {
+                return window.dash_clientside.no_update;
+            }
+            var data = payload.data.map(function(trace) {
+                var expanded = Object.assign({}, trace);
+                if (trace.customdata && trace.customdata.columns) {
+                    expanded.customdata = expandColumns(trace.customdata);
+                }
+                return expanded;
+            });
+            return {data: data, layout: payload.layout};
+        }
+    }
+});
@@ -0,0 +1,89 @@
+/* Clientside callbacks of app.py: info modal toggles and the local area
+   highlight of the choropleths, drawn from the base figures of
+   area_choropleth() without a round trip to the server. */
+
+var AREA_CODES = {notSelected: 0, selected: 1, blank: 2};
+
+/* Click (or dropdown change) to render latency of the highlighted maps,
+   in ms, by graph id. */
+var latency = {pending: {}, samples: {}};
+
+function markStart(id) {
+    if (latency.pending[id] === undefined) {
+        latency.pending[id] = performance.now();
+    }
+    var container = document.getElementById(id);
+    var gd = container && container.querySelector('.js-plotly-plot');
+    if (gd && gd.on && !gd._latencyHooked) {
+        gd._latencyHooked = true;
+        gd.on('plotly_click', function() {
+            latency.pending[id] = performance.now();
+        });
+        gd.on('plotly_afterplot', function() {
+            if (latency.pending[id] !== undefined) {
+                var samples = latency.samples[id] || [];
+                samples.push(performance.now() - latency.pending[id]);
+                latency.samples[id] = samples.slice(-100);
+                delete latency.pending[id];
+            }
+        });
+    }
+}
+
+function highlightFigure(id, figure, area) {
+    if (!figure || !figure.data) {
+        return window.dash_clientside.no_update;
+    }
+    markStart(id);
+    // only z changes, the geometry of the base figure is reused as is
+    var data = figure.data.map(function(trace) {
+        var z = trace.hovertext.map(function(name) {
+            if (!area) {
+                return AREA_CODES.blank;
+            }
+            return name === area ?
+                AREA_CODES.selected : AREA_CODES.notSelected;
+        });
+        return Object.assign({}, trace, {z: z});
+    });
+    return Object.assign({}, figure, {data: data});
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    highlight: {
+        // the local area selected in the dropdown of tab 1
+        choropleth: function(area, figure) {
+            return highlightFigure('localarea-map', figure, area);
+        },
+        // the local area clicked on the map of tab 2
+        van_map: function(clickData, figure) {
+            var area = clickData ? clickData.points[0].location : null;
+            return highlightFigure('van_map', figure, area);
+        },
+        // summary of the latencies, e.g. from the browser console:
+        //   dash_clientside.highlight.latency()
+        latency: function() {
+            var summary = {};
+            Object.keys(latency.samples).forEach(function(id) {
+                var s = latency.samples[id].slice().sort(function(a, b) {
+                    return a - b;
+                });
+                summary[id] = {
+                    clicks: s.length,
+                    p50_ms: s[Math.floor(s.length * 0.5)],
+                    p95_ms: s[Math.min(s.length - 1,
+                                       Math.floor(s.length * 0.95))]};
+            });
+            return summary;
+        }
+    },
+    modal: {
+        // shows a modal when its show icon was clicked last
+        toggle: function(show_timestamp, close_timestamp) {
+            if ((show_timestamp || -1) > (close_timestamp || -1)) {
+                return [{display: 'block'}, {zIndex: 1003}];
+            }
+            return [{display: 'none'}, {zIndex: 0}];
+        }
+    }
+});
@@ -0,0 +1,33 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+gunicorn settings of the dashboard, read by default when gunicorn runs
+from the root of the project:
+
+    gunicorn app:server
+
+The app is imported and its data loaded once in the master process;
+forked workers share those pages copy-on-write instead of each
+loading its own copy. Set EVAN_BIND and EVAN_WORKERS to change the
+address and number of workers, and EVAN_THREADS to serve requests with
+several threads per worker (callbacks only read the shared data).
+"""
+
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('EVAN_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('EVAN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('EVAN_THREADS', 1))
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    import app
+    app.preload()
+    # objects of the master are never collected again, so the garbage
+    #   collector of a worker does not write to (and copy) their pages
+    gc.freeze()
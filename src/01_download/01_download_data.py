@@ -6,76 +6,222 @@ This script downloads files and saves them to the file_path provided. This
 script takes an array of urls specifying the files to download, and a local
 file path as arguments.
 
+Files are downloaded concurrently. Interrupted downloads are kept as
+`.part` files and resumed with HTTP range requests, failed requests are
+retried with exponential backoff, and finished files are recorded in
+`manifest.json` (size, SHA-256, ETag, Last-Modified) in file_path so
+later runs only re-download files that changed on the server.
+
 Usage: src/01_download/01_download_data.py --file_path=<file_path> \
-    --urls=<urls>
+    --urls=<urls> [--jobs=<jobs>] [--retries=<retries>]
+       src/01_download/01_download_data.py --test_offline
 
 Options:
 --file_path=<file_path>      Path to the exported files.
 --urls=<urls>                A txt file storing two-dimensional array,
                              specifing the file name(s)
                              and the URL(s) of file(s) to download.
+--jobs=<jobs>                Number of concurrent downloads [default: 4]
+--retries=<retries>          Attempts per file before giving up
+                             [default: 5]
+--test_offline               Run the download tests against a local
+                             file server and exit.
 """
 
 from docopt import docopt
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import os
-import requests
 import re
-import progressbar
+import shutil
+import tempfile
+import threading
+import time
+import requests
 
 
 opt = docopt(__doc__)
 
+MANIFEST = "manifest.json"
+CHUNK_SIZE = 64*1024
 
-def main(file_path, urls):
-    """
-    Loads files from the array of urls and saves the
-    downloaded files to the provided file path.
-    """
-    # format urls input
+
+def read_urls(urls):
+    """Parse the (file name, url) pairs of the urls txt file."""
     with open(urls, 'r') as file:
         urls = file.read().replace('\n', '')
 
     urls = urls.strip('[]')
     urls = re.findall(r'\([^\)\(]*\)', urls)
 
-    for file in urls:
+    return [tuple(file.strip('()').split(', ')) for file in urls]
+
+
+def sha256(path):
+    """SHA-256 hex digest of a file."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Manifest:
+    """Thread-safe record of downloaded files in file_path."""
+
+    def __init__(self, file_path):
+        self.path = os.path.join(file_path, MANIFEST)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
 
-        file_name, url = tuple(file.strip('()').split(', '))
+    def get(self, file_name):
+        with self.lock:
+            return dict(self.entries.get(file_name, {}))
 
-        # check if file is already downloaded
-        if os.path.exists(os.path.join(file_path, file_name)):
-            print("%s already exists.\n" % file_name)
-            continue
+    def update(self, file_name, entry):
+        with self.lock:
+            self.entries[file_name] = entry
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def is_verified(dest, entry):
+    """True if `dest` matches the size and checksum in the manifest."""
+    return bool(entry) and os.path.exists(dest) and \
+        os.path.getsize(dest) == entry.get('size') and \
+        sha256(dest) == entry.get('sha256')
+
+
+def range_total(content_range):
+    """Size of the whole file in a Content-Range header, e.g.
+    `bytes */1000`, or None."""
+    match = re.match(r'bytes [^/]+/(\d+)$', content_range or '')
+    return int(match.group(1)) if match else None
+
+
+def fetch(file_name, url, file_path, manifest, session):
+    """Download one file, resuming a `.part` file if there is one.
+
+    Returns a short status string. Raises on errors worth retrying.
+    """
+    dest = os.path.join(file_path, file_name)
+    part = dest + '.part'
+    entry = manifest.get(file_name)
+    # the body as stored on the server: sizes, ranges and checksums all
+    #   refer to the same bytes even if it would be sent compressed
+    headers = {'Accept-Encoding': 'identity'}
+
+    if is_verified(dest, entry):
+        # complete copy on disk: only download if the server has a newer one
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    elif os.path.exists(dest) and not os.path.exists(part):
+        # unverified file, e.g. from an interrupted older run:
+        #   resume it, a complete file is answered with 416
+        os.replace(dest, part)
+
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if offset:
+        headers['Range'] = 'bytes=%d-' % offset
+        validator = entry.get('etag') or entry.get('last_modified')
+        if validator:
+            headers['If-Range'] = validator
+
+    with session.get(url, headers=headers, stream=True,
+                     timeout=60) as r:
+        if r.status_code == 304:
+            return "not modified"
+
+        if r.status_code == 416:
+            # the range starts at or after the end of the server's file:
+            #   the part file is complete if it has the file's size
+            total = range_total(r.headers.get('Content-Range'))
+            etag = entry.get('etag')
+            last_modified = entry.get('last_modified')
         else:
-            print("Starting download for %s...\n" % file_name)
-
-            # Create the data subdirectory if it doesn't exist
-            os.makedirs(file_path, exist_ok=True)
-
-            # create response object
-            r = requests.get(url, stream=True)
-            widgets = ["Progress: ",
-                       progressbar.DataSize(), "| ",
-                       progressbar.Timer()]
-            bar = progressbar.ProgressBar(widgets=widgets,
-                                          max_value=progressbar.UnknownLength)
-            value = 0
-            # download started
-            with open(os.path.join(file_path, file_name), 'wb') as f:
-                for chunk in r.iter_content(chunk_size=64*1024):
+            r.raise_for_status()
+            if r.status_code != 206:
+                # server ignored the range: start over
+                offset = 0
+            length = r.headers.get('Content-Length')
+            total = offset + int(length) if length is not None else None
+            etag = r.headers.get('ETag')
+            last_modified = r.headers.get('Last-Modified')
+
+            with open(part, 'ab' if offset else 'wb') as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
                     if chunk:
                         f.write(chunk)
-                        value += len(chunk)
-                        bar.update(value)
 
-            print("\n%s downloaded!\n" % file_name)
+    if r.status_code == 416 and total != offset:
+        # larger than the server's file or of unknown size: start over
+        os.remove(part)
+        return fetch(file_name, url, file_path, manifest, session)
+
+    size = os.path.getsize(part)
+    if total is not None and size != total:
+        raise IOError("%s: received %d of %d bytes" % (
+            file_name, size, total))
+
+    entry = {'url': url, 'size': size, 'sha256': sha256(part),
+             'etag': etag, 'last_modified': last_modified}
+    os.replace(part, dest)
+    manifest.update(file_name, entry)
+
+    return "downloaded" if offset == 0 else "resumed"
+
+
+def download(file_name, url, file_path, manifest, retries, backoff=1.0):
+    """Fetch a file, retrying with exponential backoff."""
+    with requests.Session() as session:
+        for attempt in range(retries):
+            try:
+                status = fetch(file_name, url, file_path, manifest, session)
+                print("%s %s.\n" % (file_name, status))
+                return status
+            except (requests.RequestException, IOError) as e:
+                if attempt == retries - 1:
+                    raise
+                wait = backoff * 2 ** attempt
+                print("%s failed (%s), retrying in %.0fs...\n" % (
+                    file_name, e, wait))
+                time.sleep(wait)
+
+
+def main(file_path, urls, jobs=4, retries=5, backoff=1.0):
+    """
+    Loads files from the array of urls and saves the
+    downloaded files to the provided file path.
+    """
+    # Create the data subdirectory if it doesn't exist
+    os.makedirs(file_path, exist_ok=True)
+    manifest = Manifest(file_path)
+
+    if isinstance(urls, str):
+        urls = read_urls(urls)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {file_name: pool.submit(download, file_name, url,
+                                          file_path, manifest,
+                                          retries, backoff)
+                   for file_name, url in urls}
+        status = {f: future.result() for f, future in futures.items()}
 
     print("All files downloaded!")
+    return status
 
 
 def test_fun(file_path, urls):
     """
-    Checks if the main function is able to download 
+    Checks if the main function is able to download
     and save files at correct location
     """
     assert os.path.exists("src/01_download/urls.txt"), "Urls text file not\
@@ -85,6 +231,73 @@ def test_fun(file_path, urls):
     print("Tests ran succesfully")
 
 
+def test_offline():
+    """
+    Checks concurrent download, resume after a dropped connection,
+    conditional re-download and the manifest against a local server.
+    """
+    from file_server import LocalFileServer
+
+    served = tempfile.mkdtemp()
+    out = tempfile.mkdtemp()
+    try:
+        files = {'a.csv': os.urandom(300000), 'b.csv': os.urandom(1000),
+                 'c.csv': b'LocalArea,Year\nKitsilano,2016\n' * 5000}
+        for name, data in files.items():
+            with open(os.path.join(served, name), 'wb') as f:
+                f.write(data)
+
+        # a.csv is cut off after 100000 bytes on the first request,
+        #   c.csv is gzipped for clients accepting it
+        with LocalFileServer(served, truncate={'a.csv': 100000},
+                             compress=['c.csv']) as server:
+            urls = [(name, server.url(name)) for name in files]
+
+            status = main(out, urls, jobs=2, retries=3, backoff=0)
+            assert status == {'a.csv': 'resumed', 'b.csv': 'downloaded',
+                              'c.csv': 'downloaded'}
+            for name, data in files.items():
+                with open(os.path.join(out, name), 'rb') as f:
+                    assert f.read() == data
+
+            manifest = Manifest(out)
+            assert manifest.get('a.csv')['sha256'] == \
+                hashlib.sha256(files['a.csv']).hexdigest()
+
+            # unchanged on the server: conditional request only
+            status = main(out, urls, jobs=2, retries=1, backoff=0)
+            assert set(status.values()) == {'not modified'}
+
+            # truncated local copy is resumed and verified
+            with open(os.path.join(out, 'b.csv'), 'r+b') as f:
+                f.truncate(10)
+            assert main(out, urls[1:], retries=1)['b.csv'] == 'resumed'
+
+            # local copy larger than the server's file: downloaded again
+            with open(os.path.join(out, 'b.csv'), 'ab') as f:
+                f.write(b'extra')
+            assert main(out, urls[1:], retries=1)['b.csv'] == 'downloaded'
+            with open(os.path.join(out, 'b.csv'), 'rb') as f:
+                assert f.read() == files['b.csv']
+
+            # changed on the server: downloaded again
+            files['b.csv'] = os.urandom(2000)
+            with open(os.path.join(served, 'b.csv'), 'wb') as f:
+                f.write(files['b.csv'])
+            assert main(out, urls[1:], retries=1)['b.csv'] == 'downloaded'
+            with open(os.path.join(out, 'b.csv'), 'rb') as f:
+                assert f.read() == files['b.csv']
+    finally:
+        shutil.rmtree(served)
+        shutil.rmtree(out)
+
+    print("Offline tests ran succesfully")
+
+
 if __name__ == "__main__":
-    main(opt["--file_path"], opt["--urls"])
-    test_fun(opt["--file_path"], opt["--urls"])
+    if opt["--test_offline"]:
+        test_offline()
+    else:
+        main(opt["--file_path"], opt["--urls"],
+             int(opt["--jobs"]), int(opt["--retries"]))
+        test_fun(opt["--file_path"], opt["--urls"])
@@ -0,0 +1,131 @@
+# author: Aakanksha Dimri, Keanna Knebel, Jasmine Qin, Xinwen Wang
+# date: 2020-05-04
+
+"""
+A small local HTTP file server used to test 01_download_data.py
+offline. It serves a directory with ETag/Last-Modified validators,
+answers conditional requests with 304, supports single byte-range
+requests (including If-Range) and can be told to drop connections
+part way through a file to simulate truncated downloads, or to gzip
+files for clients that accept it, as some web servers do.
+"""
+
+import email.utils
+import gzip
+import hashlib
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FileHandler(SimpleHTTPRequestHandler):
+    """Serve files with validators and byte ranges."""
+
+    # set by LocalFileServer: {file name: bytes to send before dropping}
+    truncate = {}
+    # set by LocalFileServer: file names sent gzip encoded when accepted
+    compress = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        st = os.stat(path)
+        size = st.st_size
+        with open(path, 'rb') as f:
+            etag = '"%s"' % hashlib.sha256(f.read()).hexdigest()[:16]
+        last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+
+        if self.headers.get('If-None-Match') == etag or (
+                self.headers.get('If-None-Match') is None and
+                self.headers.get('If-Modified-Since') == last_modified):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        name = os.path.basename(path)
+        if name in self.compress and 'gzip' in self.headers.get(
+                'Accept-Encoding', ''):
+            # whole file, encoded: Content-Length is the gzip size
+            with open(path, 'rb') as f:
+                data = gzip.compress(f.read())
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        start = 0
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and if_range in (None, etag, last_modified):
+            start = int(range_header.split('=')[1].split('-')[0])
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % size)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (
+                start, size - 1, size))
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(size - start))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read()
+
+        if name in self.truncate:
+            # send part of the body once, then close the connection
+            data = data[:self.truncate.pop(name)]
+            self.wfile.write(data)
+            self.close_connection = True
+            return
+
+        self.wfile.write(data)
+
+
+class LocalFileServer:
+    """Serve `directory` on a free localhost port in a thread.
+
+    Use as a context manager; `url(name)` gives the URL of a file.
+    """
+
+    def __init__(self, directory, truncate=None, compress=None):
+        handler = type('Handler', (FileHandler,), {
+            'truncate': dict(truncate or {}),
+            'compress': set(compress or [])})
+
+        def factory(*args, **kwargs):
+            return handler(*args, directory=directory, **kwargs)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), factory)
+        self.handler = handler
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+
+    def url(self, name):
+        return "http://127.0.0.1:%d/%s" % (self.server.server_port, name)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
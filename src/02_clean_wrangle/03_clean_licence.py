@@ -6,7 +6,8 @@ This script performs data cleaning and wrangling for a specified csv
 and saves it to a specified file path
 
 Usage: src/02_clean_wrangle/03_clean_licence.py --file_path=<file_path> \
---mapping_csv=<mapping_csv> --save_to=<save_to>
+--mapping_csv=<mapping_csv> --save_to=<save_to> \
+[--partitions=<partitions>] [--chunksize=<chunksize>]
 
 Options:
 --file_path=<file_path>        This is the file path of the csv
@@ -15,6 +16,12 @@ Options:
                                NAICS Canada 2017 Industry classification
 --save_to=<save_to>            This is the file path the processed
                                csv will be saved to
+--partitions=<partitions>      Clean in this many business_id hash
+                               partitions, streaming the input in
+                               chunks to bound memory; 0 cleans the
+                               whole file in memory [default: 0]
+--chunksize=<chunksize>        Rows per chunk read when partitioning
+                               [default: 500000]
 """
 
 # load packages
@@ -22,29 +29,52 @@ from docopt import docopt
 import os
 import pandas as pd
 import numpy as np
+import sys
+import tempfile
 import warnings
 import csv
 
+sys.path.append("src")
+sys.path.append("src/02_clean_wrangle")
+from data_io import storage_format, write_table  # noqa: E402
+from licence_normalize import (normalize_city, normalize_years,  # noqa: E402
+                               latest_per_year)
+
 opt = docopt(__doc__)
 
 
-def main(file_path, mapping_csv, save_to):
+def read_mapping(mapping_csv):
+    """Read the BusinessType to BusinessIndustry mapping."""
+
+    mapping_dict = {' ': ' '}
+
+    # Read csv and write to dictionary
+    with open(mapping_csv, mode='r') as csv_file:
+        csv_reader = csv.reader(csv_file)
+        for row in csv_reader:
+            mapping_dict[row[0]] = row[1]
 
-    df = pd.read_csv(file_path, low_memory=False, dtype={
-                     'NumberofEmployees': 'object'})
+    # Remove additional key value pair
+    mapping_dict.pop(' ')
+    mapping_dict.pop('BusinessType')
+
+    return mapping_dict
+
+
+def clean_licence(df, mapping_dict):
+    """Clean, deduplicate and label licence rows.
+
+    Every step is either row-wise or within a business_id, so the
+    function gives the same rows on the whole table or on any
+    partition holding all rows of its businesses.
+    """
 
     #############
     # Cleaning  #
     #############
 
     # 1. location data cleaning
-    city_list = ['vancouver', 'vacouver', 'vacouver', 'van', 'v',
-                 'vanc', 'vancouver (ubc)', 'bc vancouver',
-                 'v5x 3g9vancouver', 'vancovuer', 'vancouver(ubc)',
-                 '`vancouver', '0vancouver', 'qbcvancouver']
-
-    df['City'] = ['vancouver' if str(
-        c).lower() in city_list else c for c in df.City]
+    df['City'] = normalize_city(df.City)
 
     df = df[~((df.PostalCode.isnull()) & (df.LocalArea.isnull()))]
 
@@ -61,25 +91,12 @@ def main(file_path, mapping_csv, save_to):
 
     df = df.loc[df.FOLDERYEAR.notnull()]
 
-    # 4. organize years
-    df['FOLDERYEAR'] = [y + 2000 if y >= 0 and y <
-                        90 else y + 1900 for y in df.FOLDERYEAR]
-
-    # 5. convert dates to datetime objects and adjust 1996 or before data
-    df['ExtractDate'] = pd.to_datetime(df['ExtractDate'], errors='ignore')
-    df['IssuedDate'] = pd.to_datetime(df['IssuedDate'], errors='ignore')
-    df['ExpiredDate'] = pd.to_datetime(df['ExpiredDate'], errors='ignore')
+    # 4. organize years, convert dates to datetime objects and
+    #       adjust 1996 or before data
+    df = normalize_years(df)
 
-    df.loc[(df['FOLDERYEAR']
-            < 1997.0) & (df['IssuedDate'].dt.year == 1996.0)
-           & (df['ExpiredDate'].dt.year == 1997.0), 'FOLDERYEAR'] = 1997.0
-
-    df = df[~(df.FOLDERYEAR < 1997.0)]
-
-    # 6. sort by ExtractDate the keep the latest entry
-    df = df.sort_values(by=['business_id', 'FOLDERYEAR', 'ExtractDate'])
-    df = df[df.groupby(['business_id'])['FOLDERYEAR'].apply(
-        lambda x: ~(x.duplicated(keep='last')))]
+    # 5. sort by ExtractDate the keep the latest entry
+    df = latest_per_year(df)
 
     #############
     # Wrangling #
@@ -106,18 +123,6 @@ def main(file_path, mapping_csv, save_to):
     # Industry Mapping #
     ####################
 
-    mapping_dict = {' ': ' '}
-
-    # Read csv and write to dictionary
-    with open(mapping_csv, mode='r') as csv_file:
-        csv_reader = csv.reader(csv_file)
-        for row in csv_reader:
-            mapping_dict[row[0]] = row[1]
-
-    # Remove additional key value pair
-    mapping_dict.pop(' ')
-    mapping_dict.pop('BusinessType')
-
     # Add BusinessIndustry column
     df['BusinessIndustry'] = df['BusinessType'].map(mapping_dict)
 
@@ -134,8 +139,63 @@ def main(file_path, mapping_csv, save_to):
     # 2. Remove BusinessIndustry = 'Real estate and rental and leasing'
     df = df[~(df.BusinessIndustry == 'Real estate and rental and leasing')]
 
-    # save to a new csv
-    df.to_csv(save_to, index=False)
+    return df
+
+
+def partition_licence(file_path, tmp_dir, partitions, chunksize):
+    """Stream the csv in chunks into `partitions` csv files by
+    business_id hash and return their paths."""
+
+    paths = [os.path.join(tmp_dir, "part_%d.csv" % i)
+             for i in range(partitions)]
+    written = set()
+
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype={
+            'NumberofEmployees': 'object'}):
+        part = pd.util.hash_pandas_object(
+            chunk.business_id, index=False).values % partitions
+        for i, rows in chunk.groupby(part):
+            rows.to_csv(paths[i], mode='a', index=False,
+                        header=i not in written)
+            written.add(i)
+
+    return [paths[i] for i in sorted(written)]
+
+
+def main(file_path, mapping_csv, save_to, partitions=0, chunksize=500000):
+
+    mapping_dict = read_mapping(mapping_csv)
+
+    if not partitions:
+        df = pd.read_csv(file_path, low_memory=False, dtype={
+                         'NumberofEmployees': 'object'})
+        df = clean_licence(df, mapping_dict)
+
+        # save to a new csv
+        write_table(df, save_to)
+        return
+
+    # chunked mode: only one partition is cleaned in memory at a time
+    #   and appended to the output csv
+    if storage_format() != 'csv':
+        warnings.warn("Partitioned cleaning writes csv only", stacklevel=2)
+
+    with tempfile.TemporaryDirectory(
+            dir=os.path.dirname(os.path.abspath(save_to))) as tmp_dir:
+        tmp_out = os.path.join(tmp_dir, "cleaned.csv")
+        header = True
+        for path in partition_licence(file_path, tmp_dir,
+                                      partitions, chunksize):
+            df = pd.read_csv(path, low_memory=False, dtype={
+                             'NumberofEmployees': 'object'})
+            os.remove(path)
+            df = clean_licence(df, mapping_dict)
+            df.to_csv(tmp_out, mode='a', index=False, header=header)
+            header = False
+
+        os.replace(tmp_out, save_to)
+
 
 if __name__ == "__main__":
-    main(opt["--file_path"], opt["--mapping_csv"], opt["--save_to"])
+    main(opt["--file_path"], opt["--mapping_csv"], opt["--save_to"],
+         int(opt["--partitions"]), int(opt["--chunksize"]))
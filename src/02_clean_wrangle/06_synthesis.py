@@ -23,8 +23,12 @@ from docopt import docopt
 import pandas as pd
 import re
 import os
+import sys
 import warnings
 
+sys.path.append("src")
+from data_io import read_table, write_table  # noqa: E402
+
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings("ignore")
 
@@ -52,7 +56,7 @@ def main(path_in, save_to):
     # Licence Cleaning # - for modelling
     ####################
 
-    licence_df = pd.read_csv(path_in)
+    licence_df = read_table(path_in)
     licence_df = licence_df.astype({'FOLDERYEAR': 'int'})
 
     # 1. Remove status != Issued
@@ -841,8 +845,8 @@ def main(path_in, save_to):
     # Save File #
     #############
 
-    licence_df.rename(columns={'Geo Local Area': 'LocalArea'}).to_csv(
-        save_to, index=False)
+    write_table(licence_df.rename(columns={'Geo Local Area': 'LocalArea'}),
+                save_to)
     
 if __name__ == "__main__":
     main(opt["--path_in"], opt["--save_to"])
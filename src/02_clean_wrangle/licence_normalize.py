@@ -0,0 +1,69 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Vectorized licence normalization shared by 03_clean_licence.py and
+src/04_visualization/licence_vis_synthesis.py:
+
+    normalize_city     spellings of Vancouver to 'vancouver'
+    fix_folderyear     two digit FOLDERYEAR to a four digit year
+    normalize_years    FOLDERYEAR, dates and the 1996 adjustment
+    latest_per_year    keep the latest extract per business and year
+"""
+
+import numpy as np
+import pandas as pd
+
+VANCOUVER_SPELLINGS = {'vancouver', 'vacouver', 'van', 'v', 'vanc',
+                       'vancouver (ubc)', 'bc vancouver',
+                       'v5x 3g9vancouver', 'vancovuer', 'vancouver(ubc)',
+                       '`vancouver', '0vancouver', 'qbcvancouver'}
+
+DATE_COLS = ['ExtractDate', 'IssuedDate', 'ExpiredDate']
+
+
+def normalize_city(city):
+    """Map every (case-insensitive) spelling of Vancouver to
+    'vancouver'; other values are kept.
+
+    The spelling test runs once per distinct value, the rows are
+    matched with a hash lookup.
+    """
+    vancouver = [c for c in city.dropna().unique()
+                 if str(c).lower() in VANCOUVER_SPELLINGS]
+    return city.mask(city.isin(vancouver), 'vancouver')
+
+
+def fix_folderyear(year):
+    """Two digit FOLDERYEAR to a four digit year: 0-89 are 2000s,
+    everything else 1900s."""
+    return pd.Series(np.where((year >= 0) & (year < 90),
+                              year + 2000, year + 1900),
+                     index=year.index)
+
+
+def normalize_years(df):
+    """Organize FOLDERYEAR, parse the date columns and drop licences
+    before 1997.
+
+    Licences issued in 1996 that expire in 1997 are counted as 1997.
+    Dates that do not parse become NaT (errors='ignore' is gone from
+    pandas >= 3).
+    """
+    df['FOLDERYEAR'] = fix_folderyear(df.FOLDERYEAR)
+
+    for col in DATE_COLS:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    df.loc[(df['FOLDERYEAR']
+            < 1997.0) & (df['IssuedDate'].dt.year == 1996.0)
+           & (df['ExpiredDate'].dt.year == 1997.0), 'FOLDERYEAR'] = 1997.0
+
+    return df[~(df.FOLDERYEAR < 1997.0)]
+
+
+def latest_per_year(df):
+    """Sort by business_id, FOLDERYEAR and ExtractDate and keep the
+    last (latest extracted) row of every business and year."""
+    df = df.sort_values(by=['business_id', 'FOLDERYEAR', 'ExtractDate'])
+    return df.drop_duplicates(['business_id', 'FOLDERYEAR'], keep='last')
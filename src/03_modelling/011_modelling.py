@@ -23,6 +23,7 @@ Options:
 # import library
 # Basics
 from docopt import docopt
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from joblib import dump
@@ -47,14 +48,17 @@ from sklearn.metrics import classification_report
 # Model Explanation
 import eli5
 
+sys.path.append("src")
+from data_io import read_table  # noqa: E402
+
 
 opt = docopt(__doc__)
 
 
 def main(file_path1, file_path2, file_path3,
          save_to1, save_to2, save_model):
-    train = pd.read_csv(file_path1, low_memory=False)
-    validation = pd.read_csv(file_path2, low_memory=False)
+    train = read_table(file_path1, low_memory=False)
+    validation = read_table(file_path2, low_memory=False)
     # test = pd.read_csv(file_path3, low_memory=False)
 
     def feature_engineering(df):
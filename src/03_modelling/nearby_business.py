@@ -0,0 +1,70 @@
+# author: Jasmine Qin
+# date: 2020-06-29
+
+"""
+This script counts, for every licence, the businesses of the same
+BusinessType within a radius in the same FOLDERYEAR, and saves the
+counts (LicenceRSN, nearest_business_count) to a specified file path.
+It replaces src/03_modelling/nearby_business.ipynb.
+
+Usage: src/03_modelling/nearby_business.py --path_in=<path_in> \
+--save_to=<save_to> [--distance=<distance>] [--n_jobs=<n_jobs>]
+
+Options:
+--path_in=<path_in>         Comma separated file paths of the
+                              combined licence csvs (06_synthesis.py output)
+--save_to=<save_to>         The file path the counts will be saved to
+--distance=<distance>       Radius in meters [default: 200]
+--n_jobs=<n_jobs>           Number of worker processes, one year
+                              per task; 0 uses all cores [default: 0]
+"""
+
+# load packages
+from docopt import docopt
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from spatial_features import add_coords, project_local, count_same_type
+
+sys.path.append("src")
+from data_io import read_table  # noqa: E402
+
+opt = docopt(__doc__)
+
+
+def main(path_in, save_to, distance, n_jobs):
+
+    all_licence = pd.concat([
+        read_table(p, low_memory=False,
+                   columns=['LicenceRSN', 'FOLDERYEAR',
+                            'BusinessType', 'Geom'])
+        for p in path_in.split(',')])
+    all_licence = all_licence[~(all_licence.FOLDERYEAR == 2020)]
+    all_licence = all_licence[all_licence.Geom.notnull()]
+
+    add_coords(all_licence)
+    xy = project_local(all_licence['coord-x'], all_licence['coord-y'])
+    all_licence['x'] = xy[:, 0]
+    all_licence['y'] = xy[:, 1]
+
+    years = [df_y for _, df_y in all_licence.groupby('FOLDERYEAR')]
+
+    with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+        results = list(pool.map(count_same_type, years,
+                                [distance] * len(years)))
+
+    nearby_business = pd.concat(results)
+    # keep the notebook's last-write-wins behaviour for repeated RSNs
+    nearby_business = nearby_business[
+        ~nearby_business.index.duplicated(keep='last')]
+
+    assert (nearby_business >= 0).all()
+
+    nearby_business.rename('nearest_business_count').rename_axis(
+        'LicenceRSN').reset_index().to_csv(save_to, index=False)
+
+
+if __name__ == "__main__":
+    main(opt["--path_in"], opt["--save_to"],
+         float(opt["--distance"]), int(opt["--n_jobs"]))
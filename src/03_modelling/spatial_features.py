@@ -0,0 +1,177 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Radius-count engine used by 07_feature_engineering.py to count the
+facilities (parking meters, disability parking, ...) located near
+each business licence.
+
+Points are GeoJSON coordinates, i.e. (longitude, latitude) in decimal
+degrees. Facility counts use a BallTree on the haversine metric, one
+batched query per local area, instead of a licence x facility loop.
+Same-type business counts use a KDTree on locally projected meters.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+import pyproj
+from sklearn.neighbors import BallTree, KDTree
+
+EARTH_RADIUS = 6371000  # radius of Earth in meters
+COORD_COLS = ['coord-x', 'coord-y']
+
+
+def add_coords(df, geom_col='Geom', coord_cols=COORD_COLS):
+    """Add GeoJSON point coordinates as `coord-x` (longitude) and
+    `coord-y` (latitude) columns.
+
+    The columns act as a cache: when they already exist only rows
+    with a Geom but no coordinates are parsed, and each distinct
+    Geom string is passed to json.loads once however many licence
+    years share it.
+    """
+    x_col, y_col = coord_cols
+    if x_col not in df.columns or y_col not in df.columns:
+        df[x_col] = np.nan
+        df[y_col] = np.nan
+
+    missing = df[x_col].isnull() & df[geom_col].notnull()
+    if not missing.any():
+        return df
+
+    geoms = df.loc[missing, geom_col]
+    unique = pd.unique(geoms)
+    parsed = np.array([json.loads(g)['coordinates'][:2] for g in unique],
+                      dtype=float).reshape(-1, 2)
+
+    df.loc[missing, x_col] = geoms.map(
+        pd.Series(parsed[:, 0], index=unique))
+    df.loc[missing, y_col] = geoms.map(
+        pd.Series(parsed[:, 1], index=unique))
+
+    return df
+
+
+def haversine_np(lon1, lat1, lon2, lat2):
+    """Vectorized haversine distance in meters.
+
+    Inputs are decimal degrees and broadcast like numpy arrays.
+    """
+    phi_1 = np.radians(lat1)
+    phi_2 = np.radians(lat2)
+
+    delta_phi = np.radians(np.asarray(lat2) - np.asarray(lat1))
+    delta_lambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+
+    a = np.sin(delta_phi / 2.0) ** 2 + np.cos(
+        phi_1) * np.cos(phi_2) * np.sin(
+        delta_lambda / 2.0) ** 2
+
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def to_radians(lon, lat):
+    """Stack lon/lat degrees into the (lat, lon) radians
+    layout expected by BallTree(metric='haversine')."""
+    return np.radians(np.column_stack([
+        np.asarray(lat, dtype=float),
+        np.asarray(lon, dtype=float)]))
+
+
+def count_within_radius(points, facilities, distance):
+    """Count facilities strictly closer than `distance` meters
+    to each point.
+
+    `points` and `facilities` are (n, 2) arrays of (lon, lat)
+    degrees. The original loop compared rounded meters with `<`,
+    so the radius is shrunk by half a meter to keep parity.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    facilities = np.asarray(facilities, dtype=float).reshape(-1, 2)
+
+    if len(points) == 0 or len(facilities) == 0:
+        return np.zeros(len(points), dtype=int)
+
+    tree = BallTree(to_radians(facilities[:, 0], facilities[:, 1]),
+                    metric='haversine')
+    radius = (distance - 0.5) / EARTH_RADIUS
+
+    return tree.query_radius(
+        to_radians(points[:, 0], points[:, 1]),
+        r=radius, count_only=True).astype(int)
+
+
+def nearby_facility_counts(licence, facility_df, distance,
+                           name_for_new_column,
+                           area_col='LocalArea',
+                           facility_area_col='Geo Local Area'):
+    """Add a column counting facilities within `distance` meters
+    of every licence, matching licences and facilities by local area.
+
+    Both frames need the coordinate columns added by add_coords.
+    Licences in areas without any facility get 0.
+    """
+    licence = licence.copy()
+    counts = pd.Series(0, index=licence.index, dtype=int)
+
+    facility_df = facility_df[facility_df[COORD_COLS].notnull().all(axis=1)]
+    facility_groups = {
+        area: grp[COORD_COLS].to_numpy()
+        for area, grp in facility_df.groupby(facility_area_col)}
+
+    for area, grp in licence.groupby(area_col):
+        if area not in facility_groups:
+            continue
+        counts.loc[grp.index] = count_within_radius(
+            grp[COORD_COLS].to_numpy(),
+            facility_groups[area], distance)
+
+    licence[name_for_new_column] = counts
+    return licence
+
+
+def project_local(lon, lat, lat_0=49.25, lon_0=-123.12):
+    """Project degrees to meters with an azimuthal equidistant
+    projection centred on Vancouver.
+
+    Distortion is well under 0.1% across the city, so Euclidean
+    distances on the projected points can stand in for the 200 m
+    geodesic buffers built per licence in nearby_business.ipynb.
+    """
+    proj = pyproj.Proj('+proj=aeqd +lat_0={lat} +lon_0={lon} '
+                       '+x_0=0 +y_0=0 +datum=WGS84 +units=m'.format(
+                           lat=lat_0, lon=lon_0))
+    x, y = proj(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    return np.column_stack([x, y])
+
+
+def count_neighbours(xy, distance):
+    """Count the other points within `distance` of each point.
+
+    `xy` is an (n, 2) array of projected coordinates in meters.
+    The point itself is not counted.
+    """
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    if len(xy) == 0:
+        return np.zeros(0, dtype=int)
+
+    tree = KDTree(xy)
+    return tree.query_radius(xy, r=distance,
+                             count_only=True).astype(int) - 1
+
+
+def count_same_type(df, distance):
+    """Count, for every licence of `df`, the other licences of the same
+    BusinessType within `distance` meters.
+
+    `df` holds the licences of one FOLDERYEAR with projected `x`/`y`
+    columns; returns the counts indexed by LicenceRSN.
+    """
+    counts = []
+    for _, df_i in df.groupby('BusinessType'):
+        counts.append(pd.Series(
+            count_neighbours(df_i[['x', 'y']].to_numpy(), distance),
+            index=df_i.LicenceRSN.values))
+
+    return pd.concat(counts) if counts else pd.Series(dtype=int)
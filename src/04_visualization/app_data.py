@@ -0,0 +1,261 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+App-ready data of app.py, prebuilt into a bundle.
+
+The bundle is a directory of joblib files, one per section:
+
+    common   lookups of the dropdowns and sliders, the local area
+             boundary GeoJSON and the validation labels of the
+             confusion matrix, needed to build the layout
+    licence  issued licences and business counts (tab 1)
+    census   census and parking tables (tab 2)
+    model    vis_model with its census features (tab 3)
+
+Sections are loaded on first use with memory-mapped numeric arrays, so
+booting a worker only reads the common section, and workers on the
+same machine share the pages of the large tables. The bundle is
+rebuilt when the processed data it was built from changes, by one
+process at a time (a file lock in the bundle directory, on systems
+with fcntl); the others wait for it and use its bundle.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import sys
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from joblib import dump, load
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not locked
+    fcntl = None
+
+sys.path.append("src")
+sys.path.append("src/04_visualization")
+from data_io import read_table, parquet_path  # noqa: E402
+from density_bins import add_cells  # noqa: E402
+
+BUNDLE_DIR = "data/processed/app_bundle"
+SOURCES = {
+    'census': "data/processed/census_viz.csv",
+    'parking': "data/processed/vis_parking.csv",
+    'licence': "data/processed/vis_licence.csv",
+    'agg_licence': "data/processed/vis_agg_licence.csv",
+    'vis_model': "data/processed/vis_model.csv",
+    'boundary': "data/raw/local_area_boundary.geojson"}
+SECTIONS = ['common', 'licence', 'census', 'model']
+# changed whenever the content of the sections changes
+BUNDLE_VERSION = 2
+# zooms of the licence and parking maps of app.py, see density_bins.py
+LICENCE_ZOOMS = [11, 13]
+PARKING_ZOOMS = [10.7, 12]
+
+# columns of the scatter map, filter columns are stored as categoricals
+#   so their codes are memory-mapped instead of unpickled per worker
+LICENCE_COLS = ['FOLDERYEAR', 'BusinessIndustry', 'BusinessType',
+                'LocalArea', 'NextYearStatus', 'BusinessName',
+                'coord-x', 'coord-y']
+LICENCE_CATEGORICALS = ['BusinessIndustry', 'BusinessType', 'LocalArea',
+                        'NextYearStatus']
+
+
+def source_stats(sources=SOURCES):
+    """Size and mtime of the files a bundle is built from."""
+    stats = {}
+    for path in sources.values():
+        for p in [path, parquet_path(path)]:
+            if os.path.exists(p):
+                st = os.stat(p)
+                stats[p] = [st.st_size, st.st_mtime_ns]
+    return stats
+
+
+def build_sections(sources=SOURCES):
+    """Read the processed data and return the sections of the bundle."""
+    licence = read_table(sources['licence'])
+    licence = licence[licence.Status == 'Issued']
+    agg_licence = read_table(sources['agg_licence'])
+    raw_vis_model = read_table(sources['vis_model'])
+    census = pd.read_csv(sources['census'])
+    parking = read_table(sources['parking'],
+                         columns=['LocalArea', 'coord-x', 'coord-y'])
+
+    with open(sources['boundary']) as f:
+        boundary = json.load(f)
+    for i in boundary['features']:
+        i['name'] = i['properties']['name']
+        i['id'] = i['properties']['mapid']
+
+    # log number of businesses by local area for the choropleth
+    #   (for future implementations)
+    boundary_df = pd.DataFrame([i['properties'] for i in
+                                boundary['features']])[['mapid', 'name']]
+    boundary_df = boundary_df.rename(columns={'name': 'LocalArea'})
+    number_of_businesses = licence.groupby(
+        'LocalArea')['BusinessName'].apply(
+        lambda x: np.log(len(x.unique())))
+    boundary_df = boundary_df.merge(pd.DataFrame(
+        number_of_businesses).reset_index(), how="left", on='LocalArea')
+
+    businesstypes = agg_licence.BusinessType.unique()
+    bt_lookup = {}
+    for i in agg_licence.BusinessIndustry.unique():
+        bt_lookup[i] = list(agg_licence.loc[
+            agg_licence.BusinessIndustry == i].BusinessType.unique())
+    bt_lookup['allindustry'] = businesstypes
+
+    valid = raw_vis_model[raw_vis_model.type == 'valid']
+    common = {
+        'industries': licence.BusinessIndustry.unique(),
+        'localareas': boundary_df.LocalArea.unique(),
+        'years': sorted(list(raw_vis_model.FOLDERYEAR.unique())),
+        'licence_years': licence.FOLDERYEAR.unique(),
+        'businesstypes': businesstypes,
+        'bt_lookup': bt_lookup,
+        'boundary': boundary,
+        'boundary_df': boundary_df,
+        'y_valid': valid['label'].values,
+        'y_valid_pred': valid['predict'].values}
+
+    # sorted by year, the scatter map partitions are slices of it
+    licence = licence[LICENCE_COLS].sort_values(
+        'FOLDERYEAR', kind='mergesort').reset_index(drop=True)
+    for col in LICENCE_CATEGORICALS:
+        licence[col] = licence[col].astype('category')
+    add_cells(licence, LICENCE_ZOOMS)
+    add_cells(parking, PARKING_ZOOMS)
+
+    return {'common': common,
+            'licence': {'licence': licence, 'agg_licence': agg_licence},
+            'census': {'census': census, 'parking': parking},
+            'model': {'raw_vis_model': raw_vis_model}}
+
+
+@contextmanager
+def bundle_lock(directory):
+    """Exclusive lock of the bundle in `directory` across processes."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def replace_file(directory, name, write):
+    """Write a file with `write(path)` to a temporary file and rename it
+    to `name`, so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, os.path.join(directory, name))
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def write_bundle(directory, sources):
+    stats = source_stats(sources)
+    for name, section in build_sections(sources).items():
+        replace_file(directory, name + '.joblib',
+                     lambda path: dump(section, path))
+
+    def write_manifest(path):
+        with open(path, 'w') as f:
+            json.dump({'version': BUNDLE_VERSION, 'sources': stats}, f)
+    replace_file(directory, 'manifest.json', write_manifest)
+
+
+def build_bundle(directory=BUNDLE_DIR, sources=SOURCES):
+    """Build the bundle of `sources` into `directory`."""
+    with bundle_lock(directory):
+        write_bundle(directory, sources)
+
+
+def ensure_bundle(directory=BUNDLE_DIR, sources=SOURCES):
+    """Build the bundle if it is missing or out of date; return whether
+    it was built. Concurrent callers wait for a single build."""
+    if is_current(directory, sources):
+        return False
+    with bundle_lock(directory):
+        # built by another process while waiting for the lock
+        if is_current(directory, sources):
+            return False
+        print("Building app bundle in " + directory)
+        write_bundle(directory, sources)
+    return True
+
+
+def is_current(directory=BUNDLE_DIR, sources=SOURCES):
+    """Whether the bundle exists and was built from the current data."""
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return manifest.get('version') == BUNDLE_VERSION and \
+        manifest['sources'] == source_stats(sources) and all(
+        os.path.exists(os.path.join(directory, s + '.joblib'))
+        for s in SECTIONS)
+
+
+class AppData:
+    """The sections of a bundle, each loaded on first access.
+
+    The bundle is (re)built on first use when it is missing or out of
+    date, not when the object is created.
+    """
+
+    def __init__(self, directory=BUNDLE_DIR, sources=SOURCES):
+        self.directory = directory
+        self.sources = sources
+        self.checked = False
+        self.sections = {}
+        self.lock = threading.Lock()
+
+    def _ensure(self):
+        # called with self.lock held
+        if not self.checked:
+            ensure_bundle(self.directory, self.sources)
+            self.checked = True
+
+    def paths(self):
+        """Files of the bundle."""
+        with self.lock:
+            self._ensure()
+        return [os.path.join(self.directory, s + '.joblib')
+                for s in SECTIONS]
+
+    def __getitem__(self, name):
+        with self.lock:
+            self._ensure()
+            if name not in self.sections:
+                self.sections[name] = load(
+                    os.path.join(self.directory, name + '.joblib'),
+                    mmap_mode='r')
+            return self.sections[name]
+
+
+def lazy(fun):
+    """Decorator computing `fun()` on its first call only, e.g. an index
+    of a section needed by one tab."""
+    lock = threading.Lock()
+    result = []
+
+    @wraps(fun)
+    def wrapper():
+        with lock:
+            if not result:
+                result.append(fun())
+        return result[0]
+    return wrapper
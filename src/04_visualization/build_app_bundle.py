@@ -0,0 +1,34 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script prebuilds the data bundle read by the dashboard (app.py)
+from the processed visualization data, so workers start without
+parsing the csv and GeoJSON files. See app_data.py for its sections.
+
+Usage: src/04_visualization/build_app_bundle.py [--path_out=<path_out>]
+
+Options:
+--path_out=<path_out>    Directory of the bundle
+                           [default: data/processed/app_bundle]
+"""
+
+from docopt import docopt
+import sys
+import time
+
+sys.path.append("src/04_visualization")
+from app_data import build_bundle  # noqa: E402
+
+opt = docopt(__doc__)
+
+
+def main(path_out):
+    start = time.perf_counter()
+    build_bundle(path_out)
+    print("App bundle written to %s in %.1f s" % (
+        path_out, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main(opt["--path_out"])
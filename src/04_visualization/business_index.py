@@ -0,0 +1,85 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Spatial indexes for the prediction tab of app.py.
+
+The businesses of each (FOLDERYEAR, BusinessType) get a KD-tree over
+their distinct locations, projected to meters around Vancouver. The
+trees are built the first time a year and type is asked for and then
+reused, so finding the businesses near a typed-in location no longer
+needs a union of every business geometry on each callback.
+"""
+
+import sys
+import threading
+import numpy as np
+from sklearn.neighbors import KDTree
+
+sys.path.append("src/03_modelling")
+from spatial_features import project_local  # noqa: E402
+
+
+class BusinessIndex:
+    """Nearest-neighbour lookups over the rows of `df`, located by
+    their `coord-x` (longitude) and `coord-y` (latitude) columns."""
+
+    def __init__(self, df):
+        self.df = df
+        xy = project_local(df['coord-x'].values, df['coord-y'].values)
+        # businesses sharing a location are one point of the tree
+        self.locations, self.location_of = np.unique(
+            xy, axis=0, return_inverse=True)
+        self.location_of = self.location_of.ravel()
+        self.tree = KDTree(self.locations) if len(self.locations) else None
+
+    def _rows(self, location_ids):
+        return self.df[np.isin(self.location_of, location_ids)]
+
+    def _query_point(self, lat, lon):
+        return project_local(np.array([lon]), np.array([lat]))
+
+    def nearest(self, lat, lon):
+        """All businesses at the location nearest to (lat, lon)."""
+        return self.k_nearest(lat, lon, 1)
+
+    def k_nearest(self, lat, lon, k):
+        """All businesses at the `k` locations nearest to (lat, lon)."""
+        if self.tree is None:
+            return self.df.iloc[:0]
+        k = min(k, len(self.locations))
+        _, ind = self.tree.query(self._query_point(lat, lon), k=k)
+        return self._rows(ind[0])
+
+    def within_radius(self, lat, lon, distance):
+        """All businesses within `distance` meters of (lat, lon)."""
+        if self.tree is None:
+            return self.df.iloc[:0]
+        ind = self.tree.query_radius(self._query_point(lat, lon),
+                                     r=distance)
+        return self._rows(ind[0])
+
+
+class BusinessIndexes:
+    """A BusinessIndex per (FOLDERYEAR, BusinessType) of `df`, built
+    lazily and cached."""
+
+    def __init__(self, df):
+        self.groups = df.groupby(['FOLDERYEAR', 'BusinessType']).indices
+        self.df = df
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def get(self, year, business_type):
+        key = (year, business_type)
+        with self.lock:
+            if key not in self.indexes:
+                rows = self.groups.get(key, [])
+                self.indexes[key] = BusinessIndex(self.df.iloc[rows])
+            return self.indexes[key]
+
+    def build_all(self):
+        """Build the index of every group, e.g. before forking
+        workers."""
+        for year, business_type in self.groups:
+            self.get(year, business_type)
@@ -0,0 +1,138 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Latency of the callbacks of app.py.
+
+CallbackTimer.instrument(server) times every request to Dash's
+_dash-update-component endpoint, i.e. every server callback, and keeps
+the callback (its output), wall time, response bytes and input values
+of the last EVAN_CALLBACK_RING requests [default: 2000] in a ring
+buffer. stats() gives their percentiles per callback, slowest() the
+slowest requests with their inputs.
+
+With EVAN_PROFILE_MS set, every callback runs under cProfile and the
+stats of those slower than EVAN_PROFILE_MS milliseconds are dumped to
+EVAN_PROFILE_DIR [default: results/profiles], to be read with pstats
+or snakeviz. Each worker process keeps its own buffer.
+"""
+
+from collections import deque
+import cProfile
+import os
+import re
+import threading
+import time
+import numpy as np
+from flask import g, request
+
+RING_SIZE = int(os.environ.get('EVAN_CALLBACK_RING', 2000))
+PROFILE_MS = os.environ.get('EVAN_PROFILE_MS')
+PROFILE_DIR = os.environ.get('EVAN_PROFILE_DIR', 'results/profiles')
+# longest repr of an input value kept in the buffer
+MAX_INPUT_CHARS = 200
+
+
+def input_values(body):
+    """{component.property: value} of the inputs of a callback request."""
+    inputs = body.get('inputs', []) + body.get('state', [])
+    values = {}
+    for i in inputs:
+        # pattern of a Dash 1.x input, a list for wildcard inputs
+        if isinstance(i, dict):
+            value = repr(i.get('value'))
+            if len(value) > MAX_INPUT_CHARS:
+                value = value[:MAX_INPUT_CHARS] + '...'
+            values['%s.%s' % (i.get('id'), i.get('property'))] = value
+    return values
+
+
+class CallbackTimer:
+    """Ring buffer of the latest callback requests."""
+
+    def __init__(self, size=RING_SIZE, profile_ms=PROFILE_MS,
+                 profile_dir=PROFILE_DIR):
+        self.records = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.profile_ms = None if profile_ms is None else float(profile_ms)
+        self.profile_dir = profile_dir
+
+    def record(self, name, seconds, size, inputs, profile=None):
+        with self.lock:
+            self.records.append({'callback': name,
+                                 'ms': seconds * 1000,
+                                 'bytes': size,
+                                 'inputs': inputs,
+                                 'time': time.time(),
+                                 'profile': profile})
+
+    def stats(self):
+        """Percentiles of the wall time and mean bytes per callback,
+        slowest p95 first."""
+        with self.lock:
+            records = list(self.records)
+        by_callback = {}
+        for r in records:
+            by_callback.setdefault(r['callback'], []).append(r)
+
+        stats = []
+        for name, rs in by_callback.items():
+            ms = np.array([r['ms'] for r in rs])
+            stats.append({
+                'callback': name,
+                'calls': len(rs),
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p95_ms': float(np.percentile(ms, 95)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'max_ms': float(ms.max()),
+                'mean_bytes': float(np.mean([r['bytes'] for r in rs]))})
+        return sorted(stats, key=lambda s: -s['p95_ms'])
+
+    def slowest(self, n=20):
+        """The `n` slowest requests in the buffer."""
+        with self.lock:
+            records = list(self.records)
+        return sorted(records, key=lambda r: -r['ms'])[:n]
+
+    def _dump(self, profile, name):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, '%d_%d_%s.prof' % (
+            time.time() * 1000, os.getpid(),
+            re.sub(r'[^\w.-]+', '_', name)[:100]))
+        profile.dump_stats(path)
+        return path
+
+    def instrument(self, server):
+        """Time the callback requests of a Dash app's Flask `server`."""
+
+        def is_callback():
+            return request.method == 'POST' and \
+                request.path.endswith('_dash-update-component')
+
+        @server.before_request
+        def start_timer():
+            if not is_callback():
+                return
+            g.callback_profile = None
+            if self.profile_ms is not None:
+                g.callback_profile = cProfile.Profile()
+                g.callback_profile.enable()
+            g.callback_start = time.perf_counter()
+
+        @server.after_request
+        def stop_timer(response):
+            if not is_callback() or 'callback_start' not in g:
+                return response
+            seconds = time.perf_counter() - g.callback_start
+            if g.callback_profile is not None:
+                g.callback_profile.disable()
+
+            body = request.get_json(silent=True) or {}
+            name = body.get('output', '?')
+            path = None
+            if g.callback_profile is not None and \
+                    seconds * 1000 > self.profile_ms:
+                path = self._dump(g.callback_profile, name)
+            self.record(name, seconds, response.calculate_content_length()
+                        or 0, input_values(body), path)
+            return response
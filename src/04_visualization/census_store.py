@@ -0,0 +1,67 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Census topics of the neighbourhood profile tab of app.py as arrays.
+
+A topic is a table of census_viz with LocalArea, Year and one column per
+label (e.g. the age groups). CensusStore keeps the values of every topic
+as a float array with one row per (census year, local area), and the
+order of its labels by decreasing value, so a graph or table of a
+selection is a dictionary lookup instead of a filter, melt and sort of
+the census table.
+"""
+
+import numpy as np
+
+KEY_COLS = ['LocalArea', 'Year']
+
+
+class CensusTopic:
+    """Labels and values of a topic for every (census year, local area)."""
+
+    def __init__(self, df):
+        self.labels = np.array([c for c in df.columns
+                                if c not in KEY_COLS], dtype=object)
+        self.values = df[list(self.labels)].to_numpy(dtype=float)
+        # labels by decreasing value, ties and NaN in the column order
+        #   (NaN last), as sort_values puts them
+        self.order = np.argsort(-self.values, axis=1, kind='stable')
+        for a in [self.values, self.order]:
+            a.setflags(write=False)
+        # census_viz has one row per census year and local area
+        self.rows = {(int(year), area): i for i, (year, area) in
+                     enumerate(zip(df['Year'], df['LocalArea']))}
+
+    def get(self, year, area):
+        """Labels and values of a census year and local area, in the
+        column order; empty for an unknown selection."""
+        row = self.rows.get((int(year), area))
+        if row is None:
+            return self.labels[:0], np.empty(0)
+        return self.labels, self.values[row]
+
+    def top(self, year, area, n=None):
+        """Labels and values of the `n` (all if None) largest values of a
+        census year and local area, largest first."""
+        row = self.rows.get((int(year), area))
+        if row is None:
+            return self.labels[:0], np.empty(0)
+        order = self.order[row, :n]
+        return self.labels[order], self.values[row, order]
+
+
+class CensusStore:
+    """CensusTopic of each of `topics` ({name: table})."""
+
+    def __init__(self, topics):
+        self.topics = {name: CensusTopic(df) for name, df in topics.items()}
+
+    def __getitem__(self, name):
+        return self.topics[name]
+
+    def get(self, name, year, area):
+        return self.topics[name].get(year, area)
+
+    def top(self, name, year, area, n=None):
+        return self.topics[name].top(year, area, n)
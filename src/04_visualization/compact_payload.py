@@ -0,0 +1,123 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Compact JSON payloads of the map figures of app.py.
+
+A map callback returns compact_figure(fig, name) to a dcc.Store; the
+clientside function payload.expand_figure of assets/compact_payload.js
+rebuilds the figure in the browser. On the wire:
+
+- latitudes and longitudes are rounded to EVAN_COORD_DIGITS decimals
+  [default: 5, about a metre],
+- customdata is sent by column, columns with repeated values (business
+  type, labels) as a list of distinct values and a code per point,
+- the trace defaults of the layout template are only sent for the
+  trace types of the figure; its layout part (colorway, fonts, hover
+  labels) is kept, the status traces take their colours from it.
+
+With EVAN_PAYLOAD_STATS=1 the size of every payload is counted per
+callback (PayloadStats), at the cost of serializing it once more; the
+response bytes of every callback are also in the /_callback-stats
+report of app.py.
+"""
+
+from collections import defaultdict
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+COORD_DIGITS = int(os.environ.get('EVAN_COORD_DIGITS', 5))
+COORD_KEYS = ['lat', 'lon']
+PAYLOAD_STATS = os.environ.get('EVAN_PAYLOAD_STATS') == '1'
+
+
+def json_default(value):
+    """JSON of the numpy values of a figure."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("Not JSON serializable: %r" % type(value))
+
+
+def encode_columns(customdata):
+    """customdata (one row per point) as columns, a column with fewer
+    distinct values than half its points being dictionary encoded."""
+    data = np.asarray(customdata, dtype=object)
+    if data.ndim == 1:
+        data = data[:, None]
+
+    columns = []
+    for col in data.T:
+        codes, values = pd.factorize(col)
+        if len(values) < len(col) / 2:
+            columns.append({'values': list(values),
+                            'codes': codes.tolist()})
+        else:
+            columns.append(list(col))
+    return {'columns': columns}
+
+
+class PayloadStats:
+    """Number and bytes of the payloads of every callback."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(lambda: {'responses': 0, 'bytes': 0,
+                                             'last_bytes': 0})
+
+    def record(self, name, size):
+        with self.lock:
+            counter = self.counters[name]
+            counter['responses'] += 1
+            counter['bytes'] += size
+            counter['last_bytes'] = size
+
+    def stats(self):
+        with self.lock:
+            return {name: dict(c, mean_bytes=c['bytes'] / c['responses'])
+                    for name, c in self.counters.items()}
+
+
+payload_stats = PayloadStats()
+
+
+def compact_template(template, types):
+    """`template` with the trace defaults of trace `types` only."""
+    template = dict(template)
+    if 'data' in template:
+        template['data'] = {t: v for t, v in template['data'].items()
+                            if t in types}
+    return template
+
+
+def compact_figure(fig, name=None, digits=COORD_DIGITS):
+    """Compact payload of a plotly figure (or its dict), counted in
+    payload_stats under `name` when PAYLOAD_STATS is set."""
+    if hasattr(fig, 'to_plotly_json'):
+        fig = fig.to_plotly_json()
+
+    data = []
+    for trace in fig.get('data', []):
+        trace = dict(trace)
+        for key in COORD_KEYS:
+            if trace.get(key) is not None:
+                trace[key] = np.round(
+                    np.asarray(trace[key], dtype=float), digits)
+        if trace.get('customdata') is not None:
+            trace['customdata'] = encode_columns(trace['customdata'])
+        data.append(trace)
+
+    layout = dict(fig.get('layout', {}))
+    if layout.get('template'):
+        layout['template'] = compact_template(
+            layout['template'], {t.get('type', 'scatter') for t in data})
+    payload = {'data': data, 'layout': layout}
+
+    if PAYLOAD_STATS and name is not None:
+        payload_stats.record(name, len(json.dumps(
+            payload, default=json_default)))
+    return payload
@@ -0,0 +1,76 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Grid aggregation of the scatter maps of app.py.
+
+Above EVAN_MAP_MAX_POINTS points [default: 5000] a map shows one
+marker per grid cell, sized by its number of points, instead of one
+marker per point. Cells are about CELL_PIXELS screen pixels wide at
+the zoom of the map. The cell of every licence and parking meter at
+the zooms used by the app is precomputed in the app bundle, so a map
+only counts the cell codes of its selected rows.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = int(os.environ.get('EVAN_MAP_MAX_POINTS', 5000))
+CELL_PIXELS = 12
+LOW_BITS = 2 ** 32
+
+
+def cell_col(zoom):
+    """Column of the precomputed cell codes at `zoom`."""
+    return 'cell_z%g' % zoom
+
+
+class Grid:
+    """Square cells of `pixels` screen pixels at a web mercator `zoom`
+    around latitude `lat`."""
+
+    def __init__(self, zoom, pixels=CELL_PIXELS, lat=49.25):
+        # 256 pixels span the 360 degrees of longitude at zoom 0
+        self.lon_size = 360 / (256 * 2 ** zoom) * pixels
+        self.lat_size = self.lon_size * np.cos(np.radians(lat))
+
+    def codes(self, lat, lon):
+        """Cell code of every point, row and column in one integer."""
+        row = np.floor(np.asarray(lat) / self.lat_size).astype(np.int64)
+        col = np.floor(np.asarray(lon) / self.lon_size).astype(np.int64)
+        return row * LOW_BITS + col % LOW_BITS
+
+    def centers(self, codes):
+        """Latitude and longitude of the centres of cells."""
+        col = codes % LOW_BITS
+        row = (codes - col) // LOW_BITS
+        col = np.where(col >= LOW_BITS // 2, col - LOW_BITS, col)
+        return (row + 0.5) * self.lat_size, (col + 0.5) * self.lon_size
+
+
+def add_cells(df, zooms):
+    """Add the cell codes of the coord-y/coord-x points of `df` at every
+    zoom of `zooms`."""
+    for zoom in zooms:
+        df[cell_col(zoom)] = Grid(zoom).codes(df['coord-y'].values,
+                                              df['coord-x'].values)
+    return df
+
+
+def bin_points(df, zoom):
+    """Number of points of `df` per cell at `zoom`, with the cell
+    centres as coord-y and coord-x."""
+    grid = Grid(zoom)
+    if cell_col(zoom) in df:
+        codes = df[cell_col(zoom)].values
+    else:
+        codes = grid.codes(df['coord-y'].values, df['coord-x'].values)
+    cells, count = np.unique(codes, return_counts=True)
+    lat, lon = grid.centers(cells)
+    return pd.DataFrame({'coord-y': lat, 'coord-x': lon, 'count': count})
+
+
+def marker_sizes(count):
+    """Marker size of cells growing with the log of their count."""
+    return np.clip(4 + 2 * np.log2(count), 4, 20)
@@ -0,0 +1,160 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Server-side cache of callback outputs (Plotly figures, titles, html
+components) for app.py.
+
+Outputs are kept in memory in least-recently-used order, bounded by a
+number of entries and by their pickled size. With a directory, they
+are also written to disk so several gunicorn workers (or restarts)
+share what one of them built; entries on disk live under a data
+version so outputs of old data are never served.
+
+The cache is configured with environment variables:
+
+    EVAN_FIGURE_CACHE_SIZE   maximum number of entries in memory [512]
+    EVAN_FIGURE_CACHE_MB     maximum pickled size in memory [256]
+    EVAN_FIGURE_CACHE_DIR    disk store shared by workers [none]
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+
+def data_version(paths):
+    """Version string of data files, changing whenever one of them is
+    rebuilt."""
+    h = hashlib.sha256()
+    for path in paths:
+        st = os.stat(path)
+        h.update(("%s:%d:%d" % (path, st.st_size, st.st_mtime_ns)).encode())
+    return h.hexdigest()[:16]
+
+
+class FigureCache:
+    """Bounded LRU cache of callback outputs with an optional disk
+    store and hit/miss counters."""
+
+    def __init__(self, max_entries=512, max_bytes=256 * 2**20,
+                 directory=None, version=''):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory:
+            self.directory = os.path.join(directory, version or 'default')
+            os.makedirs(self.directory, exist_ok=True)
+
+        self.entries = OrderedDict()  # key -> (value, size in bytes)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0,
+                         'evictions': 0}
+
+    @classmethod
+    def from_env(cls, version=''):
+        """A cache configured by the EVAN_FIGURE_CACHE_* variables."""
+        return cls(
+            max_entries=int(os.environ.get('EVAN_FIGURE_CACHE_SIZE', 512)),
+            max_bytes=int(float(os.environ.get(
+                'EVAN_FIGURE_CACHE_MB', 256)) * 2**20),
+            directory=os.environ.get('EVAN_FIGURE_CACHE_DIR') or None,
+            version=version)
+
+    def _path(self, key):
+        name = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, name + '.pkl')
+
+    def _store(self, key, value, size):
+        """Insert into memory and evict least recently used entries."""
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or \
+                    self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.counters['evictions'] += 1
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        return pickle.loads(data), len(data)
+
+    def _write_disk(self, key, data):
+        # written to a temporary file and renamed, so other workers
+        #   never read a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+
+    def get_or_compute(self, key, compute):
+        """Return the cached output of `key`, computing and storing it
+        with `compute()` on a miss."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return self.entries[key][0]
+
+        cached = self._read_disk(key)
+        if cached is not None:
+            with self.lock:
+                self.counters['disk_hits'] += 1
+            self._store(key, *cached)
+            return cached[0]
+
+        with self.lock:
+            self.counters['misses'] += 1
+        value = compute()
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.directory:
+            self._write_disk(key, data)
+        self._store(key, value, len(data))
+        return value
+
+    def memoize(self, key=None):
+        """Decorator caching a callback by its name and inputs.
+
+        `key`, if given, maps the callback's inputs to the values its
+        output actually depends on (e.g. a clickData dict to the
+        clicked local area), so equivalent inputs share an entry.
+        Only use it on callbacks whose output depends on nothing but
+        their inputs and the data loaded at startup.
+        """
+        def decorator(fun):
+            @wraps(fun)
+            def wrapper(*args):
+                inputs = key(*args) if key is not None else args
+                return self.get_or_compute(
+                    (fun.__name__, repr(inputs)), lambda: fun(*args))
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Counters, number of entries and their size in memory."""
+        with self.lock:
+            stats = dict(self.counters)
+            stats.update(entries=len(self.entries), bytes=self.bytes,
+                         max_entries=self.max_entries,
+                         max_bytes=self.max_bytes,
+                         disk=self.directory)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups \
+            if lookups else None
+        return stats
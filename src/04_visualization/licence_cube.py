@@ -0,0 +1,87 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Pre-aggregated licence counts for the first tab of app.py.
+
+vis_agg_licence.csv counts businesses by FOLDERYEAR, LocalArea,
+BusinessIndustry and BusinessType. LicenceCube sums those counts once
+for every combination of fixed dimensions (the others being "all") and
+keeps, for each combination, the breakdown along every remaining
+dimension, so a dropdown change is a dictionary lookup instead of a
+filter and groupby over the table.
+"""
+
+from itertools import combinations
+import numpy as np
+
+DIMS = ['FOLDERYEAR', 'LocalArea', 'BusinessIndustry', 'BusinessType']
+
+
+class LicenceCube:
+    """Sums of `measure` of `agg` over every roll-up of `dims`.
+
+    Filters are passed as keyword arguments named after the
+    dimensions; None (or leaving a dimension out) means all values.
+    """
+
+    def __init__(self, agg, dims=DIMS, measure='business_id'):
+        self.dims = list(dims)
+        self.measure = measure
+        # fixed dims -> {values: total}
+        self.totals = {(): {(): agg[measure].sum()}}
+        # (fixed dims, by) -> (sums indexed by `by`,
+        #                      {values: rows of the sums})
+        self.breakdowns = {}
+
+        for r in range(len(self.dims) + 1):
+            for fixed in combinations(self.dims, r):
+                if fixed:
+                    sums = agg.groupby(list(fixed))[measure].sum()
+                    self.totals[fixed] = dict(zip(
+                        [self._as_tuple(k) for k in sums.index],
+                        sums.values))
+
+                for by in self.dims:
+                    if by not in fixed:
+                        self.breakdowns[(fixed, by)] = self._split(
+                            agg.groupby(list(fixed) + [by])[measure].sum(),
+                            len(fixed))
+
+    @staticmethod
+    def _as_tuple(key):
+        return key if isinstance(key, tuple) else (key,)
+
+    def _split(self, sums, n_fixed):
+        """Index sums by (fixed dims..., by) by `by` alone and record
+        the contiguous rows of every value of the fixed dims."""
+        n = len(sums)
+        if not n_fixed:
+            return sums, {(): (0, n)}
+
+        fixed = sums.index.droplevel(n_fixed)
+        starts = np.flatnonzero(~fixed.duplicated())
+        stops = np.append(starts[1:], n)
+        rows = {self._as_tuple(k): (start, stop) for k, start, stop
+                in zip(fixed[starts].tolist(), starts, stops)}
+        return sums.droplevel(list(range(n_fixed))), rows
+
+    def _key(self, filters):
+        unknown = set(filters) - set(self.dims)
+        if unknown:
+            raise KeyError("Unknown dimension(s): " + ", ".join(unknown))
+        fixed = tuple(d for d in self.dims if filters.get(d) is not None)
+        return fixed, tuple(filters[d] for d in fixed)
+
+    def total(self, **filters):
+        """Sum of the measure over the rows matching `filters`."""
+        fixed, values = self._key(filters)
+        return self.totals[fixed].get(values, 0)
+
+    def breakdown(self, by, **filters):
+        """Sums of the measure by `by` over the rows matching
+        `filters`, sorted by `by`. Do not modify the result."""
+        fixed, values = self._key(filters)
+        sums, rows = self.breakdowns[(fixed, by)]
+        start, stop = rows.get(values, (0, 0))
+        return sums.iloc[start:stop]
@@ -0,0 +1,98 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+vis_licence partitioned by FOLDERYEAR for the scatter map of app.py.
+
+Every year is a contiguous slice of the table, in its original row
+order. Within a year the filter columns (BusinessIndustry,
+BusinessType, LocalArea) are stored as categorical codes with a
+stable sort order, so a selection looks up the rows of its most
+selective value with a binary search and only checks the other
+filters on those rows, instead of comparing every licence of every
+year on each interaction.
+"""
+
+import numpy as np
+import pandas as pd
+
+INDEX_COLS = ['BusinessIndustry', 'BusinessType', 'LocalArea']
+
+
+class YearPartition:
+    """The licences of one year with sorted code indexes."""
+
+    def __init__(self, df, codes):
+        self.df = df
+        self.codes = codes
+        self.sorted = {}
+        for col, code in codes.items():
+            order = np.argsort(code, kind='mergesort')
+            self.sorted[col] = (order, code[order])
+
+    def rows(self, col, code):
+        """Positions of the rows whose `col` has `code`, in order."""
+        order, sorted_codes = self.sorted[col]
+        start, stop = np.searchsorted(sorted_codes, [code, code + 1])
+        return order[start:stop]
+
+    def select(self, filters):
+        """Rows matching {column: code}, in their original order."""
+        if not filters:
+            return self.df
+
+        candidates = {col: self.rows(col, code)
+                      for col, code in filters.items()}
+        col = min(candidates, key=lambda c: len(candidates[c]))
+        positions = candidates.pop(col)
+        for other, code in filters.items():
+            if other != col:
+                positions = positions[self.codes[other][positions] == code]
+
+        return self.df.iloc[np.sort(positions)]
+
+
+class YearPartitions:
+    """A YearPartition per FOLDERYEAR of `licence`."""
+
+    def __init__(self, licence, index_cols=INDEX_COLS):
+        # a table already sorted by year (e.g. memory-mapped from the
+        #   app bundle) is sliced without a copy
+        if not licence.FOLDERYEAR.is_monotonic_increasing:
+            licence = licence.sort_values('FOLDERYEAR', kind='mergesort')
+        self.empty = licence.iloc[:0]
+        self.categories = {}
+        codes = {}
+        for col in index_cols:
+            values = pd.Categorical(licence[col])
+            self.categories[col] = {
+                v: i for i, v in enumerate(values.categories)}
+            codes[col] = np.asarray(values.codes)
+
+        years = licence.FOLDERYEAR.values
+        starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+        stops = np.append(starts[1:], len(years))
+
+        self.partitions = {
+            years[start]: YearPartition(
+                licence.iloc[start:stop],
+                {col: code[start:stop] for col, code in codes.items()})
+            for start, stop in zip(starts, stops)}
+
+    def select(self, year, **filters):
+        """Licences of `year` matching the `filters` (column=value,
+        None means all values), in their original order."""
+        partition = self.partitions.get(year)
+        if partition is None:
+            return self.empty
+
+        codes = {}
+        for col, value in filters.items():
+            if value is None:
+                continue
+            code = self.categories[col].get(value)
+            if code is None:
+                return self.empty
+            codes[col] = code
+
+        return partition.select(codes)
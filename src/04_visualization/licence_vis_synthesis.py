@@ -10,18 +10,25 @@ Usage: src/04_visualization/licence_vis_synthesis.py
 
 # load packages
 import pandas as pd
-import json
 import re
+import sys
 from joblib import load
 import warnings
 
+sys.path.append("src")
+sys.path.append("src/02_clean_wrangle")
+sys.path.append("src/03_modelling")
+from data_io import read_table, write_table  # noqa: E402
+from licence_normalize import normalize_years, latest_per_year  # noqa: E402
+from spatial_features import add_coords  # noqa: E402
+
 warnings.filterwarnings("ignore")
 
 
 def main():
 
     # read data
-    licence_df = pd.read_csv(
+    licence_df = read_table(
         "data/processed/03_cleaned_combined_licences.csv",
         low_memory=False)
     parking = pd.read_csv(
@@ -59,15 +66,12 @@ def main():
     licence_df = licence_df[licence_df.BusinessIndustry.notnull()]
 
     # 4. FOLDERYEAR to int
-    licence_df['FOLDERYEAR'] = [int(i) for i in licence_df['FOLDERYEAR']]
+    licence_df['FOLDERYEAR'] = licence_df['FOLDERYEAR'].astype(int)
     licence_df = licence_df.sort_values('FOLDERYEAR')
 
     # get coordinates
     for df in [parking, disability_parking, licence_df]:
-        df["coord-x"] = df['Geom'].apply(
-            lambda p: json.loads(p)['coordinates'][0])
-        df["coord-y"] = df['Geom'].apply(
-            lambda p: json.loads(p)['coordinates'][1])
+        add_coords(df)
 
     #################
     # Aggregated df #
@@ -79,22 +83,10 @@ def main():
 
     # organize FOLDERYEAR
     df = df.loc[df.FOLDERYEAR.notnull()]
-    df['FOLDERYEAR'] = [y + 2000 if y >= 0 and y <
-                        90 else y + 1900 for y in df.FOLDERYEAR]
-    df['ExtractDate'] = pd.to_datetime(df['ExtractDate'], errors='ignore')
-    df['IssuedDate'] = pd.to_datetime(df['IssuedDate'], errors='ignore')
-    df['ExpiredDate'] = pd.to_datetime(df['ExpiredDate'], errors='ignore')
-
-    df.loc[(df['FOLDERYEAR']
-            < 1997.0) & (df['IssuedDate'].dt.year == 1996.0)
-           & (df['ExpiredDate'].dt.year == 1997.0), 'FOLDERYEAR'] = 1997.0
-
-    df = df[~(df.FOLDERYEAR < 1997.0)]
-    df['FOLDERYEAR'] = [int(i) for i in df['FOLDERYEAR']]
+    df = normalize_years(df)
+    df['FOLDERYEAR'] = df['FOLDERYEAR'].astype(int)
 
-    df = df.sort_values(by=['business_id', 'FOLDERYEAR', 'ExtractDate'])
-    df = df[df.groupby(['business_id'])['FOLDERYEAR'].apply(
-        lambda x: ~(x.duplicated(keep='last')))]
+    df = latest_per_year(df)
 
     # only Issued licences
     df = df.query('Status == "Issued"')
@@ -120,8 +112,8 @@ def main():
     #############
     # Modelling #
     #############
-    train = pd.read_csv("data/processed/05_feat_eng_train.csv")
-    valid = pd.read_csv("data/processed/05_feat_eng_validate.csv")
+    train = read_table("data/processed/05_feat_eng_train.csv")
+    valid = read_table("data/processed/05_feat_eng_validate.csv")
     model = load('results/final_model.joblib')
 
     admin_cols = ["business_id", "BusinessName",
@@ -153,16 +145,13 @@ def main():
 
     # prepare shapely geom
     vis_model = vis_model[vis_model.Geom.notnull()]
-    vis_model['coord-x'] = vis_model['Geom'].apply(
-        lambda p: json.loads(p)['coordinates'][0])
-    vis_model['coord-y'] = vis_model['Geom'].apply(
-        lambda p: json.loads(p)['coordinates'][1])
+    add_coords(vis_model)
 
     # save to files
-    vis_model.to_csv("data/processed/vis_model.csv", index=False)
-    licence_df.to_csv("data/processed/vis_licence.csv", index=False)
-    agg_viz.to_csv("data/processed/vis_agg_licence.csv", index=False)
-    parking.to_csv("data/processed/vis_parking.csv", index=False)
+    write_table(vis_model, "data/processed/vis_model.csv")
+    write_table(licence_df, "data/processed/vis_licence.csv")
+    write_table(agg_viz, "data/processed/vis_agg_licence.csv")
+    write_table(parking, "data/processed/vis_parking.csv")
     # disability_parking.to_csv(
     #    "data/processed/vis_disability_parking.csv", index=False)
 
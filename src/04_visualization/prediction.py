@@ -0,0 +1,239 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Batch scoring of hypothetical businesses with final_model.joblib, for
+the prediction tab and the /predict endpoint of app.py.
+
+A candidate business is a dict (or a row of a data frame) with:
+
+    FOLDERYEAR, LocalArea, BusinessType, history (1 if older than 5
+    years), NumberofEmployees, FeePaid
+    BusinessName (optional)  used to find its chain size
+    lat, lon (optional)      used to count the nearest similar businesses
+    nearest_business_count (optional)  that count, when the caller
+                             already searched the nearest businesses
+
+Its features are assembled as in the prediction tab: census features
+of its year and local area (looked up in a CensusFeatures table), the
+average parking counts, its chain size and the nearest business count.
+A batch goes through the model pipeline once, and MicroBatcher groups
+concurrent single requests into batches.
+"""
+
+from collections import deque
+from concurrent.futures import Future
+import os
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+CANDIDATE_COLS = ['FOLDERYEAR', 'BusinessType', 'LocalArea', 'history',
+                  'NumberofEmployees', 'FeePaid']
+NUMERIC_COLS = ['history', 'NumberofEmployees', 'FeePaid', 'lat', 'lon',
+                'nearest_business_count']
+
+
+def is_number(value):
+    return isinstance(value, (int, float, np.number)) and \
+        not isinstance(value, bool)
+
+
+class CensusFeatures:
+    """Census feature vectors of vis_model by (FOLDERYEAR, LocalArea).
+
+    The vector of a year and local area is the census columns of its
+    second business in vis_model, as the prediction tab always used.
+    """
+
+    def __init__(self, raw_vis_model, census_cols):
+        keys = ['FOLDERYEAR', 'LocalArea']
+        second = raw_vis_model[
+            raw_vis_model.groupby(keys).cumcount() == 1]
+        self.cols = list(census_cols)
+        self.values = second[self.cols].to_numpy(dtype=float)
+        self.index = {key: i for i, key in enumerate(
+            zip(second.FOLDERYEAR.tolist(), second.LocalArea.tolist()))}
+
+    def frame(self, years, areas):
+        """Census features of every (year, local area) pair."""
+        rows = [self.index[key] for key in zip(years, areas)]
+        return pd.DataFrame(self.values[rows], columns=self.cols)
+
+
+class CandidateScorer:
+    """Scores batches of candidate businesses.
+
+    Parameters
+    ----------
+    model : sklearn Pipeline
+        The final model.
+    vis_model : pandas.DataFrame
+        vis_model without its census columns.
+    census : CensusFeatures
+        Census features by year and local area.
+    indexes : BusinessIndexes
+        Spatial indexes of vis_model.
+    """
+
+    def __init__(self, model, vis_model, census, indexes):
+        self.model = model
+        self.census = census
+        self.indexes = indexes
+        self.parking = {col: np.mean(vis_model[col]) for col in
+                        ['Parking meters', 'Disability parking']}
+        # chain size of the first business of every name
+        first = vis_model.drop_duplicates('BusinessName')
+        self.chain = pd.Series(first['chain'].values,
+                               index=first['BusinessName'].values)
+        self.business_types = set(vis_model['BusinessType'])
+        self.batches = deque(maxlen=1000)  # (rows, seconds)
+        self.lock = threading.Lock()
+
+    def validate(self, candidate):
+        """Error message of a candidate dict that cannot be scored, None
+        if it can."""
+        if not isinstance(candidate, dict):
+            return "a candidate must be a JSON object"
+        missing = [c for c in CANDIDATE_COLS if candidate.get(c) is None]
+        if missing:
+            return "missing " + ", ".join(missing)
+        wrong = [c for c in NUMERIC_COLS if candidate.get(c) is not None
+                 and not is_number(candidate[c])]
+        if wrong:
+            return "not a number: " + ", ".join(wrong)
+        key = (candidate['FOLDERYEAR'], candidate['LocalArea'])
+        if key not in self.census.index:
+            return "no census features for FOLDERYEAR %r and LocalArea " \
+                "%r" % key
+        if candidate['BusinessType'] not in self.business_types:
+            return "unknown BusinessType %r" % candidate['BusinessType']
+        return None
+
+    def features(self, candidates):
+        """Model features of a data frame of candidates."""
+        df = self.census.frame(candidates.FOLDERYEAR, candidates.LocalArea)
+        df = df.assign(**{col: candidates[col].values
+                          for col in CANDIDATE_COLS})
+        for col, mean in self.parking.items():
+            df[col] = mean
+
+        df['nearest_business_count'] = np.nan
+        if 'lat' in candidates and 'lon' in candidates:
+            known = candidates.get('nearest_business_count',
+                                   pd.Series(np.nan, index=candidates.index))
+            df['nearest_business_count'] = [
+                count if pd.notnull(count) else
+                len(self.indexes.get(year, business_type).nearest(lat, lon))
+                if pd.notnull(lat) and pd.notnull(lon) and lat and lon
+                else np.nan for count, year, business_type, lat, lon in zip(
+                    known, candidates.FOLDERYEAR, candidates.BusinessType,
+                    candidates.lat, candidates.lon)]
+
+        df['chain'] = 1
+        if 'BusinessName' in candidates:
+            df['chain'] = (candidates.BusinessName.map(self.chain) + 1
+                           ).fillna(1).values
+        return df
+
+    def score(self, candidates):
+        """Predicted label and its probability of every candidate."""
+        start = time.perf_counter()
+        proba = self.model.predict_proba(self.features(candidates))
+        result = pd.DataFrame({
+            'predict': self.model.classes_[proba.argmax(axis=1)],
+            'probability': proba.max(axis=1)}, index=candidates.index)
+        with self.lock:
+            self.batches.append((len(candidates),
+                                 time.perf_counter() - start))
+        return result
+
+    def score_records(self, candidates):
+        """score() of a list of candidate dicts, as JSON-ready dicts; a
+        candidate that fails validate() gets {'error': message}
+        instead, the others are still scored."""
+        results = [{'error': self.validate(c)} for c in candidates]
+        valid = [i for i, r in enumerate(results) if r['error'] is None]
+        if valid:
+            scored = self.score(pd.DataFrame([candidates[i] for i in valid]))
+            for i, p, pr in zip(valid, scored.predict, scored.probability):
+                results[i] = {'predict': int(p), 'probability': float(pr)}
+        return results
+
+    def stats(self):
+        """Sizes and latencies of the recent batches."""
+        with self.lock:
+            batches = list(self.batches)
+        if not batches:
+            return {'batches': 0}
+        rows, seconds = np.array(batches).T
+        return {'batches': len(batches),
+                'rows': int(rows.sum()),
+                'mean_batch_size': float(rows.mean()),
+                'p50_ms': float(np.percentile(seconds, 50) * 1000),
+                'p95_ms': float(np.percentile(seconds, 95) * 1000),
+                'rows_per_second': float(rows.sum() / seconds.sum())}
+
+
+class MicroBatcher:
+    """Scores concurrent single candidates together.
+
+    A request waits at most `max_wait` seconds for others to join its
+    batch of up to `max_batch` candidates. If a batch fails, its
+    candidates are scored one by one so only the bad ones fail.
+    """
+
+    def __init__(self, scorer, max_batch=256, max_wait=0.005):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def _start(self):
+        # the thread is started by the process serving requests, not a
+        #   gunicorn master that forks it away
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self.queue,),
+                                 daemon=True).start()
+                self.pid = os.getpid()
+
+    def submit(self, candidate):
+        """Score one candidate dict, blocking until its batch is done."""
+        if self.pid != os.getpid():
+            self._start()
+        future = Future()
+        self.queue.put((candidate, future))
+        return future.result()
+
+    def _run(self, requests):
+        while True:
+            batch = [requests.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        try:
+            results = self.scorer.score_records([c for c, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                for item in batch:
+                    self._score([item])
+            else:
+                batch[0][1].set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
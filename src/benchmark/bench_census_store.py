@@ -0,0 +1,137 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script compares the census lookups of the neighbourhood profile
+callbacks of app.py (filter, melt, transpose and sort of a topic table)
+with src/04_visualization/census_store.py, on a synthetic census table
+of 23 local areas and 4 census years, and checks both give the same
+labels and values.
+
+Usage: src/benchmark/bench_census_store.py [--requests=<requests>]
+
+Options:
+--requests=<requests>    Number of map clicks [default: 2000]
+"""
+
+from docopt import docopt
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append("src/04_visualization")
+from census_store import CensusStore  # noqa: E402
+
+opt = docopt(__doc__)
+
+YEARS = [2001, 2006, 2011, 2016]
+AREAS = ['area_%d' % i for i in range(22)] + ['City of Vancouver']
+# number of labels of the topics of app.py
+TOPICS = {'edu': 5, 'occ': 11, 'age': 7, 'size': 5, 'lang': 12, 'eth': 11,
+          'tenure': 2, 'dwelling': 3, 'transport': 6}
+BARS = ['edu', 'size', 'dwelling', 'transport']
+TABLES = ['lang', 'eth']
+
+
+def synthetic_topics(rng):
+    keys = pd.DataFrame([(a, y) for y in YEARS for a in AREAS],
+                        columns=['LocalArea', 'Year'])
+    topics = {}
+    for name, n in TOPICS.items():
+        values = rng.dirichlet(np.ones(n), len(keys))
+        topics[name] = pd.concat([keys, pd.DataFrame(
+            values, columns=['%s_%d' % (name, i) for i in range(n)])],
+            axis=1)
+    return topics
+
+
+def get_filter_melt(df, census_year, area):
+    df_filtered = df[(df.Year == census_year) & (df.LocalArea == area)]
+    df_filtered = df_filtered.melt(id_vars=['LocalArea', 'Year'])
+    return df_filtered
+
+
+def table(df, area, census_year):
+    df_filtered = df[(df.Year == census_year) & (
+        df.LocalArea.isin([area, 'City of Vancouver']))]
+    df_filtered = df_filtered.drop(columns=['Year']).set_index('LocalArea').T
+    df_filtered = df_filtered.sort_values(by=[area], ascending=False)
+    return df_filtered.reset_index()[0:5]
+
+
+def click_original(topics, year, area):
+    """Census lookups of the callbacks fired by a map click."""
+    out = {}
+    for name in BARS + ['age']:
+        out[name] = [get_filter_melt(topics[name], year, a)
+                     for a in [area, 'City of Vancouver']]
+    out['occ'] = get_filter_melt(topics['occ'], year, area).sort_values(
+        'value', ascending=False)
+    out['tenure'] = get_filter_melt(topics['tenure'], year, area)
+    for name in TABLES:
+        out[name] = table(topics[name], area, year)
+    return out
+
+
+def click_store(store, year, area):
+    out = {}
+    for name in BARS + ['age']:
+        out[name] = [store.get(name, year, a)
+                     for a in [area, 'City of Vancouver']]
+    out['occ'] = store.top('occ', year, area)
+    out['tenure'] = store.get('tenure', year, area)
+    for name in TABLES:
+        labels, values = store.top(name, year, area, 5)
+        van_labels, van_values = store.get(name, year, 'City of Vancouver')
+        out[name] = labels, values, van_values[
+            [list(van_labels).index(i) for i in labels]]
+    return out
+
+
+def check(original, stored):
+    for name in BARS + ['age']:
+        for df, (labels, values) in zip(original[name], stored[name]):
+            assert list(df.variable) == list(labels)
+            assert np.allclose(df.value, values)
+    for name in ['occ', 'tenure']:
+        assert list(original[name].variable) == list(stored[name][0])
+        assert np.allclose(original[name].value, stored[name][1])
+    for name in TABLES:
+        df, area = original[name], original[name].columns[1]
+        labels, values, van_values = stored[name]
+        assert list(df['index']) == list(labels)
+        assert np.allclose(df[area], values)
+        assert np.allclose(df['City of Vancouver'], van_values)
+
+
+def main(n_requests):
+    rng = np.random.default_rng(2020)
+    topics = synthetic_topics(rng)
+    clicks = [(YEARS[rng.integers(0, 4)], AREAS[rng.integers(0, 22)])
+              for _ in range(n_requests)]
+
+    start = time.perf_counter()
+    store = CensusStore(topics)
+    build = time.perf_counter() - start
+
+    for year, area in clicks[:50]:
+        check(click_original(topics, year, area),
+              click_store(store, year, area))
+    print("Parity checks passed")
+
+    print("method    build_ms  per_click_ms")
+    for method, lookup in [('original', lambda y, a: click_original(
+                                topics, y, a)),
+                           ('store', lambda y, a: click_store(store, y, a))]:
+        start = time.perf_counter()
+        for year, area in clicks:
+            lookup(year, area)
+        per_click = (time.perf_counter() - start) / n_requests
+        print("%-8s  %8.2f  %12.3f" % (
+            method, build * 1000 if method == 'store' else 0,
+            per_click * 1000))
+
+
+if __name__ == "__main__":
+    main(int(opt["--requests"]))
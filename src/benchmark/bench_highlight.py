@@ -0,0 +1,260 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script compares the local area highlight of the tab 1 choropleth
+and the tab 2 map after a click, done on the server by the original
+update_choropleth / update_van_map callbacks (a plotly express figure
+built and sent per click) and in the browser by assets/highlight.js
+(the z of the base figure rewritten, no request). The server path is
+timed from the callback to its JSON response, uncached, and the
+clientside path runs highlight.js in node. Plotly's drawing of the
+figure in the browser is in neither; run
+`dash_clientside.highlight.latency()` in the browser console for it.
+It also checks that both paths give every local area the same colour.
+Requires node and the local area boundary of `make all`.
+
+Usage: src/benchmark/bench_highlight.py [--clicks=<clicks>] \
+[--boundary=<boundary>]
+
+Options:
+--clicks=<clicks>        Number of clicks per map [default: 100]
+--boundary=<boundary>    Local area boundary GeoJSON
+                           [default: data/raw/local_area_boundary.geojson]
+"""
+
+from docopt import docopt
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+
+opt = docopt(__doc__)
+
+HIGHLIGHT_JS = os.path.abspath("assets/highlight.js")
+# colours of app.py
+COLORS = {'not-selected': 'white',
+          'selected': 'rgb(82, 82, 122)',
+          'blank': 'rgb(180, 197, 228)'}
+# z of a local area in the base figures of app.py
+Z_COLORS = {0: 'not-selected', 1: 'selected', 2: 'blank'}
+
+# runs the clientside highlight of every click on the base figure of a
+#   graph, in the browser's way: the dash renderer passes the figure as is
+NODE_DRIVER = """
+var fs = require('fs');
+global.window = {};
+global.document = {getElementById: function() { return null; }};
+require(process.argv[1]);
+var input = JSON.parse(fs.readFileSync(process.argv[2]));
+var highlight = window.dash_clientside.highlight;
+var result = {};
+Object.keys(input.graphs).forEach(function(id) {
+    var figure = input.graphs[id];
+    var times = [], z = [];
+    input.clicks.forEach(function(area) {
+        var start = process.hrtime.bigint();
+        var out = id === 'van_map' ?
+            highlight.van_map(area ? {points: [{location: area}]} : null,
+                              figure) :
+            highlight.choropleth(area, figure);
+        times.push(Number(process.hrtime.bigint() - start) / 1e6);
+        z.push(out.data[0].z);
+    });
+    result[id] = {times: times, z: z};
+});
+console.log(JSON.stringify(result));
+"""
+
+
+def read_boundary(path):
+    """Boundary GeoJSON and local area table, as app_data.py builds
+    them."""
+    with open(path) as f:
+        boundary = json.load(f)
+    for i in boundary['features']:
+        i['name'] = i['properties']['name']
+        i['id'] = i['properties']['mapid']
+    boundary_df = pd.DataFrame([i['properties'] for i in
+                                boundary['features']])[['mapid', 'name']]
+    return boundary, boundary_df.rename(columns={'name': 'LocalArea'})
+
+
+def original_choropleth(boundary, boundary_df, SelectedLocalArea):
+    """Original update_choropleth of app.py."""
+    boundary_df = boundary_df.copy()
+    if SelectedLocalArea:
+        boundary_df['color'] = ['not-selected'] * len(boundary_df)
+    else:
+        boundary_df['color'] = ['blank'] * len(boundary_df)
+
+    boundary_df.loc[
+        boundary_df.LocalArea == SelectedLocalArea,
+        'color'] = 'selected'
+
+    return go.Figure(px.choropleth(
+        boundary_df,
+        geojson=boundary,
+        color="color",
+        color_discrete_map=COLORS,
+        featureidkey="properties.mapid",
+        locations="mapid",
+        projection="mercator",
+        hover_name="LocalArea",
+        hover_data={"color": False,
+                    "mapid": False}
+    )
+    ).update_geos(
+        fitbounds="locations",
+        visible=False
+    ).update_layout(
+        margin={'l': 0, 'r': 0, 't': 0, 'b': 0},
+        coloraxis_showscale=False,
+        showlegend=False)
+
+
+def original_van_map(boundary, boundary_df, clickData):
+    """Original update_van_map of app.py."""
+    boundary_df = boundary_df.copy()
+    boundary_df['color'] = ['blank'] * len(boundary_df)
+
+    if clickData is not None:
+        boundary_df['color'] = ['not-selected'] * len(boundary_df)
+        neighbour = (clickData['points'][0]['location'])
+        boundary_df.loc[
+            boundary_df.LocalArea == neighbour,
+            'color'] = 'selected'
+
+    graph_map = px.choropleth_mapbox(boundary_df,
+                                     geojson=boundary,
+                                     locations='LocalArea',
+                                     featureidkey='properties.name',
+                                     opacity=0.5,
+                                     color="color",
+                                     color_discrete_map=COLORS,
+                                     hover_name='LocalArea',
+                                     hover_data={'LocalArea': False,
+                                                 'color': False},
+                                     mapbox_style="carto-positron",
+                                     center={"lat": 49.252, "lon": -123.140},
+                                     zoom=10.9)
+
+    graph_map.update_layout(
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        coloraxis_showscale=False,
+        showlegend=False,
+        hoverlabel=dict(
+            font_size=16,
+            font_family="sans-serif"),
+        annotations=[go.layout.Annotation(
+            x=0,
+            y=1,
+            text="Click the map to explore Vancouver Neighbourhoods",
+            showarrow=False,
+            font=dict(
+                family="sans-serif",
+                size=20,
+                color="White"),
+            bordercolor="Black",
+            borderwidth=0,
+            borderpad=6,
+            bgcolor="rgb(71, 71, 107)",
+            opacity=0.7)])
+
+    return graph_map
+
+
+def base_figure(boundary, boundary_df, locations):
+    """Base figure of a graph with the fields of area_trace() in app.py
+    that highlight.js reads and rewrites."""
+    return {'data': [{'locations': list(boundary_df[locations]),
+                      'z': [2] * len(boundary_df),
+                      'geojson': boundary,
+                      'hovertext': list(boundary_df['LocalArea'])}],
+            'layout': {}}
+
+
+def server_clicks(callback, args):
+    """Seconds to build and encode the response of every click, the
+    response sizes and the colour of every location per click."""
+    build, encode, size, colors = [], [], [], []
+    for arg in args:
+        start = time.perf_counter()
+        fig = callback(arg)
+        built = time.perf_counter()
+        response = json.dumps({'response': {'props': {'figure': fig}}},
+                              cls=PlotlyJSONEncoder)
+        build.append(built - start)
+        encode.append(time.perf_counter() - built)
+        size.append(len(response))
+        colors.append({loc: trace.name for trace in fig.data
+                       for loc in trace.locations})
+    return build, encode, size, colors
+
+
+def clientside_clicks(graphs, clicks):
+    """Milliseconds of every clientside highlight and its z, by graph."""
+    fd, path = tempfile.mkstemp(suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'graphs': graphs, 'clicks': clicks}, f)
+        out = subprocess.run(['node', '-e', NODE_DRIVER, HIGHLIGHT_JS,
+                              path], check=True, capture_output=True,
+                             text=True)
+    finally:
+        os.remove(path)
+    return json.loads(out.stdout)
+
+
+def main(n_clicks, boundary_path):
+    rng = random.Random(2020)
+    boundary, boundary_df = read_boundary(boundary_path)
+    areas = list(boundary_df.LocalArea)
+    # a cleared dropdown or no click yet shows every area blank
+    clicks = [None if rng.random() < 0.1 else rng.choice(areas)
+              for _ in range(n_clicks)]
+
+    server = {
+        'localarea-map': server_clicks(
+            lambda area: original_choropleth(boundary, boundary_df, area),
+            clicks),
+        'van_map': server_clicks(
+            lambda area: original_van_map(
+                boundary, boundary_df,
+                None if area is None else {'points': [{'location': area}]}),
+            clicks)}
+    locations = {'localarea-map': 'mapid', 'van_map': 'LocalArea'}
+    clientside = clientside_clicks(
+        {id: base_figure(boundary, boundary_df, col)
+         for id, col in locations.items()}, clicks)
+
+    for id, col in locations.items():
+        for colors, z in zip(server[id][3], clientside[id]['z']):
+            assert colors == {loc: Z_COLORS[code] for loc, code in
+                              zip(boundary_df[col], z)}
+    print("Parity checks passed")
+
+    print("graph          path        requests   p50_ms   p95_ms  "
+          "build_ms  encode_ms  response_kb")
+    for id in locations:
+        build, encode, size, _ = server[id]
+        total = np.add(build, encode) * 1000
+        print("%-13s  %-10s  %8d  %7.3f  %7.3f  %8.2f  %9.2f  %11.1f" % (
+            id, 'server', 1, np.percentile(total, 50),
+            np.percentile(total, 95), np.median(build) * 1000,
+            np.median(encode) * 1000, np.mean(size) / 1024))
+        times = clientside[id]['times']
+        print("%-13s  %-10s  %8d  %7.3f  %7.3f  %8s  %9s  %11.1f" % (
+            id, 'clientside', 0, np.percentile(times, 50),
+            np.percentile(times, 95), '-', '-', 0))
+
+
+if __name__ == "__main__":
+    main(int(opt["--clicks"]), opt["--boundary"])
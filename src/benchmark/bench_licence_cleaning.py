@@ -0,0 +1,136 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script checks that the vectorized licence normalization in
+src/02_clean_wrangle/licence_normalize.py gives the same output as the
+original list comprehensions, date parsing and groupby-apply of
+03_clean_licence.py, and reports rows/sec of both on a synthetic
+licence table.
+
+Usage: src/benchmark/bench_licence_cleaning.py [--sizes=<sizes>] \
+[--loop_max=<loop_max>]
+
+Options:
+--sizes=<sizes>          Comma separated numbers of licence rows
+                           [default: 100000,1000000,4000000]
+--loop_max=<loop_max>    Largest row count the original code is run on
+                           [default: 1000000]
+"""
+
+from docopt import docopt
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append("src/02_clean_wrangle")
+import licence_normalize  # noqa: E402
+
+opt = docopt(__doc__)
+
+CITIES = ['Vancouver', 'VANCOUVER', 'Van', 'vancouver (ubc)', 'Burnaby',
+          'Richmond', 'North Vancouver', np.nan]
+
+
+def city_loop(df):
+    """Original City cleaning from 03_clean_licence.py."""
+    city_list = ['vancouver', 'vacouver', 'vacouver', 'van', 'v',
+                 'vanc', 'vancouver (ubc)', 'bc vancouver',
+                 'v5x 3g9vancouver', 'vancovuer', 'vancouver(ubc)',
+                 '`vancouver', '0vancouver', 'qbcvancouver']
+
+    df['City'] = ['vancouver' if str(
+        c).lower() in city_list else c for c in df.City]
+    return df
+
+
+def year_loop(df):
+    """Original FOLDERYEAR organization from 03_clean_licence.py."""
+    df['FOLDERYEAR'] = [y + 2000 if y >= 0 and y <
+                        90 else y + 1900 for y in df.FOLDERYEAR]
+    return df
+
+
+def dates_loop(df):
+    """Original date parsing and 1996 adjustment from
+    03_clean_licence.py; errors='ignore' returned the parsed dates when
+    every value parses, as in this table."""
+    for col in ['ExtractDate', 'IssuedDate', 'ExpiredDate']:
+        df[col] = pd.to_datetime(df[col])
+
+    df.loc[(df['FOLDERYEAR']
+            < 1997.0) & (df['IssuedDate'].dt.year == 1996.0)
+           & (df['ExpiredDate'].dt.year == 1997.0), 'FOLDERYEAR'] = 1997.0
+
+    return df[~(df.FOLDERYEAR < 1997.0)]
+
+
+def dedup_loop(df):
+    """Original deduplication from 03_clean_licence.py.
+
+    group_keys=False keeps the result aligned with df on pandas >= 2,
+    as the original did on older pandas.
+    """
+    df = df.sort_values(by=['business_id', 'FOLDERYEAR', 'ExtractDate'])
+    return df[df.groupby(['business_id'], group_keys=False)[
+        'FOLDERYEAR'].apply(lambda x: ~(x.duplicated(keep='last')))]
+
+
+def original(df):
+    return dedup_loop(dates_loop(year_loop(city_loop(df))))
+
+
+def vectorized(df):
+    df['City'] = licence_normalize.normalize_city(df.City)
+    df = licence_normalize.normalize_years(df)
+    return licence_normalize.latest_per_year(df)
+
+
+def synthetic_licence(n, rng):
+    """Licence rows of ~n/4 businesses over 1995-2019 with repeated
+    extracts of the same business and year, dates formatted as
+    02_split_licence.R writes them."""
+    year = rng.integers(95, 120, n)
+    issued_year = 1900 + year - rng.integers(0, 2, n)
+    issued = pd.to_datetime(issued_year * 1000 + rng.integers(1, 366, n),
+                            format='%Y%j')
+    expired = issued + pd.to_timedelta(rng.integers(1, 400, n), unit='D')
+    extract = pd.Timestamp('2013-01-01') + pd.to_timedelta(
+        rng.integers(0, 2500 * 86400, n), unit='s')
+    return pd.DataFrame({
+        'business_id': rng.integers(0, max(n // 4, 1), n),
+        'FOLDERYEAR': (year % 100).astype(float),
+        'ExtractDate': extract.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'IssuedDate': issued.strftime('%Y-%m-%d'),
+        'ExpiredDate': expired.strftime('%Y-%m-%d'),
+        'City': rng.choice(np.array(CITIES, dtype=object), n)})
+
+
+def rows_per_sec(fun, df):
+    start = time.perf_counter()
+    result = fun(df.copy())
+    return len(df) / (time.perf_counter() - start), result
+
+
+def main(sizes, loop_max):
+    rng = np.random.default_rng(2020)
+
+    print("rows      vectorized_rows/s  original_rows/s")
+    for n in sizes:
+        df = synthetic_licence(n, rng)
+        fast, result = rows_per_sec(vectorized, df)
+
+        if n <= loop_max:
+            slow, expected = rows_per_sec(original, df)
+            pd.testing.assert_frame_equal(expected, result)
+            print("%8d  %17.0f  %15.0f" % (n, fast, slow))
+        else:
+            print("%8d  %17.0f  %15s" % (n, fast, "-"))
+
+    print("Parity checks passed")
+
+
+if __name__ == "__main__":
+    main([int(s) for s in opt["--sizes"].split(",")],
+         int(opt["--loop_max"]))
@@ -0,0 +1,185 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script checks that the LicenceCube lookups of
+src/04_visualization/licence_cube.py give the same data as the
+original filter and groupby code of the tab 1 callbacks of app.py
+(update_histogram, update_line and update_side_bar) and times both
+with several simulated users changing dropdowns at the same time.
+
+Usage: src/benchmark/bench_licence_cube.py [--users=<users>] \
+[--requests=<requests>]
+
+Options:
+--users=<users>          Comma separated numbers of concurrent users
+                           [default: 1,4,16]
+--requests=<requests>    Callback requests per user [default: 200]
+"""
+
+from docopt import docopt
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append("src/04_visualization")
+from licence_cube import LicenceCube  # noqa: E402
+
+opt = docopt(__doc__)
+
+
+def synthetic_agg_licence(rng):
+    """Counts by year, local area, industry and type, shaped like
+    vis_agg_licence.csv: 20 industries of 15 types each."""
+    types = pd.DataFrame({
+        'BusinessType': ['type_%d' % i for i in range(300)],
+        'BusinessIndustry': ['industry_%d' % (i // 15)
+                             for i in range(300)]})
+    grid = pd.MultiIndex.from_product(
+        [range(1997, 2021), ['area_%d' % i for i in range(22)],
+         types.BusinessType], names=['FOLDERYEAR', 'LocalArea',
+                                     'BusinessType']).to_frame(index=False)
+    agg = grid.merge(types, on='BusinessType')
+    # most small types are missing in most areas and years
+    agg = agg[rng.random(len(agg)) < 0.4]
+    agg['business_id'] = rng.integers(1, 200, len(agg))
+    return agg[['FOLDERYEAR', 'LocalArea', 'BusinessIndustry',
+                'BusinessType', 'business_id']].reset_index(drop=True)
+
+
+def histogram_original(agg_licence, industry, area):
+    """Data of the original update_histogram."""
+    sum_col = 'BusinessType'
+    if industry and area:
+        df = agg_licence[agg_licence.BusinessIndustry == industry]
+        df = df[df.LocalArea == area]
+    elif industry:
+        df = agg_licence[agg_licence.BusinessIndustry == industry]
+    elif area:
+        sum_col = 'BusinessIndustry'
+        df = agg_licence[agg_licence.LocalArea == area]
+    else:
+        df = agg_licence.copy()
+        sum_col = 'BusinessIndustry'
+    df = pd.DataFrame(df.groupby([sum_col])[
+        'business_id'].sum()).reset_index()
+    return df.sort_values('business_id')
+
+
+def histogram_cube(cube, industry, area):
+    sum_col = 'BusinessType' if industry else 'BusinessIndustry'
+    df = cube.breakdown(sum_col, BusinessIndustry=industry,
+                        LocalArea=area).reset_index()
+    return df.sort_values('business_id')
+
+
+def line_original(agg_licence, industry, area, business_type):
+    """Data of the original update_line."""
+    df = agg_licence.copy()
+    if industry:
+        df = df[df.BusinessIndustry == industry]
+    if area:
+        df = df[df.LocalArea == area]
+    if business_type:
+        df = df[df.BusinessType == business_type]
+    return pd.DataFrame(df.groupby([
+        'FOLDERYEAR'])['business_id'].sum()).reset_index()
+
+
+def line_cube(cube, industry, area, business_type):
+    return cube.breakdown('FOLDERYEAR', BusinessIndustry=industry,
+                          LocalArea=area,
+                          BusinessType=business_type).reset_index()
+
+
+def side_bar_original(agg_licence, year, area):
+    """Business count of the original update_side_bar."""
+    df = agg_licence[agg_licence.FOLDERYEAR == year]
+    if area:
+        df = df[df.LocalArea == area]
+    return df.business_id.sum()
+
+
+def side_bar_cube(cube, year, area):
+    return cube.total(FOLDERYEAR=year, LocalArea=area)
+
+
+def random_requests(agg, rng, n):
+    """Dropdown states, each value left empty half of the time."""
+    def pick(col):
+        return rng.choice(agg[col].unique()) if rng.random() < 0.5 \
+            else None
+
+    requests = []
+    for _ in range(n):
+        industry, area = pick('BusinessIndustry'), pick('LocalArea')
+        business_type = None
+        if industry and rng.random() < 0.5:
+            business_type = rng.choice(agg.BusinessType[
+                agg.BusinessIndustry == industry].unique())
+        requests.append((industry, area, business_type,
+                         int(rng.choice(agg.FOLDERYEAR.unique()))))
+    return requests
+
+
+def serve(histogram, line, side_bar, data, requests):
+    """Run the three callbacks for every request, return latencies."""
+    latencies = []
+    for industry, area, business_type, year in requests:
+        start = time.perf_counter()
+        histogram(data, industry, area)
+        line(data, industry, area, business_type)
+        side_bar(data, year, area)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main(users, n_requests):
+    rng = np.random.default_rng(2020)
+    agg = synthetic_agg_licence(rng)
+
+    start = time.perf_counter()
+    cube = LicenceCube(agg)
+    print("rows: %d, cube built in %.2f s" % (
+        len(agg), time.perf_counter() - start))
+
+    for industry, area, business_type, year in random_requests(
+            agg, rng, 200):
+        pd.testing.assert_frame_equal(
+            histogram_original(agg, industry, area).reset_index(drop=True),
+            histogram_cube(cube, industry, area).reset_index(drop=True))
+        pd.testing.assert_frame_equal(
+            line_original(agg, industry, area, business_type),
+            line_cube(cube, industry, area, business_type))
+        assert side_bar_original(agg, year, area) == \
+            side_bar_cube(cube, year, area)
+    print("Parity checks passed")
+
+    implementations = {
+        'original': (histogram_original, line_original,
+                     side_bar_original, agg),
+        'cube': (histogram_cube, line_cube, side_bar_cube, cube)}
+
+    print("users  version    p50_ms   p95_ms  requests/s")
+    for n_users in users:
+        requests = [random_requests(agg, rng, n_requests)
+                    for _ in range(n_users)]
+        for name, (histogram, line, side_bar, data) in \
+                implementations.items():
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=n_users) as pool:
+                latencies = sum(pool.map(
+                    lambda r: serve(histogram, line, side_bar, data, r),
+                    requests), [])
+            wall = time.perf_counter() - start
+            print("%5d  %-8s  %7.2f  %7.2f  %10.0f" % (
+                n_users, name, np.percentile(latencies, 50) * 1000,
+                np.percentile(latencies, 95) * 1000,
+                len(latencies) / wall))
+
+
+if __name__ == "__main__":
+    main([int(u) for u in opt["--users"].split(",")],
+         int(opt["--requests"]))
@@ -0,0 +1,133 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script checks that the columnar history/chain features in
+src/03_modelling/licence_features.py give the same output as the
+original per-business_id loops, and times both on a synthetic
+licence table.
+
+Usage: src/benchmark/bench_licence_features.py [--sizes=<sizes>] \
+[--loop_max=<loop_max>]
+
+Options:
+--sizes=<sizes>          Comma separated numbers of licence rows
+                           [default: 2000,20000,200000]
+--loop_max=<loop_max>    Largest row count the loops are run on
+                           [default: 20000]
+"""
+
+from docopt import docopt
+from collections import Counter
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append("src/03_modelling")
+import licence_features  # noqa: E402
+
+opt = docopt(__doc__)
+
+
+def history_loop(df):
+    """Original history() from 07_feature_engineering.py."""
+    df['history'] = np.zeros(len(df))
+
+    for i in df.business_id.unique():
+        id_hist = len(df[df.business_id == i])
+
+        if id_hist >= 5:
+            history = [0]*5+[1]*(id_hist-5)
+            df.loc[df.business_id == i,
+                   'history'] = history
+
+    return df
+
+
+def chain_loop(df):
+    """Original chain() from 07_feature_engineering.py."""
+    df_copy = df[df.BusinessName.notnull()]
+
+    names = []
+    for i in df_copy.business_id.unique():
+        names.append(
+            (df_copy.loc[df_copy.business_id == i,
+                         'BusinessName'].values[0],
+             df_copy.loc[df_copy.business_id == i,
+                         'BusinessIndustry'].values[0]))
+
+    name_dict = Counter(names)
+
+    chain = []
+    for i in range(len(df)):
+        name = df.iloc[i, df.columns.get_loc(
+            'BusinessName')]
+        industry = df.iloc[i, df.columns.get_loc(
+            'BusinessIndustry')]
+
+        if pd.isnull(name):
+            chain.append(name)
+        else:
+            try:
+                chain.append(name_dict[
+                    (name, industry)])
+            except:
+                chain.append(0)
+
+    df['chain'] = chain
+
+    return df
+
+
+def synthetic_licence(n, rng):
+    """Licence rows with repeated businesses, shuffled, some
+    businesses renamed over time and ~5% missing names."""
+    business_id = rng.integers(0, max(n // 6, 1), n)
+    name = np.array(["name_%d" % i for i in
+                     rng.integers(0, max(n // 20, 1), n)], dtype=object)
+    name[rng.random(n) < 0.05] = None
+    industry = rng.choice(['Retail trade', 'Construction',
+                           'Accommodation and food services'], n)
+    return pd.DataFrame({'business_id': business_id,
+                         'FOLDERYEAR': rng.integers(1997, 2020, n),
+                         'BusinessName': name,
+                         'BusinessIndustry': industry})
+
+
+def check_parity(df):
+    """Assert both implementations agree on a frame."""
+    expected = chain_loop(history_loop(df.copy()))
+    result = licence_features.chain(
+        licence_features.history(df.copy()))
+
+    pd.testing.assert_series_equal(expected.history, result.history)
+    pd.testing.assert_series_equal(expected.chain.astype(float),
+                                   result.chain)
+
+
+def main(sizes, loop_max):
+    rng = np.random.default_rng(2020)
+
+    print("rows      columnar_s  loop_s")
+    for n in sizes:
+        df = synthetic_licence(n, rng)
+
+        start = time.perf_counter()
+        licence_features.chain(licence_features.history(df.copy()))
+        columnar = time.perf_counter() - start
+
+        if n <= loop_max:
+            start = time.perf_counter()
+            check_parity(df)
+            loop = time.perf_counter() - start - columnar
+            print("%8d  %10.3f  %6.1f" % (n, columnar, loop))
+        else:
+            print("%8d  %10.3f  %6s" % (n, columnar, "-"))
+
+    print("Parity checks passed")
+
+
+if __name__ == "__main__":
+    main([int(s) for s in opt["--sizes"].split(",")],
+         int(opt["--loop_max"]))
@@ -0,0 +1,187 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script load tests the dashboard served by gunicorn (app:server,
+with the settings of gunicorn.conf.py). For every number of workers it
+starts the server locally, lets concurrent clients post random
+dropdown, slider and map selections to the _dash-update-component
+endpoint, and reports throughput, latency and the proportional memory
+(PSS) of the master and its workers. Run it from the root of the
+project after `make all`.
+
+Usage: src/benchmark/bench_load.py [--workers=<workers>] \
+[--threads=<threads>] [--users=<users>] [--requests=<requests>] \
+[--port=<port>]
+
+Options:
+--workers=<workers>      Comma separated numbers of gunicorn workers
+                           [default: 1,2,4]
+--threads=<threads>      Threads per gunicorn worker [default: 1]
+--users=<users>          Number of concurrent clients [default: 16]
+--requests=<requests>    Requests per client [default: 50]
+--port=<port>            Local port of the server [default: 8060]
+"""
+
+from docopt import docopt
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+import json
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+
+sys.path.append("src/04_visualization")
+from app_data import AppData  # noqa: E402
+
+opt = docopt(__doc__)
+
+
+def payload(outputs, inputs, changed):
+    """Body of a Dash 1.x callback request for `outputs` (id, property)
+    and `inputs` (id, property, value)."""
+    if len(outputs) == 1:
+        output = "%s.%s" % outputs[0]
+        outputs_list = {'id': outputs[0][0], 'property': outputs[0][1]}
+    else:
+        output = ".." + "...".join("%s.%s" % o for o in outputs) + ".."
+        outputs_list = [{'id': i, 'property': p} for i, p in outputs]
+    return {'output': output,
+            'outputs': outputs_list,
+            'inputs': [{'id': i, 'property': p, 'value': v}
+                       for i, p, v in inputs],
+            'changedPropIds': [changed],
+            'state': []}
+
+
+def random_requests(common, rng, n):
+    """Callback requests of the first two tabs with random values."""
+    areas = list(common['localareas'])
+    industries = list(common['industries'])
+    years = [int(y) for y in common['years']]
+
+    def maybe(values):
+        return rng.choice(values) if rng.random() < 0.5 else None
+
+    requests = []
+    for _ in range(n):
+        industry, area = maybe(industries), maybe(areas)
+        business_type = maybe(common['bt_lookup'][industry]) \
+            if industry else None
+        year = rng.choice(years)
+        click = {'points': [{'location': area}]} if area else None
+        requests.append(rng.choice([
+            payload([('scatter-map-payload', 'data')],
+                    [('industry-dropdown', 'value', industry),
+                     ('year-slider', 'value', year),
+                     ('localarea-dropdown', 'value', area),
+                     ('businesstype-dropdown-tab1', 'value', business_type)],
+                    'year-slider.value'),
+            payload([('business-type-histogram', 'figure')],
+                    [('industry-dropdown', 'value', industry),
+                     ('localarea-dropdown', 'value', area)],
+                    'industry-dropdown.value'),
+            payload([('business-industry-line', 'figure')],
+                    [('industry-dropdown', 'value', industry),
+                     ('localarea-dropdown', 'value', area),
+                     ('businesstype-dropdown-tab1', 'value', business_type)],
+                    'businesstype-dropdown-tab1.value'),
+            payload([('edu-title', 'children'), ('edu_graph', 'figure')],
+                    [('van_map', 'clickData', click),
+                     ('year_slider_census', 'value', year)],
+                    'van_map.clickData')]))
+    return requests
+
+
+def post(url, body):
+    request = Request(url, data=json.dumps(body).encode(),
+                      headers={'Content-Type': 'application/json'})
+    with urlopen(request) as response:
+        response.read()
+
+
+def client(url, requests):
+    """Send `requests` one after the other, return latencies and the
+    number of failed requests."""
+    latencies, errors = [], 0
+    for body in requests:
+        start = time.perf_counter()
+        try:
+            post(url, body)
+        except OSError:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def pss_mb(pid):
+    """Proportional set size of a process and its children, in MB."""
+    pids, total = [pid], 0
+    while pids:
+        p = pids.pop()
+        try:
+            with open("/proc/%d/smaps_rollup" % p) as f:
+                total += sum(int(line.split()[1]) for line in f
+                             if line.startswith('Pss:'))
+            with open("/proc/%d/task/%d/children" % (p, p)) as f:
+                pids += [int(c) for c in f.read().split()]
+        except OSError:
+            continue
+    return total / 1024
+
+
+def start_server(workers, threads, port):
+    server = subprocess.Popen(
+        ['gunicorn', '--workers', str(workers), '--threads', str(threads),
+         '--bind', '127.0.0.1:%d' % port, 'app:server'])
+    deadline = time.time() + 600
+    while time.time() < deadline:
+        try:
+            urlopen("http://127.0.0.1:%d/" % port).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("gunicorn exited with code %d" %
+                                   server.returncode)
+            time.sleep(1)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def main(worker_counts, threads, users, n_requests, port):
+    rng = random.Random(2020)
+    common = AppData()['common']
+    url = "http://127.0.0.1:%d/_dash-update-component" % port
+
+    print("workers  requests/s   p50_ms   p95_ms  errors  pss_MB")
+    for workers in worker_counts:
+        server = start_server(workers, threads, port)
+        try:
+            # warm up the workers before timing
+            client(url, random_requests(common, rng, 4 * workers))
+
+            requests = [random_requests(common, rng, n_requests)
+                        for _ in range(users)]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=users) as pool:
+                results = list(pool.map(lambda r: client(url, r), requests))
+            wall = time.perf_counter() - start
+
+            latencies = sum([r[0] for r in results], [])
+            errors = sum(r[1] for r in results)
+            print("%7d  %10.1f  %7.1f  %7.1f  %6d  %6.0f" % (
+                workers, len(latencies) / wall,
+                np.percentile(latencies, 50) * 1000,
+                np.percentile(latencies, 95) * 1000, errors,
+                pss_mb(server.pid)))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main([int(w) for w in opt["--workers"].split(",")],
+         int(opt["--threads"]), int(opt["--users"]),
+         int(opt["--requests"]), int(opt["--port"]))
@@ -0,0 +1,138 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script compares the scatter map traces of update_figure in app.py
+with one marker per licence against the grid aggregation of
+src/04_visualization/density_bins.py, on a synthetic vis_licence. For
+selections of every size it reports the number of markers, the size
+of the JSON payload and the time to build and serialize the traces.
+Browser render time grows with the number of markers. The script also
+checks that grid cells count every selected licence exactly once.
+
+Usage: src/benchmark/bench_map_density.py [--rows=<rows>] \
+[--requests=<requests>]
+
+Options:
+--rows=<rows>            Number of synthetic licences [default: 1500000]
+--requests=<requests>    Number of map interactions [default: 100]
+"""
+
+from docopt import docopt
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append("src/04_visualization")
+from licence_partitions import YearPartitions  # noqa: E402
+from density_bins import (MAX_POINTS, add_cells, bin_points,  # noqa: E402
+                          marker_sizes)
+
+opt = docopt(__doc__)
+
+STATUS = ['Issued', 'Inactive', 'Pending', 'Cancelled',
+          'Gone Out of Business']
+
+
+def synthetic_licence(n, rng):
+    """Licences over 1997-2020 of 300 types in 20 industries, clustered
+    around a few centres like businesses along commercial streets."""
+    business_type = rng.integers(0, 300, n)
+    centres = np.column_stack([-123.22 + rng.random(200) * 0.2,
+                               49.20 + rng.random(200) * 0.1])
+    where = centres[rng.integers(0, 200, n)] + rng.normal(0, 0.004, (n, 2))
+    return pd.DataFrame({
+        'FOLDERYEAR': np.sort(rng.integers(1997, 2021, n)),
+        'BusinessIndustry': ['industry_%d' % (t // 15)
+                             for t in business_type],
+        'BusinessType': ['type_%d' % t for t in business_type],
+        'LocalArea': rng.choice(['area_%d' % i for i in range(22)], n),
+        'NextYearStatus': rng.choice(STATUS, n, p=[.8, .1, .02, .03, .05]),
+        'BusinessName': ['name_%d' % i for i in rng.integers(0, n, n)],
+        'coord-x': where[:, 0],
+        'coord-y': where[:, 1]})
+
+
+def traces_points(filtered_df, zoom):
+    """Trace data of the original update_figure."""
+    status_rows = filtered_df.groupby('NextYearStatus').indices
+    traces = []
+    for i in STATUS:
+        df = filtered_df.iloc[status_rows.get(i, [])]
+        traces.append({
+            'type': 'scattermapbox', 'name': i, 'mode': 'markers',
+            'lat': df['coord-y'].tolist(), 'lon': df['coord-x'].tolist(),
+            'customdata': df[['BusinessName', 'BusinessType']
+                             ].astype(str).values.tolist(),
+            'marker': {'size': 4}})
+    return traces
+
+
+def traces_binned(filtered_df, zoom):
+    status_rows = filtered_df.groupby('NextYearStatus').indices
+    traces = []
+    for i in STATUS:
+        cells = bin_points(filtered_df.iloc[status_rows.get(i, [])], zoom)
+        traces.append({
+            'type': 'scattermapbox', 'name': i, 'mode': 'markers',
+            'lat': cells['coord-y'].tolist(),
+            'lon': cells['coord-x'].tolist(),
+            'text': cells['count'].tolist(),
+            'marker': {'size': marker_sizes(cells['count']).tolist()}})
+    return traces
+
+
+def random_requests(rng, n):
+    requests = []
+    for _ in range(n):
+        industry = rng.integers(0, 20) if rng.random() < 0.5 else None
+        area = rng.integers(0, 22) if rng.random() < 0.5 else None
+        requests.append((
+            int(rng.integers(1997, 2021)),
+            None if industry is None else 'industry_%d' % industry,
+            None if area is None else 'area_%d' % area))
+    return requests
+
+
+def main(rows, n_requests):
+    rng = np.random.default_rng(2020)
+    licence = add_cells(synthetic_licence(rows, rng), [11, 13])
+    partitions = YearPartitions(licence)
+
+    results = []
+    for year, industry, area in random_requests(rng, n_requests):
+        filtered_df = partitions.select(year, BusinessIndustry=industry,
+                                        LocalArea=area)
+        zoom = 13 if area else 11
+        row = [len(filtered_df)]
+        for build in [traces_points, traces_binned]:
+            start = time.perf_counter()
+            traces = build(filtered_df, zoom)
+            payload = json.dumps(traces)
+            row += [sum(len(t['lat']) for t in traces), len(payload),
+                    time.perf_counter() - start]
+        assert sum(sum(t['text']) for t in traces) == len(filtered_df)
+        results.append(row)
+    print("Parity checks passed")
+
+    df = pd.DataFrame(results, columns=[
+        'licences', 'points_markers', 'points_bytes', 'points_s',
+        'binned_markers', 'binned_bytes', 'binned_s'])
+    df['size'] = np.where(df.licences > MAX_POINTS,
+                          'above %d' % MAX_POINTS, 'below %d' % MAX_POINTS)
+    summary = df.groupby('size').agg(
+        requests=('licences', 'size'),
+        licences=('licences', 'mean'),
+        points_markers=('points_markers', 'mean'),
+        binned_markers=('binned_markers', 'mean'),
+        points_kb=('points_bytes', lambda b: b.mean() / 1024),
+        binned_kb=('binned_bytes', lambda b: b.mean() / 1024),
+        points_ms=('points_s', lambda s: s.median() * 1000),
+        binned_ms=('binned_s', lambda s: s.median() * 1000))
+    print(summary.round(1).to_string())
+
+
+if __name__ == "__main__":
+    main(int(opt["--rows"]), int(opt["--requests"]))
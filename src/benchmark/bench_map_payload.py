@@ -0,0 +1,130 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script compares the JSON size of the scatter map traces of
+update_figure in app.py with the compact payloads of
+src/04_visualization/compact_payload.py, for selections of a synthetic
+vis_licence below the grid aggregation threshold. It also checks that
+decoding a compact payload (as assets/compact_payload.js does) gives
+back the original hover data and coordinates within the rounding.
+Layout templates are not counted.
+
+Usage: src/benchmark/bench_map_payload.py [--rows=<rows>] \
+[--requests=<requests>]
+
+Options:
+--rows=<rows>            Number of synthetic licences [default: 500000]
+--requests=<requests>    Number of map interactions [default: 100]
+"""
+
+from docopt import docopt
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append("src/04_visualization")
+from licence_partitions import YearPartitions  # noqa: E402
+from density_bins import MAX_POINTS  # noqa: E402
+from compact_payload import (COORD_DIGITS, compact_figure,  # noqa: E402
+                             json_default)
+
+opt = docopt(__doc__)
+
+STATUS = ['Issued', 'Inactive', 'Pending', 'Cancelled',
+          'Gone Out of Business']
+
+
+def synthetic_licence(n, rng):
+    """Licences over 1997-2020 of 300 types in 20 industries."""
+    business_type = rng.integers(0, 300, n)
+    return pd.DataFrame({
+        'FOLDERYEAR': np.sort(rng.integers(1997, 2021, n)),
+        'BusinessIndustry': ['industry_%d' % (t // 15)
+                             for t in business_type],
+        'BusinessType': ['Business Type %d' % t for t in business_type],
+        'LocalArea': rng.choice(['area_%d' % i for i in range(22)], n),
+        'NextYearStatus': rng.choice(STATUS, n, p=[.8, .1, .02, .03, .05]),
+        'BusinessName': ['Business Name %d' % i
+                         for i in rng.integers(0, n, n)],
+        'coord-x': -123.22 + rng.random(n) * 0.2,
+        'coord-y': 49.20 + rng.random(n) * 0.1})
+
+
+def figure(filtered_df):
+    """Figure data of the original update_figure, as plotly sends it."""
+    status_rows = filtered_df.groupby('NextYearStatus').indices
+    traces = []
+    for i in STATUS:
+        df = filtered_df.iloc[status_rows.get(i, [])]
+        traces.append({
+            'type': 'scattermapbox', 'name': i, 'mode': 'markers',
+            'lat': df['coord-y'].values, 'lon': df['coord-x'].values,
+            'customdata': df[['BusinessName', 'BusinessType']].values,
+            'marker': {'size': 4}})
+    return {'data': traces, 'layout': {'mapbox': {'zoom': 11}}}
+
+
+def expand(payload):
+    """Python version of payload.expand_figure."""
+    traces = []
+    for trace in payload['data']:
+        columns = [c if isinstance(c, list) else
+                   [c['values'][code] for code in c['codes']]
+                   for c in trace['customdata']['columns']]
+        traces.append(dict(trace, customdata=[list(r) for r in
+                                              zip(*columns)]))
+    return traces
+
+
+def random_requests(rng, n):
+    requests = []
+    for _ in range(n):
+        industry = rng.integers(0, 20)
+        area = rng.integers(0, 22) if rng.random() < 0.5 else None
+        requests.append((
+            int(rng.integers(1997, 2021)), 'industry_%d' % industry,
+            None if area is None else 'area_%d' % area))
+    return requests
+
+
+def main(rows, n_requests):
+    rng = np.random.default_rng(2020)
+    partitions = YearPartitions(synthetic_licence(rows, rng))
+
+    results = []
+    for year, industry, area in random_requests(rng, n_requests):
+        filtered_df = partitions.select(year, BusinessIndustry=industry,
+                                        LocalArea=area)
+        if len(filtered_df) > MAX_POINTS:
+            continue
+        fig = figure(filtered_df)
+        original = len(json.dumps(fig, default=json_default))
+
+        start = time.perf_counter()
+        payload = compact_figure(fig)
+        compact = len(json.dumps(payload, default=json_default))
+        seconds = time.perf_counter() - start
+
+        for trace, expanded in zip(fig['data'], expand(json.loads(
+                json.dumps(payload, default=json_default)))):
+            assert trace['customdata'].tolist() == expanded['customdata']
+            assert np.abs(trace['lat'] - np.array(expanded['lat'])).max(
+                initial=0) <= 0.5 * 10 ** -COORD_DIGITS
+        results.append((len(filtered_df), original, compact, seconds))
+    print("Parity checks passed")
+
+    df = pd.DataFrame(results, columns=['licences', 'original_bytes',
+                                        'compact_bytes', 'encode_s'])
+    print("requests  licences  original_kb  compact_kb  ratio  encode_ms")
+    print("%8d  %8.0f  %11.1f  %10.1f  %5.2f  %9.2f" % (
+        len(df), df.licences.mean(), df.original_bytes.mean() / 1024,
+        df.compact_bytes.mean() / 1024,
+        df.compact_bytes.sum() / df.original_bytes.sum(),
+        df.encode_s.median() * 1000))
+
+
+if __name__ == "__main__":
+    main(int(opt["--rows"]), int(opt["--requests"]))
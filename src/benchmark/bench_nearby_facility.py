@@ -0,0 +1,113 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script benchmarks the BallTree radius-count engine used for the
+nearby parking features against the original licence x facility
+haversine loop, on synthetic point sets spread over Vancouver.
+
+Usage: src/benchmark/bench_nearby_facility.py [--sizes=<sizes>] \
+[--facilities=<facilities>] [--loop_max=<loop_max>]
+
+Options:
+--sizes=<sizes>              Comma separated numbers of licences
+                               [default: 10000,100000,1000000]
+--facilities=<facilities>    Number of facilities [default: 10000]
+--loop_max=<loop_max>        Largest licence count the pure Python
+                               loop is timed on [default: 10000]
+"""
+
+from docopt import docopt
+import math
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append("src/03_modelling")
+from spatial_features import nearby_facility_counts  # noqa: E402
+
+opt = docopt(__doc__)
+
+# bounding box of the City of Vancouver
+LON_RANGE = (-123.225, -123.023)
+LAT_RANGE = (49.199, 49.315)
+AREAS = 22
+
+
+def haversine(coord1, coord2):
+    """Scalar haversine from the original feature engineering loop."""
+    lon1, lat1 = coord1
+    lon2, lat2 = coord2
+    R = 6371000
+
+    phi_1 = math.radians(lat1)
+    phi_2 = math.radians(lat2)
+
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_phi / 2.0) ** 2 + math.cos(
+        phi_1) * math.cos(phi_2) * math.sin(
+        delta_lambda / 2.0) ** 2
+
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return round(R * c)
+
+
+def loop_counts(licence, facility_df, distance):
+    """Licence x facility loop, per local area."""
+    counts = {}
+    for area, licence_partial in licence.groupby('LocalArea'):
+        facility_partial = facility_df[
+            facility_df['Geo Local Area'] == area]
+        for index, row in licence_partial.iterrows():
+            count = 0
+            for index_i, row_i in facility_partial.iterrows():
+                if haversine((row['coord-x'], row['coord-y']),
+                             (row_i['coord-x'], row_i['coord-y'])) < distance:
+                    count += 1
+            counts[index] = count
+    return pd.Series(counts).reindex(licence.index, fill_value=0)
+
+
+def synthetic_points(n, rng):
+    """Random points tagged with one of `AREAS` local areas."""
+    return pd.DataFrame({
+        'coord-x': rng.uniform(*LON_RANGE, n),
+        'coord-y': rng.uniform(*LAT_RANGE, n),
+        'area': rng.integers(0, AREAS, n).astype(str)})
+
+
+def main(sizes, facilities, loop_max):
+    rng = np.random.default_rng(2020)
+
+    facility_df = synthetic_points(facilities, rng).rename(
+        columns={'area': 'Geo Local Area'})
+
+    print("licences  engine_s  loop_s  speedup")
+    for n in sizes:
+        licence = synthetic_points(n, rng).rename(
+            columns={'area': 'LocalArea'})
+
+        start = time.perf_counter()
+        result = nearby_facility_counts(
+            licence, facility_df, 300, 'nearby_parking_meters')
+        engine = time.perf_counter() - start
+
+        if n <= loop_max:
+            start = time.perf_counter()
+            expected = loop_counts(licence, facility_df, 300)
+            loop = time.perf_counter() - start
+            assert (expected.values ==
+                    result['nearby_parking_meters'].values).all()
+            print("%8d  %8.3f  %6.1f  %7.0fx" % (n, engine, loop,
+                                                 loop / engine))
+        else:
+            print("%8d  %8.3f  %6s  %7s" % (n, engine, "-", "-"))
+
+
+if __name__ == "__main__":
+    main([int(s) for s in opt["--sizes"].split(",")],
+         int(opt["--facilities"]), int(opt["--loop_max"]))
@@ -0,0 +1,167 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script times the scoring of candidate businesses: the original
+one-row DataFrame of update_figure3 in app.py scored with predict_proba
+and predict, against CandidateScorer of
+src/04_visualization/prediction.py on batches and on concurrent single
+requests grouped by MicroBatcher. A pipeline shaped like the final
+model is fitted on a synthetic vis_model; the predictions of both
+versions are checked to be equal.
+
+Usage: src/benchmark/bench_prediction.py [--candidates=<candidates>] \
+[--users=<users>]
+
+Options:
+--candidates=<candidates>    Number of candidate businesses [default: 2000]
+--users=<users>              Concurrent single requests [default: 32]
+"""
+
+from docopt import docopt
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.impute import SimpleImputer
+from lightgbm import LGBMClassifier
+
+sys.path.append("src/04_visualization")
+from business_index import BusinessIndexes  # noqa: E402
+from prediction import (CensusFeatures, CandidateScorer,  # noqa: E402
+                        MicroBatcher)
+
+opt = docopt(__doc__)
+
+TYPES = ['Office', 'Retail Dealer', 'Restaurant Class 1',
+         'Health Services', 'Contractor']
+AREAS = ['Downtown', 'Kitsilano', 'Marpole', 'Sunset', 'West End']
+CENSUS_COLS = ['census_%d' % i for i in range(95)]
+
+
+def synthetic_data(n, rng):
+    """vis_model without census columns and a census table by year and
+    local area."""
+    vis_model = pd.DataFrame({
+        'FOLDERYEAR': rng.integers(2013, 2020, n),
+        'BusinessType': rng.choice(TYPES, n),
+        'LocalArea': rng.choice(AREAS, n),
+        'BusinessName': ['name_%d' % i for i in rng.integers(0, n, n)],
+        'history': rng.integers(0, 2, n),
+        'NumberofEmployees': rng.random(n) * 20,
+        'FeePaid': rng.random(n) * 500,
+        'Parking meters': rng.integers(0, 50, n),
+        'Disability parking': rng.integers(0, 5, n),
+        'nearest_business_count': rng.integers(0, 10, n),
+        'chain': rng.integers(1, 5, n),
+        'coord-x': -123.22 + rng.random(n) * 0.2,
+        'coord-y': 49.20 + rng.random(n) * 0.1})
+    census = {(year, area): dict(zip(CENSUS_COLS, rng.random(95)))
+              for year in range(2013, 2020) for area in AREAS}
+    return vis_model, census
+
+
+def fit_model(vis_model, census, rng):
+    """A pipeline with the preprocessing of 011_modelling.py."""
+    X = pd.concat([vis_model.reset_index(drop=True), pd.DataFrame([
+        census[(y, a)] for y, a in zip(vis_model.FOLDERYEAR,
+                                       vis_model.LocalArea)])], axis=1)
+    X = X.drop(columns=['BusinessName', 'coord-x', 'coord-y'])
+    cat_vars = ['FOLDERYEAR', 'BusinessType', 'LocalArea']
+    num_vars = [c for c in X.columns if c not in cat_vars]
+    preprocessor = ColumnTransformer(transformers=[
+        ('num', Pipeline(steps=[
+            ('imputer', SimpleImputer(strategy='median')),
+            ('scaler', StandardScaler())]), num_vars),
+        ('cat', Pipeline(steps=[
+            ('imputer', SimpleImputer(strategy='constant',
+                                      fill_value='missing')),
+            ('onehot', OneHotEncoder(handle_unknown='ignore'))]),
+         cat_vars)])
+    model = Pipeline(steps=[('preprocessor', preprocessor),
+                            ('classifier', LGBMClassifier())])
+    return model.fit(X, rng.integers(0, 2, len(X)))
+
+
+def score_original(model, vis_model, census, indexes, c):
+    """Prediction of the original update_figure3."""
+    row = dict(census[(c['FOLDERYEAR'], c['LocalArea'])])
+    for col in ['FOLDERYEAR', 'BusinessType', 'LocalArea', 'history',
+                'NumberofEmployees', 'FeePaid']:
+        row[col] = c[col]
+    row['Parking meters'] = np.mean(vis_model['Parking meters'])
+    row['Disability parking'] = np.mean(vis_model['Disability parking'])
+    row['nearest_business_count'] = np.nan
+    try:
+        row['chain'] = vis_model.loc[vis_model.BusinessName ==
+                                     c['BusinessName'], 'chain'].values[0] + 1
+    except IndexError:
+        row['chain'] = 1
+    row = pd.DataFrame(row, index=[0])
+    row.loc[:, 'nearest_business_count'] = len(indexes.get(
+        c['FOLDERYEAR'], c['BusinessType']).nearest(c['lat'], c['lon']))
+
+    predict_proba = max(model.predict_proba(row)[0])
+    predict = model.predict(row)[0]
+    return predict, predict_proba
+
+
+def random_candidates(vis_model, rng, n):
+    names = vis_model.BusinessName.values
+    return [{'FOLDERYEAR': int(rng.integers(2013, 2020)),
+             'BusinessType': rng.choice(TYPES),
+             'LocalArea': rng.choice(AREAS),
+             'history': int(rng.integers(0, 2)),
+             'NumberofEmployees': float(rng.random() * 20),
+             'FeePaid': float(rng.random() * 500),
+             'BusinessName': rng.choice(names) if rng.random() < 0.5
+             else 'new business',
+             'lat': 49.20 + rng.random() * 0.1,
+             'lon': -123.22 + rng.random() * 0.2} for _ in range(n)]
+
+
+def main(n_candidates, users):
+    rng = np.random.default_rng(2020)
+    vis_model, census = synthetic_data(50000, rng)
+    model = fit_model(vis_model, census, rng)
+    indexes = BusinessIndexes(vis_model)
+    census_features = CensusFeatures(pd.DataFrame([
+        dict(FOLDERYEAR=year, LocalArea=area, **values)
+        for (year, area), values in census.items() for _ in range(2)]),
+        CENSUS_COLS)
+    scorer = CandidateScorer(model, vis_model, census_features, indexes)
+    candidates = random_candidates(vis_model, rng, n_candidates)
+
+    start = time.perf_counter()
+    expected = [score_original(model, vis_model, census, indexes, c)
+                for c in candidates]
+    original = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = scorer.score_records(candidates)
+    batch = time.perf_counter() - start
+
+    for (predict, proba), r in zip(expected, result):
+        assert predict == r['predict'] and np.isclose(
+            proba, r['probability'])
+    print("Parity checks passed")
+
+    batcher = MicroBatcher(scorer)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(batcher.submit, candidates))
+    micro = time.perf_counter() - start
+
+    print("version          candidates/s")
+    for name, seconds in [('original', original), ('batch', batch),
+                          ('micro-batched', micro)]:
+        print("%-15s  %12.0f" % (name, n_candidates / seconds))
+    print("scorer stats: %s" % scorer.stats())
+
+
+if __name__ == "__main__":
+    main(int(opt["--candidates"]), int(opt["--users"]))
@@ -0,0 +1,119 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script times the nearby similar business lookup of the prediction
+tab (update_figure3 in app.py): the original geometry union of every
+business of the selected year and type against the cached KD-tree
+indexes of src/04_visualization/business_index.py, on a synthetic
+vis_model table. It also checks that the indexed lookup never returns
+a farther location than the original.
+
+Usage: src/benchmark/bench_similar_business.py [--rows=<rows>] \
+[--queries=<queries>]
+
+Options:
+--rows=<rows>          Number of synthetic vis_model rows
+                         [default: 200000]
+--queries=<queries>    Number of typed-in locations [default: 200]
+"""
+
+from docopt import docopt
+import sys
+import time
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.ops import nearest_points
+from shapely.geometry import Point
+
+sys.path.append("src/03_modelling")
+sys.path.append("src/04_visualization")
+from spatial_features import haversine_np  # noqa: E402
+from business_index import BusinessIndexes  # noqa: E402
+
+opt = docopt(__doc__)
+
+TYPES = ['Office', 'Retail Dealer', 'Restaurant Class 1',
+         'Health Services', 'Contractor']
+
+
+def synthetic_vis_model(n, rng):
+    """Businesses over 2013-2019 and a few types, on a grid of
+    addresses so that several businesses share a location."""
+    addresses = np.column_stack([
+        -123.22 + rng.random(n // 3 + 1) * 0.2,
+        49.20 + rng.random(n // 3 + 1) * 0.1])
+    where = addresses[rng.integers(0, len(addresses), n)]
+    return pd.DataFrame({'FOLDERYEAR': rng.integers(2013, 2020, n),
+                         'BusinessType': rng.choice(TYPES, n),
+                         'coord-x': where[:, 0],
+                         'coord-y': where[:, 1]})
+
+
+def original_lookup(vis_model_gpd, lat, lon, year, business_type):
+    """Original get_similar_business in app.py, with the callback's
+    year and type filter."""
+    gpd_tab3 = vis_model_gpd[
+        (vis_model_gpd.FOLDERYEAR == year) & (
+            vis_model_gpd.BusinessType == business_type)]
+    other_points = gpd_tab3["geometry"].unary_union
+    nearest_geoms = nearest_points(Point(lat, lon), other_points)
+    return gpd_tab3.loc[gpd_tab3["geometry"] == nearest_geoms[1]]
+
+
+def distance_to(df, lat, lon):
+    return haversine_np(lon, lat, df['coord-x'].values[0],
+                        df['coord-y'].values[0])
+
+
+def main(rows, queries):
+    rng = np.random.default_rng(2020)
+    vis_model = synthetic_vis_model(rows, rng)
+    lookups = [(49.20 + rng.random() * 0.1, -123.22 + rng.random() * 0.2,
+                int(rng.integers(2013, 2020)), rng.choice(TYPES))
+               for _ in range(queries)]
+
+    start = time.perf_counter()
+    vis_model['geometry'] = [
+        Point(vis_model['coord-y'].iloc[i],
+              vis_model[
+                  'coord-x'].iloc[i]) for i in range(len(vis_model))]
+    vis_model_gpd = gpd.GeoDataFrame(vis_model, geometry='geometry')
+    original_setup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexes = BusinessIndexes(vis_model)
+    index_setup = time.perf_counter() - start
+
+    original_ms, first_ms, cached_ms = [], [], []
+    for lat, lon, year, business_type in lookups:
+        start = time.perf_counter()
+        expected = original_lookup(vis_model_gpd, lat, lon,
+                                   year, business_type)
+        original_ms.append((time.perf_counter() - start) * 1000)
+
+        cold = (year, business_type) not in indexes.indexes
+        start = time.perf_counter()
+        result = indexes.get(year, business_type).nearest(lat, lon)
+        (first_ms if cold else cached_ms).append(
+            (time.perf_counter() - start) * 1000)
+
+        # the index uses meters, the original degrees: never farther
+        assert distance_to(result, lat, lon) <= \
+            distance_to(expected, lat, lon) + 1e-6
+
+    print("rows: %d, (year, type) groups: %d" % (
+        rows, len(indexes.groups)))
+    print("setup            original %8.2f s   index %8.4f s" % (
+        original_setup, index_setup))
+    print("lookup (median)  original %8.2f ms  index %8.3f ms" % (
+        np.median(original_ms), np.median(cached_ms or first_ms)))
+    if first_ms:
+        print("first lookup of a group (builds its tree) %.3f ms" %
+              np.median(first_ms))
+    print("Distance checks passed")
+
+
+if __name__ == "__main__":
+    main(int(opt["--rows"]), int(opt["--queries"]))
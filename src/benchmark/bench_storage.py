@@ -0,0 +1,84 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script benchmarks loading the data/processed artifacts from csv
+and from their parquet siblings (written with EVAN_STORAGE=both or by
+this script), reporting load time and peak memory for each.
+
+Each load runs in a fresh process so peak RSS is measured per load.
+
+Usage: src/benchmark/bench_storage.py [--paths=<paths>] [--convert]
+
+Options:
+--paths=<paths>    Comma separated csv artifacts, the largest
+                     processed files when omitted
+--convert          Write missing parquet siblings from the csv first
+"""
+
+from docopt import docopt
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+import pandas as pd
+
+sys.path.append("src")
+from data_io import parquet_path, write_parquet  # noqa: E402
+
+opt = docopt(__doc__)
+
+PATHS = ['data/processed/03_cleaned_combined_licences.csv',
+         'data/processed/04_combined_train.csv',
+         'data/processed/05_feat_eng_train.csv',
+         'data/processed/vis_licence.csv',
+         'data/processed/vis_model.csv',
+         'data/processed/vis_agg_licence.csv']
+
+
+def load(path, fmt, queue):
+    """Load one artifact and report seconds and the process
+    peak RSS (MB), which includes the interpreter and pandas."""
+    start = time.perf_counter()
+    if fmt == 'csv':
+        df = pd.read_csv(path, low_memory=False)
+    else:
+        df = pd.read_parquet(parquet_path(path))
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((seconds, peak / 1024, len(df)))
+
+
+def measure(path, fmt):
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    p = ctx.Process(target=load, args=(path, fmt, queue))
+    p.start()
+    result = queue.get()
+    p.join()
+    return result
+
+
+def main(paths, convert):
+    print("%-50s %-8s %9s %9s %9s" % ("artifact", "format", "rows",
+                                      "load_s", "peak_MB"))
+    for path in paths:
+        if not os.path.exists(path):
+            print("%-50s missing" % path)
+            continue
+        # only the parquet sibling is written, the csv is left as is
+        if convert and not os.path.exists(parquet_path(path)):
+            write_parquet(pd.read_csv(path, low_memory=False), path)
+
+        for fmt in ['csv', 'parquet']:
+            if fmt == 'parquet' and not os.path.exists(parquet_path(path)):
+                continue
+            seconds, peak, rows = measure(path, fmt)
+            print("%-50s %-8s %9d %9.2f %9.1f" % (
+                os.path.basename(path), fmt, rows, seconds, peak))
+
+
+if __name__ == "__main__":
+    main(opt["--paths"].split(",") if opt["--paths"] else PATHS,
+         opt["--convert"])
@@ -0,0 +1,148 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script measures the refresh of the neighbourhood profile tab
+(tab 2) of the dashboard after a click on its map, with one callback
+per graph and with the single update_neighbourhood callback of
+EVAN_TAB2_BATCH=1. For both it starts gunicorn (app:server) locally and
+replays random clicks the way a browser does: all the callback
+requests of a click at once over at most 6 connections. It reports the
+number of requests and the time from click to the last response. Run
+it from the root of the project after `make all`.
+
+Usage: src/benchmark/bench_tab2_click.py [--clicks=<clicks>] \
+[--workers=<workers>] [--cache-size=<size>] [--port=<port>]
+
+Options:
+--clicks=<clicks>        Number of map clicks [default: 100]
+--workers=<workers>      Number of gunicorn workers [default: 2]
+--cache-size=<size>      EVAN_FIGURE_CACHE_SIZE of the server, 0 to
+                           compute every figure [default: 0]
+--port=<port>            Local port of the server [default: 8061]
+"""
+
+from docopt import docopt
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+
+sys.path.append("src/04_visualization")
+from app_data import AppData  # noqa: E402
+
+opt = docopt(__doc__)
+
+# browsers open at most 6 connections to a host
+CONNECTIONS = 6
+
+# outputs of the tab 2 callbacks of app.py, in their order
+CENSUS_GRAPHS = ['edu', 'occ', 'age', 'size', 'lang', 'eth', 'tenure',
+                 'dwelling', 'transport']
+CALLBACKS = (
+    [[('people-info-overlay', 'children'), ('inf-info-overlay', 'children')]]
+    + [[(g + '-title', 'children'), (g + '_graph', 'figure')]
+       for g in CENSUS_GRAPHS]
+    + [[('parking-title', 'children'), ('parking_graph-payload', 'data')],
+       [('summary_info', 'children')]])
+
+
+def payload(outputs, inputs, changed):
+    """Body of a Dash 1.x callback request for `outputs` (id, property)
+    and `inputs` (id, property, value)."""
+    if len(outputs) == 1:
+        output = "%s.%s" % outputs[0]
+        outputs_list = {'id': outputs[0][0], 'property': outputs[0][1]}
+    else:
+        output = ".." + "...".join("%s.%s" % o for o in outputs) + ".."
+        outputs_list = [{'id': i, 'property': p} for i, p in outputs]
+    return {'output': output,
+            'outputs': outputs_list,
+            'inputs': [{'id': i, 'property': p, 'value': v}
+                       for i, p, v in inputs],
+            'changedPropIds': [changed],
+            'state': []}
+
+
+def click_requests(area, year, batch):
+    """Callback requests of a click on `area`."""
+    click = {'points': [{'location': area}]}
+    inputs = [('van_map', 'clickData', click),
+              ('year_slider_census', 'value', year)]
+    if batch:
+        return [payload(sum(CALLBACKS, []), inputs, 'van_map.clickData')]
+    # the parking callback only takes the click
+    return [payload(outputs, inputs[:1] if outputs[0][0] == 'parking-title'
+                    else inputs, 'van_map.clickData')
+            for outputs in CALLBACKS]
+
+
+def post(url, body):
+    request = Request(url, data=json.dumps(body).encode(),
+                      headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(request) as response:
+            return response.status
+    except OSError:
+        return 0
+
+
+def start_server(workers, port, env):
+    server = subprocess.Popen(
+        ['gunicorn', '--workers', str(workers),
+         '--bind', '127.0.0.1:%d' % port, 'app:server'],
+        env=dict(os.environ, **env))
+    deadline = time.time() + 600
+    while time.time() < deadline:
+        try:
+            urlopen("http://127.0.0.1:%d/" % port).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("gunicorn exited with code %d" %
+                                   server.returncode)
+            time.sleep(1)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def main(n_clicks, workers, cache_size, port):
+    rng = random.Random(2020)
+    common = AppData()['common']
+    areas = list(common['localareas'])
+    years = [int(y) for y in common['years']]
+    clicks = [(rng.choice(areas), rng.choice(years))
+              for _ in range(n_clicks)]
+    url = "http://127.0.0.1:%d/_dash-update-component" % port
+
+    print("mode       requests/click  p50_ms  p95_ms  errors")
+    for mode, batch in [('separate', False), ('batched', True)]:
+        server = start_server(workers, port, {
+            'EVAN_TAB2_BATCH': '1' if batch else '0',
+            'EVAN_FIGURE_CACHE_SIZE': str(cache_size)})
+        try:
+            times, errors = [], 0
+            with ThreadPoolExecutor(max_workers=CONNECTIONS) as pool:
+                for area, year in clicks:
+                    requests = click_requests(area, year, batch)
+                    start = time.perf_counter()
+                    for status in pool.map(lambda r: post(url, r),
+                                           requests):
+                        errors += status != 200
+                    times.append(time.perf_counter() - start)
+            print("%-9s  %14d  %6.1f  %6.1f  %6d" % (
+                mode, len(requests), np.percentile(times, 50) * 1000,
+                np.percentile(times, 95) * 1000, errors))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main(int(opt["--clicks"]), int(opt["--workers"]),
+         int(opt["--cache-size"]), int(opt["--port"]))
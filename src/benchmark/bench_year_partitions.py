@@ -0,0 +1,118 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script checks that the YearPartitions selection of
+src/04_visualization/licence_partitions.py with one groupby over
+NextYearStatus gives the same status traces as the original masks of
+update_figure in app.py, and times both on a synthetic vis_licence.
+
+Usage: src/benchmark/bench_year_partitions.py [--rows=<rows>] \
+[--requests=<requests>]
+
+Options:
+--rows=<rows>            Number of synthetic licences [default: 1500000]
+--requests=<requests>    Number of map interactions [default: 300]
+"""
+
+from docopt import docopt
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append("src/04_visualization")
+from licence_partitions import YearPartitions  # noqa: E402
+
+opt = docopt(__doc__)
+
+STATUS = ['Issued', 'Inactive', 'Pending', 'Cancelled',
+          'Gone Out of Business']
+
+
+def synthetic_licence(n, rng):
+    """Licences over 1997-2020 of 300 types in 20 industries."""
+    business_type = rng.integers(0, 300, n)
+    return pd.DataFrame({
+        'FOLDERYEAR': np.sort(rng.integers(1997, 2021, n)),
+        'BusinessIndustry': ['industry_%d' % (t // 15)
+                             for t in business_type],
+        'BusinessType': ['type_%d' % t for t in business_type],
+        'LocalArea': rng.choice(['area_%d' % i for i in range(22)], n),
+        'NextYearStatus': rng.choice(STATUS, n, p=[.8, .1, .02, .03, .05]),
+        'BusinessName': ['name_%d' % i for i in rng.integers(0, n, n)],
+        'coord-x': -123.2 + rng.random(n) * 0.2,
+        'coord-y': 49.2 + rng.random(n) * 0.1})
+
+
+def traces_original(licence, year, industry, area, business_type):
+    """Status frames of the original update_figure."""
+    filtered_df = licence[licence.FOLDERYEAR == year]
+    if industry:
+        filtered_df = filtered_df[
+            filtered_df.BusinessIndustry == industry]
+    if business_type:
+        filtered_df = filtered_df[
+            filtered_df.BusinessType == business_type]
+    if area:
+        filtered_df = filtered_df[filtered_df.LocalArea == area]
+    return [filtered_df[filtered_df['NextYearStatus'] == i]
+            for i in STATUS]
+
+
+def traces_partitions(partitions, year, industry, area, business_type):
+    filtered_df = partitions.select(year, BusinessIndustry=industry,
+                                    BusinessType=business_type,
+                                    LocalArea=area)
+    status_rows = filtered_df.groupby('NextYearStatus').indices
+    return [filtered_df.iloc[status_rows.get(i, [])] for i in STATUS]
+
+
+def random_requests(rng, n):
+    requests = []
+    for _ in range(n):
+        industry = rng.integers(0, 20) if rng.random() < 0.5 else None
+        business_type = None
+        if industry is not None and rng.random() < 0.5:
+            business_type = 'type_%d' % (industry * 15 +
+                                         rng.integers(0, 15))
+        requests.append((
+            int(rng.integers(1997, 2021)),
+            None if industry is None else 'industry_%d' % industry,
+            'area_%d' % rng.integers(0, 22) if rng.random() < 0.5
+            else None,
+            business_type))
+    return requests
+
+
+def main(rows, n_requests):
+    rng = np.random.default_rng(2020)
+    licence = synthetic_licence(rows, rng)
+
+    start = time.perf_counter()
+    partitions = YearPartitions(licence)
+    print("rows: %d, partitions built in %.2f s" % (
+        rows, time.perf_counter() - start))
+
+    timings = {'original': [], 'partitions': []}
+    for request in random_requests(rng, n_requests):
+        start = time.perf_counter()
+        expected = traces_original(licence, *request)
+        timings['original'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = traces_partitions(partitions, *request)
+        timings['partitions'].append(time.perf_counter() - start)
+
+        for e, r in zip(expected, result):
+            pd.testing.assert_frame_equal(e, r)
+
+    print("Parity checks passed")
+    print("version      p50_ms   p95_ms")
+    for name, t in timings.items():
+        print("%-10s  %7.2f  %7.2f" % (name, np.percentile(t, 50) * 1000,
+                                       np.percentile(t, 95) * 1000))
+
+
+if __name__ == "__main__":
+    main(int(opt["--rows"]), int(opt["--requests"]))
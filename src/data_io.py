@@ -0,0 +1,128 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Storage layer for the data/processed artifacts.
+
+Scripts keep passing the `.csv` paths used in the makefile. Depending
+on the EVAN_STORAGE environment variable, write_table writes:
+
+    csv      the csv only (default)
+    both     the csv and a typed parquet file next to it
+    parquet  the parquet file only
+
+read_table prefers the parquet sibling when it is at least as recent
+as the csv, reads only the requested columns and keeps dtypes (dates,
+integers, categoricals) instead of re-inferring them from text.
+Parquet support needs pyarrow.
+"""
+
+import os
+import pandas as pd
+
+STORAGE_FORMATS = ['csv', 'both', 'parquet']
+
+# low-cardinality text columns stored as dictionary encoded categoricals
+CATEGORICAL_COLS = ['LocalArea', 'BusinessType',
+                    'BusinessIndustry', 'Status', 'NextYearStatus']
+
+
+def storage_format():
+    """Return the configured storage format."""
+    fmt = os.environ.get('EVAN_STORAGE', 'csv').lower()
+    if fmt not in STORAGE_FORMATS:
+        raise ValueError("EVAN_STORAGE must be one of " +
+                         ", ".join(STORAGE_FORMATS) + ", got " + fmt)
+    return fmt
+
+
+def parquet_path(path):
+    """Parquet sibling of a csv path."""
+    return os.path.splitext(path)[0] + '.parquet'
+
+
+def is_text(s):
+    """Whether a column holds text, as object or (pandas >= 3) str."""
+    return pd.api.types.is_object_dtype(s) or \
+        pd.api.types.is_string_dtype(s)
+
+
+def write_parquet(df, path, categoricals=CATEGORICAL_COLS):
+    """Write the typed parquet sibling of `path` (a csv path)."""
+    df = df.copy()
+    for col in categoricals:
+        if col in df.columns and is_text(df[col]):
+            df[col] = df[col].astype('category')
+    # mixed object columns (e.g. numbers stored as text) are
+    #   written as strings so pyarrow can type them
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]):
+            types = df[col].dropna().map(type).unique()
+            if len(types) > 1:
+                df[col] = df[col].where(df[col].isnull(),
+                                        df[col].astype(str))
+    df.to_parquet(parquet_path(path), index=False)
+
+
+def write_table(df, path, categoricals=CATEGORICAL_COLS):
+    """Write a data frame to `path` (a csv path) in the configured
+    storage format(s)."""
+    fmt = storage_format()
+
+    if fmt in ['csv', 'both']:
+        df.to_csv(path, index=False)
+
+    if fmt in ['both', 'parquet']:
+        write_parquet(df, path, categoricals)
+
+
+# read_csv arguments with the same meaning for a parquet sibling;
+#   low_memory only changes how the csv is parsed
+PARQUET_KWARGS = ['usecols', 'dtype', 'parse_dates', 'low_memory']
+
+
+def read_table(path, columns=None, categorical=False, **csv_kwargs):
+    """Read a table written by write_table.
+
+    Parameters
+    ----------
+    path : str
+        The csv path of the artifact.
+    columns : list, optional
+        Only read these columns.
+    categorical : bool
+        Keep categorical columns from parquet as pandas categoricals.
+        By default they are decoded to plain objects so groupby and
+        concat behave exactly as with the csv.
+    **csv_kwargs
+        Passed to pd.read_csv when the csv is read. usecols (names),
+        dtype and parse_dates (a list) are also applied to the parquet
+        sibling; any other argument raises a ValueError, so a call
+        returns the same frame in every storage format.
+    """
+    unsupported = [k for k in csv_kwargs if k not in PARQUET_KWARGS]
+    if unsupported:
+        raise ValueError("read_table does not support " +
+                         ", ".join(unsupported) + " for parquet files")
+    if columns is not None:
+        csv_kwargs['usecols'] = columns
+
+    pq = parquet_path(path)
+    use_parquet = os.path.exists(pq) and (
+        not os.path.exists(path) or
+        os.path.getmtime(pq) >= os.path.getmtime(path))
+
+    if not use_parquet:
+        return pd.read_csv(path, **csv_kwargs)
+
+    df = pd.read_parquet(pq, columns=csv_kwargs.get('usecols'))
+    if not categorical:
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                # the dtype of the text, as read_csv gives it
+                df[col] = df[col].astype(df[col].cat.categories.dtype)
+    if csv_kwargs.get('dtype') is not None:
+        df = df.astype(csv_kwargs['dtype'])
+    for col in csv_kwargs.get('parse_dates') or []:
+        df[col] = pd.to_datetime(df[col])
+    return df
@@ -0,0 +1,399 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script runs the data pipeline of the makefile as a DAG. Stages
+whose inputs are ready run concurrently, each in its own process, and
+a stage is skipped when the content of its script, arguments and
+inputs is unchanged since its last successful run and its outputs
+still exist. Wall time and peak memory are reported for every stage.
+
+Usage: src/run_pipeline.py [--jobs=<jobs>] [--force] [--dry_run] \
+[<stage>...]
+
+Options:
+--jobs=<jobs>      Number of stages run at the same time, 0 uses
+                     all cores [default: 0]
+--force            Run every selected stage even if it is cached
+--dry_run          Only print the stages that would run
+<stage>            Stage names to build, with their upstream
+                     stages; all stages when omitted
+"""
+
+from docopt import docopt
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+opt = docopt(__doc__)
+
+CACHE_FILE = "data/processed/.pipeline_cache.json"
+SPLITS = ['train', 'validate', 'test']
+CENSUS_YEARS = ['2001', '2006', '2011', '2016']
+RAW_FILES = ['licence_1997_2012.csv', 'licence_2013_current.csv',
+             'census_2016.csv', 'census_2011.csv', 'census_2006.csv',
+             'census_2001.csv', 'local_area_boundary.geojson',
+             'parking-meters.csv', 'disability-parking.csv',
+             '14100096-eng.zip', '14100327-eng.zip',
+             'vancouver_empolyment_2020.csv',
+             'census_boundaries_2011.zip', 'nhs_census_2011.zip']
+MAPPING = "src/02_clean_wrangle/business_mapping_dictionary.csv"
+
+
+def stage(name, cmd, inputs, outputs, deps=()):
+    """A pipeline stage. Python stages also depend on the shared
+    storage layer."""
+    inputs = list(inputs)
+    if cmd[0] == 'python3':
+        inputs.append('src/data_io.py')
+    return {'name': name, 'cmd': cmd, 'inputs': inputs,
+            'outputs': list(outputs), 'deps': list(deps)}
+
+
+def build_stages():
+    """Stages and files of the makefile."""
+    stages = [
+        stage('download',
+              ['python3', 'src/01_download/01_download_data.py',
+               '--file_path=data/raw', '--urls=src/01_download/urls.txt'],
+              ['src/01_download/01_download_data.py',
+               'src/01_download/urls.txt'],
+              ['data/raw/' + f for f in RAW_FILES]),
+        stage('split_licence',
+              ['Rscript', 'src/02_clean_wrangle/02_split_licence.R',
+               '--filepath_in=data/raw', '--filepath_out=data/processed',
+               '--filename_1=licence_1997_2012.csv',
+               '--filename_2=licence_2013_current.csv'],
+              ['src/02_clean_wrangle/02_split_licence.R',
+               'data/raw/licence_1997_2012.csv',
+               'data/raw/licence_2013_current.csv'],
+              ['data/processed/combined_licences.csv'] +
+              ['data/processed/%s.csv' % s for s in SPLITS],
+              ['download']),
+        stage('clean_nhs',
+              ['python3', 'src/02_clean_wrangle/04_clean_nhs.py',
+               '--nhs_zip=data/raw/nhs_census_2011.zip',
+               '--ct_bound_zip=data/raw/census_boundaries_2011.zip',
+               '--area_file=data/raw/local_area_boundary.geojson',
+               '--file_path=data/processed/nhs/'],
+              ['src/02_clean_wrangle/04_clean_nhs.py',
+               'data/raw/nhs_census_2011.zip',
+               'data/raw/census_boundaries_2011.zip',
+               'data/raw/local_area_boundary.geojson'],
+              ['data/processed/nhs/'],
+              ['download']),
+    ]
+
+    for split in SPLITS + ['combined_licences']:
+        source = ('data/processed/combined_licences.csv'
+                  if split == 'combined_licences'
+                  else 'data/processed/%s.csv' % split)
+        cleaned = ('data/processed/03_cleaned_combined_licences.csv'
+                   if split == 'combined_licences'
+                   else 'data/processed/03_cleaned_%s.csv' % split)
+        stages.append(stage(
+            'clean_licence_' + split,
+            ['python3', 'src/02_clean_wrangle/03_clean_licence.py',
+             '--file_path=' + source, '--mapping_csv=' + MAPPING,
+             '--save_to=' + cleaned],
+            ['src/02_clean_wrangle/03_clean_licence.py',
+             'src/02_clean_wrangle/licence_normalize.py', source, MAPPING],
+            [cleaned],
+            ['split_licence']))
+
+    for year in CENSUS_YEARS:
+        stages.append(stage(
+            'clean_census_' + year,
+            ['python3', 'src/02_clean_wrangle/05_clean_census.py',
+             '--census_file=data/raw/census_%s.csv' % year,
+             '--year=' + year,
+             '--file_path=data/processed/census_' + year],
+            ['src/02_clean_wrangle/05_clean_census.py',
+             'data/raw/census_%s.csv' % year] +
+            (['data/processed/nhs/'] if year == '2011' else []),
+            ['data/processed/census_%s/' % year],
+            ['download'] + (['clean_nhs'] if year == '2011' else [])))
+
+    census_dirs = ['data/processed/census_%s/' % y for y in CENSUS_YEARS]
+    for split in SPLITS:
+        stages.append(stage(
+            'synthesis_' + split,
+            ['python3', 'src/02_clean_wrangle/06_synthesis.py',
+             '--path_in=data/processed/03_cleaned_%s.csv' % split,
+             '--save_to=data/processed/04_combined_%s.csv' % split],
+            ['src/02_clean_wrangle/06_synthesis.py',
+             'data/processed/03_cleaned_%s.csv' % split,
+             'data/raw/parking-meters.csv',
+             'data/raw/disability-parking.csv'] + census_dirs,
+            ['data/processed/04_combined_%s.csv' % split],
+            ['clean_licence_' + split] +
+            ['clean_census_' + y for y in CENSUS_YEARS]))
+
+    combined = ['data/processed/04_combined_%s.csv' % s for s in SPLITS]
+    stages.append(stage(
+        'nearby_business',
+        ['python3', 'src/03_modelling/nearby_business.py',
+         '--path_in=' + ','.join(combined),
+         '--save_to=src/03_modelling/nearby_business.csv'],
+        ['src/03_modelling/nearby_business.py',
+         'src/03_modelling/spatial_features.py'] + combined,
+        ['src/03_modelling/nearby_business.csv'],
+        ['synthesis_' + s for s in SPLITS]))
+
+    for split in SPLITS:
+        stages.append(stage(
+            'feature_engineering_' + split,
+            ['python3', 'src/03_modelling/07_feature_engineering.py',
+             '--file_path=data/processed/04_combined_%s.csv' % split,
+             '--save_to=data/processed/05_feat_eng_%s.csv' % split],
+            ['src/03_modelling/07_feature_engineering.py',
+             'src/03_modelling/spatial_features.py',
+             'src/03_modelling/licence_features.py',
+             'data/processed/04_combined_%s.csv' % split,
+             'src/03_modelling/nearby_business.csv',
+             'data/raw/parking-meters.csv',
+             'data/raw/disability-parking.csv'],
+            ['data/processed/05_feat_eng_%s.csv' % split],
+            ['synthesis_' + split, 'nearby_business']))
+
+    feat_eng = ['data/processed/05_feat_eng_%s.csv' % s for s in SPLITS]
+    stages += [
+        stage('modelling',
+              ['python3', 'src/03_modelling/011_modelling.py',
+               '--file_path1=' + feat_eng[0], '--file_path2=' + feat_eng[1],
+               '--file_path3=' + feat_eng[2],
+               '--save_to1=results/model_performance.xlsx',
+               '--save_to2=results/important_feature.csv',
+               '--save_model=results/final_model.joblib'],
+              ['src/03_modelling/011_modelling.py'] + feat_eng,
+              ['results/model_performance.xlsx',
+               'results/important_feature.csv',
+               'results/final_model.joblib'],
+              ['feature_engineering_' + s for s in SPLITS]),
+        stage('census_vis',
+              ['python3', 'src/04_visualization/census_vis_synthesis.py',
+               '--path_in=data/processed/census',
+               '--path_out=data/processed/census_viz.csv',
+               '--area_file=data/raw/local_area_boundary.geojson'],
+              ['src/04_visualization/census_vis_synthesis.py',
+               'data/raw/local_area_boundary.geojson'] + census_dirs,
+              ['data/processed/census_viz.csv'],
+              ['clean_census_' + y for y in CENSUS_YEARS]),
+        stage('licence_vis',
+              ['python3', 'src/04_visualization/licence_vis_synthesis.py'],
+              ['src/04_visualization/licence_vis_synthesis.py',
+               'src/02_clean_wrangle/licence_normalize.py',
+               'src/03_modelling/spatial_features.py',
+               'data/processed/combined_licences.csv',
+               'data/processed/03_cleaned_combined_licences.csv',
+               'data/raw/parking-meters.csv',
+               'data/raw/disability-parking.csv',
+               feat_eng[0], feat_eng[1], 'results/final_model.joblib'],
+              ['data/processed/vis_model.csv',
+               'data/processed/vis_licence.csv',
+               'data/processed/vis_agg_licence.csv',
+               'data/processed/vis_parking.csv'],
+              ['clean_licence_combined_licences', 'modelling',
+               'feature_engineering_train',
+               'feature_engineering_validate']),
+        stage('app_bundle',
+              ['python3', 'src/04_visualization/build_app_bundle.py',
+               '--path_out=data/processed/app_bundle'],
+              ['src/04_visualization/build_app_bundle.py',
+               'src/04_visualization/app_data.py',
+               'data/processed/census_viz.csv',
+               'data/processed/vis_parking.csv',
+               'data/processed/vis_licence.csv',
+               'data/processed/vis_agg_licence.csv',
+               'data/processed/vis_model.csv',
+               'data/raw/local_area_boundary.geojson'],
+              ['data/processed/app_bundle/'],
+              ['census_vis', 'licence_vis']),
+    ]
+
+    return {s['name']: s for s in stages}
+
+
+def file_hash(path, hash_cache):
+    """sha256 of a file, reusing the previous value when its size
+    and mtime are unchanged."""
+    st = os.stat(path)
+    key = "%s:%d:%d" % (path, st.st_size, st.st_mtime_ns)
+    if key not in hash_cache:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        hash_cache[key] = h.hexdigest()
+    return hash_cache[key]
+
+
+def path_hash(path, hash_cache):
+    """Hash of a file, or of every file below a directory."""
+    if not os.path.exists(path):
+        return None
+    if os.path.isfile(path):
+        return file_hash(path, hash_cache)
+
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for f in sorted(files):
+            full = os.path.join(root, f)
+            h.update(os.path.relpath(full, path).encode())
+            h.update(file_hash(full, hash_cache).encode())
+    return h.hexdigest()
+
+
+def prune_hashes(hash_cache):
+    """Drop hashes of files that were changed or removed."""
+    kept = {}
+    for key, value in hash_cache.items():
+        path, size, mtime = key.rsplit(':', 2)
+        if os.path.isfile(path):
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) == (int(size), int(mtime)):
+                kept[key] = value
+    return kept
+
+
+def stage_key(s, hash_cache):
+    """Content key of a stage: its command and input hashes."""
+    h = hashlib.sha256(json.dumps(s['cmd']).encode())
+    for path in s['inputs']:
+        h.update(path.encode())
+        h.update(str(path_hash(path, hash_cache)).encode())
+    return h.hexdigest()
+
+
+def outputs_exist(s):
+    return all(os.path.exists(p) and (os.path.isfile(p) or os.listdir(p))
+               for p in s['outputs'])
+
+
+def run_stage(s):
+    """Run a stage and return (returncode, seconds, peak RSS in MB)."""
+    for path in s['outputs']:
+        parent = path if path.endswith('/') else os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+    start = time.perf_counter()
+    p = subprocess.Popen(s['cmd'])
+    # wait4 gives the resource usage of this stage's process alone
+    _, status, usage = os.wait4(p.pid, 0)
+    p.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 1
+    return p.returncode, time.perf_counter() - start, usage.ru_maxrss / 1024
+
+
+def save_cache(cache):
+    cache['hashes'] = prune_hashes(cache['hashes'])
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    with open(CACHE_FILE, 'w') as f:
+        json.dump(cache, f)
+
+
+def select(stages, targets):
+    """Stages needed to build `targets` (all if empty)."""
+    if not targets:
+        return set(stages)
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in stages:
+            raise KeyError("Unknown stage: " + name)
+        if name not in needed:
+            needed.add(name)
+            todo += stages[name]['deps']
+    return needed
+
+
+def main(jobs, force, dry_run, targets):
+    stages = build_stages()
+    selected = select(stages, targets)
+
+    cache = {'stages': {}, 'hashes': {}}
+    if os.path.exists(CACHE_FILE):
+        with open(CACHE_FILE) as f:
+            cache = json.load(f)
+
+    done, failed, running = set(), set(), {}
+    report = []
+
+    def ready(name):
+        deps = [d for d in stages[name]['deps'] if d in selected]
+        return all(d in done for d in deps)
+
+    pending = sorted(selected)
+    try:
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            while pending or running:
+                for name in [n for n in pending if ready(n)]:
+                    pending.remove(name)
+                    s = stages[name]
+                    key = stage_key(s, cache['hashes'])
+                    if not force and outputs_exist(s) and \
+                            cache['stages'].get(name) == key:
+                        done.add(name)
+                        report.append((name, 'cached', 0.0, 0.0))
+                    elif dry_run:
+                        done.add(name)
+                        report.append((name, 'would run', 0.0, 0.0))
+                    else:
+                        print("Running %s" % name, flush=True)
+                        running[pool.submit(run_stage, s)] = (name, key)
+
+                # stages blocked by a failed upstream stage never run
+                blocked = [n for n in pending if any(
+                    d in failed for d in stages[n]['deps'])]
+                for name in blocked:
+                    pending.remove(name)
+                    failed.add(name)
+                    report.append((name, 'skipped', 0.0, 0.0))
+
+                if not running:
+                    if pending and not any(ready(n) for n in pending):
+                        raise RuntimeError("Unresolvable stages: " +
+                                           ", ".join(pending))
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, key = running.pop(future)
+                    try:
+                        code, seconds, peak = future.result()
+                    except OSError as e:
+                        # the stage could not start, e.g. Rscript is not
+                        #   on the PATH
+                        print("Cannot run %s: %s" % (name, e),
+                              file=sys.stderr, flush=True)
+                        code, seconds, peak = 1, 0.0, 0.0
+                    if code == 0:
+                        done.add(name)
+                        cache['stages'][name] = key
+                        report.append((name, 'ran', seconds, peak))
+                    else:
+                        failed.add(name)
+                        cache['stages'].pop(name, None)
+                        report.append((name, 'failed', seconds, peak))
+    finally:
+        # stages that succeeded stay cached whatever stopped the run
+        if not dry_run:
+            save_cache(cache)
+
+    print("\n%-36s %-10s %10s %10s" % ("stage", "status", "wall_s",
+                                       "peak_MB"))
+    for name, status, seconds, peak in report:
+        print("%-36s %-10s %10.1f %10.1f" % (name, status, seconds, peak))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(int(opt["--jobs"]), opt["--force"], opt["--dry_run"],
+         opt["<stage>"])
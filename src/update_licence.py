@@ -0,0 +1,330 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+This script ingests a new business licence extract incrementally
+instead of rerunning 02_split_licence.R, 03_clean_licence.py,
+06_synthesis.py, nearby_business.py and 07_feature_engineering.py over
+every year since 1997.
+
+Only rows of the extract that are not in combined_licences.csv yet
+(new LicenceRSN and ExtractDate pairs) are ingested:
+
+1. new rows get the business_id of their (BusinessName, PostalCode,
+   LocalArea, City, BusinessTradeName) group, new groups get new ids
+   and new businesses are put in train/validate/test in the
+   proportions of 02_split_licence.R;
+2. all licence rows of the touched businesses are cleaned and
+   synthesized again, which also relabels their previous year, and
+   replace the rows of those businesses in the 03_cleaned_* and
+   04_combined_* files;
+3. nearest business counts are recomputed for the (FOLDERYEAR,
+   BusinessType) groups of the touched businesses only;
+4. features are recomputed for the touched businesses and the
+   businesses whose nearest business count changed, and the chain
+   counts of each split are refreshed.
+
+The raw rows are appended to the split csvs and combined_licences.csv
+last, so an interrupted update can be run again: its rows are still new
+and every step is redone. The businesses whose nearest business count
+changed are recorded in update_licence_progress.json once the counts
+are written and refreshed by the rerun too, as it no longer sees those
+counts change. The file is removed when an update finishes.
+
+The model and the visualization files are not updated, rerun
+011_modelling.py and licence_vis_synthesis.py for those.
+
+Usage: src/update_licence.py --extract=<extract> [--distance=<distance>] \
+[--dry_run]
+
+Options:
+--extract=<extract>       The new licence extract, a raw ; separated csv
+                            like data/raw/licence_2013_current.csv
+--distance=<distance>     Radius in meters of the nearest business
+                            count [default: 200]
+--dry_run                 Only report the new rows and businesses
+"""
+
+from docopt import docopt
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.append("src")
+sys.path.append("src/03_modelling")
+from data_io import read_table, write_table  # noqa: E402
+from spatial_features import (add_coords, project_local,  # noqa: E402
+                              count_same_type)
+from licence_features import chain  # noqa: E402
+
+opt = docopt(__doc__)
+
+SPLITS = ['train', 'validate', 'test']
+BUSINESS_KEYS = ['BusinessName', 'PostalCode', 'LocalArea', 'City',
+                 'BusinessTradeName']
+MAPPING = "src/02_clean_wrangle/business_mapping_dictionary.csv"
+NEARBY = "src/03_modelling/nearby_business.csv"
+PROGRESS = "data/processed/update_licence_progress.json"
+
+
+def raw_path(split):
+    return "data/processed/%s.csv" % split
+
+
+def cleaned_path(split):
+    return "data/processed/03_cleaned_%s.csv" % split
+
+
+def combined_path(split):
+    return "data/processed/04_combined_%s.csv" % split
+
+
+def feat_eng_path(split):
+    return "data/processed/05_feat_eng_%s.csv" % split
+
+
+def read_extract(extract):
+    """Read a raw extract and write its dates the way
+    02_split_licence.R does."""
+    df = pd.read_csv(extract, sep=';', low_memory=False,
+                     dtype={'NumberofEmployees': 'object'})
+    df['ExtractDate'] = pd.to_datetime(
+        df.ExtractDate, utc=True).dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    for col in ['IssuedDate', 'ExpiredDate']:
+        df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
+    return df
+
+
+def new_rows(extract, combined):
+    """Rows of the extract whose (LicenceRSN, ExtractDate) is new."""
+    def key(df):
+        return pd.MultiIndex.from_arrays([
+            df.LicenceRSN.astype(float),
+            pd.to_datetime(df.ExtractDate, utc=True)])
+
+    return extract[~key(extract).isin(key(combined))]
+
+
+def assign_business_id(delta, combined):
+    """Give new rows the business_id of their business; businesses
+    not seen before are numbered after the largest id."""
+    known = combined[BUSINESS_KEYS + ['business_id']].drop_duplicates(
+        BUSINESS_KEYS)
+    delta = delta.drop(columns='business_id', errors='ignore').merge(
+        known, on=BUSINESS_KEYS, how='left')
+
+    new = delta.business_id.isnull()
+    new_keys = delta.loc[new, BUSINESS_KEYS].drop_duplicates(
+    ).sort_values(BUSINESS_KEYS)
+    new_keys['business_id'] = combined.business_id.max() + 1 + \
+        np.arange(len(new_keys))
+    delta.loc[new, 'business_id'] = delta.loc[new, BUSINESS_KEYS].merge(
+        new_keys, on=BUSINESS_KEYS, how='left').business_id.values
+
+    delta['business_id'] = delta.business_id.astype(int)
+    return delta
+
+
+def read_splits():
+    """business_id -> train/validate/test of the existing businesses."""
+    return pd.concat([
+        pd.Series(split, index=pd.read_csv(
+            raw_path(split), usecols=['business_id']).business_id.unique())
+        for split in SPLITS])
+
+
+def split_new(ids):
+    """Split of new business_ids: 70% train, 21% test and 9% validate
+    as in 02_split_licence.R, fixed per id so reruns agree."""
+    bucket = pd.util.hash_pandas_object(
+        pd.Series(ids), index=False).values % 100
+    return np.select([bucket < 70, bucket < 91], ['train', 'test'],
+                     'validate')
+
+
+def run(script, *args):
+    subprocess.run([sys.executable, script] + list(args), check=True)
+
+
+def replace_rows(path, rows, ids):
+    """Replace the rows of the businesses `ids` in the table at
+    `path` with `rows`; return the new table and the removed rows."""
+    df = read_table(path, low_memory=False)
+    replaced = df.business_id.isin(ids)
+    table = pd.concat([df[~replaced], rows.reindex(columns=df.columns)],
+                      ignore_index=True)
+    return table, df[replaced]
+
+
+def update_nearby(groups, distance):
+    """Recompute the nearest business counts of the (FOLDERYEAR,
+    BusinessType) groups and return the business_ids whose count
+    changed."""
+    all_licence = pd.concat([
+        read_table(combined_path(split), low_memory=False,
+                   columns=['business_id', 'LicenceRSN', 'FOLDERYEAR',
+                            'BusinessType', 'Geom'])
+        for split in SPLITS])
+    all_licence = all_licence.merge(
+        groups[~(groups.FOLDERYEAR == 2020)],
+        on=['FOLDERYEAR', 'BusinessType'])
+    all_licence = all_licence[all_licence.Geom.notnull()]
+    if all_licence.empty:
+        return np.array([], dtype=int)
+
+    add_coords(all_licence)
+    xy = project_local(all_licence['coord-x'], all_licence['coord-y'])
+    all_licence['x'] = xy[:, 0]
+    all_licence['y'] = xy[:, 1]
+
+    counts = pd.concat([count_same_type(df_y, distance)
+                        for _, df_y in all_licence.groupby('FOLDERYEAR')])
+    counts = counts[~counts.index.duplicated(keep='last')]
+
+    nearby = pd.read_csv(NEARBY).set_index(
+        'LicenceRSN').nearest_business_count
+    changed = counts.index[nearby.reindex(counts.index).values !=
+                           counts.values]
+
+    nearby = pd.concat([nearby[~nearby.index.isin(counts.index)], counts])
+    nearby.rename('nearest_business_count').rename_axis(
+        'LicenceRSN').reset_index().to_csv(NEARBY, index=False)
+
+    return all_licence.business_id[
+        all_licence.LicenceRSN.isin(changed)].unique()
+
+
+def append_csv(rows, path):
+    """Append rows to a csv in the column order of its header."""
+    columns = pd.read_csv(path, nrows=0).columns
+    rows.reindex(columns=columns).to_csv(path, mode='a', header=False,
+                                         index=False)
+
+
+def read_progress():
+    """business_ids whose nearest business count was changed by an
+    interrupted update, empty if the last update finished."""
+    if not os.path.exists(PROGRESS):
+        return np.array([], dtype=int)
+    with open(PROGRESS) as f:
+        return np.array(json.load(f)['changed'], dtype=int)
+
+
+def write_progress(changed):
+    tmp = PROGRESS + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'changed': [int(i) for i in changed]}, f)
+    os.replace(tmp, PROGRESS)
+
+
+def main(extract, distance, dry_run):
+
+    combined = pd.read_csv(raw_path('combined_licences'), low_memory=False,
+                           dtype={'NumberofEmployees': 'object'})
+    delta = new_rows(read_extract(extract), combined)
+    if delta.empty:
+        if not dry_run and os.path.exists(PROGRESS):
+            # interrupted after its last append
+            os.remove(PROGRESS)
+        print("No new licence rows.")
+        return
+
+    delta = assign_business_id(delta, combined)
+    touched = delta.business_id.unique()
+
+    split_of = read_splits()
+    new_ids = touched[~np.isin(touched, split_of.index)]
+    split_of = pd.concat([split_of,
+                          pd.Series(split_new(new_ids), index=new_ids)])
+
+    print("%d new rows of %d businesses (%d new), years %s" % (
+        len(delta), len(touched), len(new_ids),
+        sorted(delta.FOLDERYEAR.dropna().unique())))
+    if dry_run:
+        return
+
+    def in_split(df, split):
+        return df[df.business_id.isin(split_of.index[split_of == split])]
+
+    with tempfile.TemporaryDirectory(dir="data/processed") as tmp:
+        def tmp_path(name):
+            return os.path.join(tmp, name)
+
+        # 1. clean and synthesize every row of the touched businesses
+        pd.concat([combined[combined.business_id.isin(touched)],
+                   delta]).to_csv(tmp_path('raw.csv'), index=False)
+        run('src/02_clean_wrangle/03_clean_licence.py',
+            '--file_path=' + tmp_path('raw.csv'),
+            '--mapping_csv=' + MAPPING,
+            '--save_to=' + tmp_path('cleaned.csv'))
+        run('src/02_clean_wrangle/06_synthesis.py',
+            '--path_in=' + tmp_path('cleaned.csv'),
+            '--save_to=' + tmp_path('combined.csv'))
+        cleaned = read_table(tmp_path('cleaned.csv'), low_memory=False)
+        synthesized = read_table(tmp_path('combined.csv'), low_memory=False)
+
+        table, _ = replace_rows(cleaned_path('combined_licences'),
+                                cleaned, touched)
+        write_table(table, cleaned_path('combined_licences'))
+
+        groups = [synthesized]
+        for split in SPLITS:
+            table, _ = replace_rows(cleaned_path(split),
+                                    in_split(cleaned, split), touched)
+            write_table(table, cleaned_path(split))
+
+            table, removed = replace_rows(combined_path(split),
+                                          in_split(synthesized, split),
+                                          touched)
+            write_table(table, combined_path(split))
+            groups.append(removed)
+
+        # 2. nearest business counts of the groups the touched
+        #   businesses were or are in
+        groups = pd.concat(groups)[['FOLDERYEAR', 'BusinessType']]
+        #   (and those changed by an interrupted update, whose new
+        #   counts are already written)
+        changed = np.union1d(
+            update_nearby(groups.drop_duplicates(), distance),
+            read_progress())
+        write_progress(changed)
+        refresh = np.union1d(touched, changed)
+        print("Recomputing features of %d businesses" % len(refresh))
+
+        # 3. features of the refreshed businesses; chain counts
+        #   depend on every business of a split
+        rows = pd.concat([read_table(combined_path(split), low_memory=False)
+                          for split in SPLITS])
+        rows[rows.business_id.isin(refresh)].to_csv(
+            tmp_path('features_in.csv'), index=False)
+        run('src/03_modelling/07_feature_engineering.py',
+            '--file_path=' + tmp_path('features_in.csv'),
+            '--save_to=' + tmp_path('features.csv'))
+        features = read_table(tmp_path('features.csv'), low_memory=False)
+
+        for split in SPLITS:
+            table, _ = replace_rows(feat_eng_path(split),
+                                    in_split(features, split), refresh)
+            write_table(chain(table), feat_eng_path(split))
+
+    # 4. the raw rows go last so an interrupted update can be rerun,
+    #   combined_licences.csv (which new rows are found from) after the
+    #   splits, skipping rows already appended to a split
+    for split in SPLITS:
+        appended = pd.read_csv(raw_path(split),
+                               usecols=['LicenceRSN', 'ExtractDate'])
+        append_csv(new_rows(in_split(delta, split), appended),
+                   raw_path(split))
+    append_csv(delta, raw_path('combined_licences'))
+    os.remove(PROGRESS)
+
+    print("Licence update finished, rerun 011_modelling.py and "
+          "licence_vis_synthesis.py to refresh the model and dashboard.")
+
+
+if __name__ == "__main__":
+    main(opt["--extract"], float(opt["--distance"]), opt["--dry_run"])
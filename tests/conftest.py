@@ -0,0 +1,16 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+The modules under src are flat scripts imported by their directory, as
+the pipeline scripts do with sys.path.append; the tests run from the
+root of the project.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in ['src', 'src/02_clean_wrangle', 'src/03_modelling']:
+    sys.path.append(os.path.join(ROOT, directory))
@@ -0,0 +1,123 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Synthetic licence data for the pipeline scripts, written the way
+02_split_licence.R writes it (two digit FOLDERYEAR, ISO dates,
+business_id first) or as a raw extract, and a scratch project to run
+the scripts in.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AREAS = {'Downtown': (-123.120, 49.280),
+         'Grandview-Woodland': (-123.067, 49.276)}
+BUSINESS_TYPES = ['Office', 'Retail Dealer', 'Plumber',
+                  'Janitorial Services']
+STATUS = ['Issued', 'Issued', 'Issued', 'Inactive', 'Pending',
+          'Gone Out of Business']
+COLUMNS = ['business_id', 'FOLDERYEAR', 'LicenceRSN', 'LicenceNumber',
+           'LicenceRevisionNumber', 'BusinessName', 'BusinessTradeName',
+           'Status', 'IssuedDate', 'ExpiredDate', 'BusinessType',
+           'BusinessSubType', 'Unit', 'UnitType', 'House', 'Street', 'City',
+           'Province', 'Country', 'PostalCode', 'LocalArea',
+           'NumberofEmployees', 'FeePaid', 'ExtractDate', 'Geom']
+
+
+def point(rng, area, spread=0.004):
+    lon, lat = AREAS[area]
+    return json.dumps({'type': 'Point', 'coordinates': [
+        lon + rng.uniform(-spread, spread),
+        lat + rng.uniform(-spread, spread)]})
+
+
+def businesses(rng, ids):
+    """Business of every id: the keys 02_split_licence.R groups by,
+    a type and a location (missing for some)."""
+    rows = []
+    for i in ids:
+        area = rng.choice(list(AREAS))
+        rows.append({
+            'business_id': i,
+            'BusinessName': 'Business %d' % (i % max(len(ids) // 3, 1)),
+            'BusinessTradeName': 'Trade %d' % i if i % 4 == 0 else np.nan,
+            'City': rng.choice(['Vancouver', 'VANCOUVER']),
+            'PostalCode': 'V6B %dA%d' % (i % 10, i % 7),
+            'LocalArea': area,
+            'BusinessType': rng.choice(BUSINESS_TYPES),
+            'Geom': point(rng, area) if rng.random() < 0.9 else np.nan})
+    return pd.DataFrame(rows)
+
+
+def licences(rng, business, years, first_rsn=0, extract='2019-06-01'):
+    """Licence rows of `business` (a businesses() frame) in `years`,
+    one or two extracts per year, in 02_split_licence.R's format."""
+    rows = []
+    for b in business.to_dict('records'):
+        for year in years:
+            if rng.random() < 0.2:
+                continue
+            issued = pd.Timestamp(year=year, month=1, day=1) + \
+                pd.Timedelta(days=int(rng.integers(0, 300)))
+            for extract_day in range(int(rng.integers(1, 3))):
+                rows.append(dict(
+                    b,
+                    FOLDERYEAR=float(year % 100),
+                    LicenceRSN=float(first_rsn + len(rows)),
+                    LicenceNumber='%02d-%06d' % (year % 100, len(rows)),
+                    LicenceRevisionNumber='00',
+                    Status=rng.choice(STATUS),
+                    IssuedDate=issued.strftime('%Y-%m-%d'),
+                    ExpiredDate=(issued + pd.Timedelta(days=365)).strftime(
+                        '%Y-%m-%d'),
+                    BusinessSubType=np.nan, Unit=np.nan, UnitType=np.nan,
+                    House='%d' % rng.integers(1, 2000), Street='Main St',
+                    Province='BC', Country='CA',
+                    NumberofEmployees=rng.choice(['000', '2', '10']),
+                    FeePaid=float(rng.integers(50, 500)),
+                    ExtractDate=(pd.Timestamp(extract) + pd.Timedelta(
+                        days=extract_day)).strftime('%Y-%m-%dT%H:%M:%SZ')))
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def raw_extract(rows, path):
+    """Write licence rows as a raw ; separated extract."""
+    df = rows.drop(columns='business_id')
+    df['ExtractDate'] = pd.to_datetime(df.ExtractDate, utc=True).dt.\
+        tz_convert('America/Vancouver').dt.strftime('%Y-%m-%dT%H:%M:%S%z')
+    df.to_csv(path, sep=';', index=False)
+
+
+def parking(rng, path, n):
+    areas = [list(AREAS)[i % len(AREAS)] for i in range(n)]
+    pd.DataFrame({'Geom': [point(rng, a) for a in areas],
+                  'Geo Local Area': areas}).to_csv(path, sep=';',
+                                                   index=False)
+
+
+def project(directory, rng):
+    """A scratch copy of the scripts with the raw parking files and an
+    empty census, run from `directory`."""
+    shutil.copytree(os.path.join(ROOT, 'src'),
+                    os.path.join(directory, 'src'),
+                    ignore=shutil.ignore_patterns(
+                        '__pycache__', '*.html', '*.ipynb', 'benchmark',
+                        '04_visualization'))
+    for d in ['data/raw', 'data/processed/census_2001']:
+        os.makedirs(os.path.join(directory, d))
+    parking(rng, os.path.join(directory, 'data/raw/parking-meters.csv'), 60)
+    parking(rng, os.path.join(directory,
+                              'data/raw/disability-parking.csv'), 10)
+
+
+def run(directory, script, *args):
+    subprocess.run([sys.executable, script] + list(args), cwd=directory,
+                   check=True, env=dict(os.environ, EVAN_STORAGE='csv'))
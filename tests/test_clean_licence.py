@@ -0,0 +1,47 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+03_clean_licence.py gives the same rows cleaned in memory and cleaned
+in business_id partitions streamed in chunks.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+import synthetic
+
+SCRIPT = 'src/02_clean_wrangle/03_clean_licence.py'
+MAPPING = 'src/02_clean_wrangle/business_mapping_dictionary.csv'
+
+
+def clean(tmp_path, raw, name, *args):
+    save_to = str(tmp_path / name)
+    synthetic.run(synthetic.ROOT, SCRIPT, '--file_path=' + raw,
+                  '--mapping_csv=' + MAPPING, '--save_to=' + save_to,
+                  *args)
+    df = pd.read_csv(save_to, low_memory=False)
+    return df.sort_values(['business_id', 'FOLDERYEAR']).reset_index(
+        drop=True)
+
+
+def test_partitions_match_in_memory(tmp_path):
+    rng = np.random.default_rng(2020)
+    business = synthetic.businesses(rng, range(1, 301))
+    rows = synthetic.licences(rng, business, range(1995, 2021))
+    # rows of a business spread over several chunks
+    rows = rows.sample(frac=1, random_state=0)
+    raw = str(tmp_path / 'raw.csv')
+    rows.to_csv(raw, index=False)
+
+    in_memory = clean(tmp_path, raw, 'in_memory.csv')
+    partitioned = clean(tmp_path, raw, 'partitioned.csv',
+                        '--partitions=7', '--chunksize=500')
+
+    assert len(in_memory) > 1000
+    assert set(in_memory.FOLDERYEAR) >= {1997, 2019}
+    pd.testing.assert_frame_equal(in_memory, partitioned)
+    # the partitions are removed
+    assert sorted(os.listdir(tmp_path)) == ['in_memory.csv',
+                                            'partitioned.csv', 'raw.csv']
@@ -0,0 +1,137 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+Parity of the columnar history/chain features of
+src/03_modelling/licence_features.py with the original per-business_id
+loops of 07_feature_engineering.py.
+"""
+
+from collections import Counter
+import numpy as np
+import pandas as pd
+import pytest
+
+import licence_features
+
+
+def history_loop(df):
+    """Original history() from 07_feature_engineering.py."""
+    df['history'] = np.zeros(len(df))
+
+    for i in df.business_id.unique():
+        id_hist = len(df[df.business_id == i])
+
+        if id_hist >= 5:
+            history = [0]*5+[1]*(id_hist-5)
+            df.loc[df.business_id == i,
+                   'history'] = history
+
+    return df
+
+
+def chain_loop(df):
+    """Original chain() from 07_feature_engineering.py."""
+    df_copy = df[df.BusinessName.notnull()]
+
+    names = []
+    for i in df_copy.business_id.unique():
+        names.append(
+            (df_copy.loc[df_copy.business_id == i,
+                         'BusinessName'].values[0],
+             df_copy.loc[df_copy.business_id == i,
+                         'BusinessIndustry'].values[0]))
+
+    name_dict = Counter(names)
+
+    chain = []
+    for i in range(len(df)):
+        name = df.iloc[i, df.columns.get_loc(
+            'BusinessName')]
+        industry = df.iloc[i, df.columns.get_loc(
+            'BusinessIndustry')]
+
+        if pd.isnull(name):
+            chain.append(name)
+        else:
+            try:
+                chain.append(name_dict[
+                    (name, industry)])
+            except:  # noqa: E722
+                chain.append(0)
+
+    df['chain'] = chain
+
+    return df
+
+
+def assert_parity(df):
+    expected = chain_loop(history_loop(df.copy()))
+    result = licence_features.chain(licence_features.history(df.copy()))
+
+    pd.testing.assert_series_equal(expected.history, result.history)
+    pd.testing.assert_series_equal(expected.chain.astype(float),
+                                   result.chain)
+
+
+def licence(rows):
+    """Licence frame of (business_id, BusinessName, BusinessIndustry)
+    rows."""
+    df = pd.DataFrame(rows, columns=['business_id', 'BusinessName',
+                                     'BusinessIndustry'])
+    df['FOLDERYEAR'] = 2000 + df.groupby('business_id').cumcount()
+    return df
+
+
+def test_random_licences():
+    rng = np.random.default_rng(2020)
+    n = 3000
+    name = np.array(["name_%d" % i for i in rng.integers(0, 150, n)],
+                    dtype=object)
+    name[rng.random(n) < 0.05] = None
+    industry = rng.choice(np.array(['Retail trade', 'Construction', None],
+                                   dtype=object), n, p=[.5, .4, .1])
+    assert_parity(pd.DataFrame({'business_id': rng.integers(0, 500, n),
+                                'FOLDERYEAR': rng.integers(1997, 2020, n),
+                                'BusinessName': name,
+                                'BusinessIndustry': industry}))
+
+
+@pytest.mark.parametrize('n_rows, history', [
+    (4, [0] * 4), (5, [0] * 5), (6, [0] * 5 + [1]), (8, [0] * 5 + [1] * 3)])
+def test_history_after_five_rows(n_rows, history):
+    df = licence([(1, 'a', 'Retail trade')] * n_rows
+                 + [(2, 'b', 'Retail trade')])
+    assert_parity(df)
+    result = licence_features.history(df)
+    assert result.history.tolist() == history + [0]
+
+
+def test_history_in_frame_order():
+    df = licence([(1, 'a', 'Retail trade'), (2, 'b', 'Retail trade')] * 6)
+    assert_parity(df.sample(frac=1, random_state=0))
+
+
+def test_missing_industry_is_a_key():
+    df = licence([(1, 'a', None), (2, 'a', None), (3, 'a', 'Retail trade'),
+                  (4, 'b', np.nan), (4, 'b', np.nan)])
+    assert_parity(df)
+    result = licence_features.chain(df)
+    assert result.chain.tolist() == [2, 2, 1, 1, 1]
+
+
+def test_missing_name():
+    df = licence([(1, None, 'Retail trade'), (1, 'a', 'Retail trade'),
+                  (2, None, 'Retail trade'), (3, 'a', 'Construction')])
+    assert_parity(df)
+    result = licence_features.chain(df)
+    assert np.isnan(result.chain[0]) and np.isnan(result.chain[2])
+    # business 1 is counted under its first named row
+    assert result.chain[1] == 1 and result.chain[3] == 1
+
+
+def test_name_changes_count_first_name():
+    df = licence([(1, 'a', 'Retail trade'), (1, 'b', 'Retail trade'),
+                  (2, 'b', 'Retail trade')])
+    assert_parity(df)
+    assert licence_features.chain(df).chain.tolist() == [1, 1, 1]
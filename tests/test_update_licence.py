@@ -0,0 +1,128 @@
+# author: Jasmine Qin
+# date: 2020-06-24
+
+"""
+update_licence.py ingests a new extract into the processed files the
+way rebuilding them from the updated raw splits does.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+import synthetic
+
+SPLITS = ['train', 'validate', 'test']
+MAPPING = 'src/02_clean_wrangle/business_mapping_dictionary.csv'
+NEARBY = 'src/03_modelling/nearby_business.csv'
+
+
+def processed(directory, name):
+    return os.path.join(directory, 'data/processed', name)
+
+
+def build(directory):
+    """The python stages of the makefile over the raw splits."""
+    run = synthetic.run
+    for split in SPLITS + ['combined_licences']:
+        run(directory, 'src/02_clean_wrangle/03_clean_licence.py',
+            '--file_path=data/processed/%s.csv' % split,
+            '--mapping_csv=' + MAPPING,
+            '--save_to=data/processed/03_cleaned_%s.csv' % split)
+    for split in SPLITS:
+        run(directory, 'src/02_clean_wrangle/06_synthesis.py',
+            '--path_in=data/processed/03_cleaned_%s.csv' % split,
+            '--save_to=data/processed/04_combined_%s.csv' % split)
+    run(directory, 'src/03_modelling/nearby_business.py',
+        '--path_in=' + ','.join('data/processed/04_combined_%s.csv' % s
+                                for s in SPLITS),
+        '--save_to=' + NEARBY, '--n_jobs=1')
+    for split in SPLITS:
+        run(directory, 'src/03_modelling/07_feature_engineering.py',
+            '--file_path=data/processed/04_combined_%s.csv' % split,
+            '--save_to=data/processed/05_feat_eng_%s.csv' % split)
+
+
+def write_raw(directory, rows, split_of):
+    rows = rows.sort_values(['business_id', 'IssuedDate'], kind='stable')
+    rows.to_csv(processed(directory, 'combined_licences.csv'), index=False)
+    for split in SPLITS:
+        rows[rows.business_id.map(split_of) == split].to_csv(
+            processed(directory, '%s.csv' % split), index=False)
+
+
+def read_sorted(path, keys):
+    df = pd.read_csv(path, low_memory=False)
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def test_update_matches_rebuild(tmp_path):
+    rng = np.random.default_rng(2020)
+    business = synthetic.businesses(rng, range(1, 121))
+    split_of = pd.Series(
+        rng.choice(SPLITS, len(business), p=[.7, .09, .21]),
+        index=business.business_id)
+    rows = synthetic.licences(rng, business, range(2012, 2019))
+
+    # the next extract: a new extract of 2018 and new years of some
+    #   businesses, and businesses not seen before
+    new_business = synthetic.businesses(rng, range(121, 141))
+    extract = pd.concat([
+        synthetic.licences(rng, business[business.business_id <= 50],
+                           range(2018, 2021), first_rsn=100000,
+                           extract='2020-06-01'),
+        synthetic.licences(rng, new_business, range(2019, 2021),
+                           first_rsn=200000, extract='2020-06-01'),
+        # already ingested rows are skipped
+        rows.sample(20, random_state=0)])
+
+    updated, rebuilt = str(tmp_path / 'updated'), str(tmp_path / 'rebuilt')
+    for directory in [updated, rebuilt]:
+        synthetic.project(directory, np.random.default_rng(0))
+
+    write_raw(updated, rows, split_of)
+    build(updated)
+    synthetic.raw_extract(extract, os.path.join(updated, 'extract.csv'))
+    synthetic.run(updated, 'src/update_licence.py',
+                  '--extract=extract.csv')
+
+    combined = pd.read_csv(processed(updated, 'combined_licences.csv'))
+    assert len(combined) == len(rows) + len(extract) - 20
+    assert not os.path.exists(processed(updated,
+                                        'update_licence_progress.json'))
+    # rows of known businesses keep their business_id, new businesses
+    #   are numbered after the largest
+    business_id = combined.set_index('LicenceRSN').business_id
+    known = extract[extract.LicenceRSN.between(100000, 199999)]
+    assert (business_id[known.LicenceRSN].values ==
+            known.business_id.values).all()
+    assert business_id[business_id.index >= 200000].gt(120).all()
+
+    # rebuild everything from the raw splits the update wrote
+    raw = pd.concat([
+        pd.read_csv(processed(updated, '%s.csv' % split), low_memory=False,
+                    dtype={'NumberofEmployees': 'object'}).assign(split=split)
+        for split in SPLITS])
+    assert len(raw) == len(combined)
+    write_raw(rebuilt, raw.drop(columns='split'),
+              raw.drop_duplicates('business_id').set_index(
+                  'business_id').split)
+    build(rebuilt)
+
+    keys = ['business_id', 'FOLDERYEAR']
+    for name in (['03_cleaned_%s.csv' % s for s in
+                  SPLITS + ['combined_licences']]
+                 + ['04_combined_%s.csv' % s for s in SPLITS]
+                 + ['05_feat_eng_%s.csv' % s for s in SPLITS]):
+        pd.testing.assert_frame_equal(
+            read_sorted(processed(updated, name), keys),
+            read_sorted(processed(rebuilt, name), keys), obj=name)
+    pd.testing.assert_frame_equal(
+        read_sorted(os.path.join(updated, NEARBY), 'LicenceRSN'),
+        read_sorted(os.path.join(rebuilt, NEARBY), 'LicenceRSN'))
+
+    # a second run finds nothing new
+    synthetic.run(updated, 'src/update_licence.py',
+                  '--extract=extract.csv')
+    assert len(pd.read_csv(processed(updated, 'combined_licences.csv'))) \
+        == len(combined)